@@ -0,0 +1,133 @@
+# /Users/mac/projects/ticket_bot/app/bench_expiring.py
+"""
+Бенчмарк запросов истекающих подписок на большой таблице subscriptions.
+
+Пример:
+    python -m app.bench_expiring --rows 1000000
+
+Сравнивает crud.get_expiring_subscriptions и crud.find_subscriptions_for_notification
+(диапазон по end_date, индекс ix_subscriptions_end_date) с прежней формой тех же запросов,
+где колонка оборачивалась в date() и индекс не применялся. Печатает план запроса и медиану времени.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from app.loadtest import FIRST_USER_ID, configure_environment
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark of the subscription expiry queries.")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Subscriptions (and users) to seed")
+    parser.add_argument("--days", type=int, default=3, help="Window of get_expiring_subscriptions")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per query, the median is reported")
+    parser.add_argument("--db-url", help="Database URL (default: a fresh temporary SQLite file)")
+    return parser.parse_args()
+
+
+async def seed_database(session_factory, rows: int):
+    """Подписки с датами окончания, равномерно разбросанными на два года вокруг сегодняшнего дня."""
+    from sqlalchemy import insert
+    from app.database.models import Subscription, User
+
+    now = datetime.utcnow()
+    rng = random.Random(1)
+    async with session_factory() as session:
+        for start in range(0, rows, 10_000):
+            batch = range(start, min(start + 10_000, rows))
+            await session.execute(insert(User), [
+                {"telegram_id": FIRST_USER_ID + i, "username": f"user{i}"} for i in batch
+            ])
+            await session.execute(insert(Subscription), [
+                {"user_id": FIRST_USER_ID + i, "end_date": now + timedelta(minutes=rng.randint(-525_600, 525_600))}
+                for i in batch
+            ])
+            await session.commit()
+
+
+async def measure(session_factory, query, repeat: int):
+    """Медиана времени выполнения (мс) и число строк."""
+    timings = []
+    for _ in range(repeat):
+        async with session_factory() as session:
+            started = time.perf_counter()
+            rows = (await session.execute(query)).scalars().all()
+            timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), len(rows)
+
+
+async def explain(session_factory, query) -> str:
+    from app.database.database import engine
+
+    if engine.dialect.name != "sqlite":
+        return ""
+    async with session_factory() as session:
+        compiled = query.compile(engine.sync_engine, compile_kwargs={"literal_binds": True})
+        conn = await session.connection()
+        result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}")
+        return "; ".join(row[3] for row in result)
+
+
+async def run(args):
+    import logging
+    from sqlalchemy import event, func, select
+    from sqlalchemy.orm import joinedload
+    from app.database import crud
+    from app.database.database import AsyncSessionFactory, engine, init_db
+    from app.database.models import Subscription
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    await init_db()
+    print(f"Seeding {args.rows} subscriptions...")
+    started = time.perf_counter()
+    await seed_database(AsyncSessionFactory, args.rows)
+    print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+    # Запросы crud строятся внутри функций, поэтому их SQL снимается при выполнении
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append(context.compiled.statement)
+
+    today = datetime.utcnow().date()
+    queries = {}
+    for name, function in (
+        ("get_expiring_subscriptions", lambda session: crud.get_expiring_subscriptions(session, args.days)),
+        ("find_subscriptions_for_notification", crud.find_subscriptions_for_notification),
+    ):
+        event.listen(engine.sync_engine, "before_cursor_execute", capture)
+        async with AsyncSessionFactory() as session:
+            await function(session)
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+        queries[name] = captured.pop()
+
+    # Прежняя форма: date(end_date) в условии, индекс по end_date не используется
+    old_queries = {
+        "get_expiring_subscriptions": select(Subscription)
+        .options(joinedload(Subscription.user))
+        .filter(func.date(Subscription.end_date) <= today + timedelta(days=args.days))
+        .order_by(Subscription.end_date.asc()),
+        "find_subscriptions_for_notification": select(Subscription).where(
+            (func.date(Subscription.end_date) == today) | (func.date(Subscription.end_date) == today + timedelta(days=1))
+        ),
+    }
+
+    for name, query in queries.items():
+        print(f"\n== {name} ==")
+        for label, variant in (("range", query), ("date()", old_queries[name])):
+            elapsed, rows = await measure(AsyncSessionFactory, variant, args.repeat)
+            print(f"{label:>7}: {elapsed:8.2f} ms  {rows} rows")
+            plan = await explain(AsyncSessionFactory, variant)
+            if plan:
+                print(f"         plan: {plan}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    configure_environment(arguments)
+    asyncio.run(run(arguments))
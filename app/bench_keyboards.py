@@ -0,0 +1,88 @@
+# /Users/mac/projects/ticket_bot/app/bench_keyboards.py
+"""
+Микро-бенчмарк клавиатур, которые отправляются почти с каждым апдейтом: главные меню
+клиента и админа, действия с тикетом и меню активного тикета для --tickets разных тикетов.
+
+Пример:
+    python -m app.bench_keyboards --updates 100000 --tickets 100
+
+Сравнивает готовые клавиатуры (общие меню и lru_cache) со сборкой заново на каждый апдейт,
+как было раньше. Отчет: время и пиковое выделение памяти (tracemalloc) на апдейт.
+"""
+import argparse
+import time
+import tracemalloc
+
+from app.loadtest import FIRST_USER_ID, configure_environment
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Micro-benchmark of the reply/inline keyboards.")
+    parser.add_argument("--updates", type=int, default=100_000, help="Simulated updates")
+    parser.add_argument("--tickets", type=int, default=100, help="Distinct tickets the updates refer to")
+    args = parser.parse_args()
+    args.db_url = None
+    return args
+
+
+def keyboard_builders():
+    """Возвращает (готовые, собираемые заново) функции: апдейт -> набор клавиатур."""
+    from app.keyboards import admin_kb, client_kb
+
+    def rebuild(markup):
+        # Та же валидация pydantic, что и при сборке из кнопок
+        return type(markup).model_validate(markup.model_dump())
+
+    def cached(ticket_id: int):
+        return (
+            client_kb.get_main_menu(),
+            admin_kb.get_admin_main_menu(),
+            admin_kb.get_ticket_actions_kb(ticket_id, FIRST_USER_ID + ticket_id),
+            client_kb.get_active_ticket_menu(ticket_id),
+        )
+
+    def rebuilt(ticket_id: int):
+        return (
+            rebuild(client_kb.MAIN_MENU),
+            rebuild(admin_kb.ADMIN_MAIN_MENU),
+            admin_kb.get_ticket_actions_kb.__wrapped__(ticket_id, FIRST_USER_ID + ticket_id),
+            client_kb.get_active_ticket_menu.__wrapped__(ticket_id),
+        )
+
+    return cached, rebuilt
+
+
+def measure(build, args):
+    """Время (мкс) и пиковое выделение памяти (байт) на апдейт."""
+    # Прогрев: кэш заполнен, как в работающем боте
+    for n in range(args.tickets):
+        build(n + 1)
+
+    started = time.perf_counter()
+    for n in range(args.updates):
+        build(n % args.tickets + 1)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    peaks = []
+    for n in range(min(args.updates, 1000)):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        build(n % args.tickets + 1)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    return elapsed / args.updates * 1_000_000, sum(peaks) / len(peaks)
+
+
+def run(args):
+    cached, rebuilt = keyboard_builders()
+    print(f"{args.updates} updates over {args.tickets} tickets, 4 keyboards per update")
+    for label, build in (("cached", cached), ("rebuilt", rebuilt)):
+        per_update, peak = measure(build, args)
+        print(f"{label:>8}: {per_update:8.2f} us/update  peak {peak:8.0f} B/update")
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    configure_environment(arguments)
+    run(arguments)
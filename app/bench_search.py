@@ -0,0 +1,119 @@
+# /Users/mac/projects/ticket_bot/app/bench_search.py
+"""
+Бенчмарк поиска по сообщениям тикетов: crud.search_tickets (FTS5 / tsvector) против
+полного просмотра ticket_messages с LIKE '%слово%'.
+
+Пример:
+    python -m app.bench_search --messages 1000000 --tickets 100000
+
+Сообщения из --words-per-message слов словаря "слово0".."словоN" с частотами по закону Ципфа,
+поэтому в запросах есть и очень частые, и редкие слова. Отчет: медиана времени первой страницы
+поиска и число тикетов, найденных LIKE-запросом, для слов разной частоты.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from app.loadtest import FIRST_USER_ID, configure_environment
+
+VOCABULARY_SIZE = 20_000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark of /search against a LIKE scan.")
+    parser.add_argument("--messages", type=int, default=1_000_000, help="Messages to seed")
+    parser.add_argument("--tickets", type=int, default=100_000, help="Tickets the messages are spread over")
+    parser.add_argument("--words-per-message", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per query, the median is reported")
+    parser.add_argument("--db-url", help="Database URL (default: a fresh temporary SQLite file)")
+    return parser.parse_args()
+
+
+async def seed_database(session_factory, args):
+    from sqlalchemy import insert
+    from app.database.models import Ticket, TicketMessage, TicketStatus, User
+
+    rng = random.Random(1)
+    vocabulary = [f"слово{i}" for i in range(VOCABULARY_SIZE)]
+    # Накопленные веса считаются один раз, а не в каждом choices()
+    cum_weights = list(accumulate(1 / (rank + 1) for rank in range(VOCABULARY_SIZE)))
+    start_time = datetime.utcnow() - timedelta(days=365)
+    async with session_factory() as session:
+        for start in range(0, args.tickets, 10_000):
+            batch = range(start, min(start + 10_000, args.tickets))
+            await session.execute(insert(User), [
+                {"telegram_id": FIRST_USER_ID + i, "username": f"user{i}"} for i in batch
+            ])
+            await session.execute(insert(Ticket), [
+                {"id": i + 1, "owner_id": FIRST_USER_ID + i, "status": TicketStatus.CLOSED, "last_message_at": start_time}
+                for i in batch
+            ])
+        for start in range(0, args.messages, 10_000):
+            await session.execute(insert(TicketMessage), [
+                {
+                    "ticket_id": rng.randint(1, args.tickets),
+                    "sender_id": FIRST_USER_ID,
+                    "message_type": "text",
+                    "text": " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=args.words_per_message)),
+                    "created_at": start_time + timedelta(seconds=n * 30),
+                }
+                for n in range(start, min(start + 10_000, args.messages))
+            ])
+            await session.commit()
+
+
+async def median_ms(session_factory, call, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        async with session_factory() as session:
+            started = time.perf_counter()
+            result = await call(session)
+            timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), result
+
+
+async def run(args):
+    import logging
+    from sqlalchemy import func, literal, select
+    from app.database import crud
+    from app.database.database import AsyncSessionFactory, engine, init_db
+    from app.database.models import TicketMessage
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    await init_db()
+    print(f"Seeding {args.tickets} tickets, {args.messages} messages...")
+    started = time.perf_counter()
+    await seed_database(AsyncSessionFactory, args)
+    print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+    # Слова разной частоты: ранг 0 встречается в большей части сообщений, последний - почти нигде
+    for rank in (0, 10, 100, 1000, VOCABULARY_SIZE - 1):
+        word = f"слово{rank}"
+
+        async def search(session):
+            return await crud.search_tickets(session, word)
+
+        async def like_scan(session):
+            # Пробелы по краям, чтобы "слово1" не находило "слово10"; индекс здесь не применим
+            padded = literal(" ") + TicketMessage.text + literal(" ")
+            result = await session.execute(
+                select(func.count(func.distinct(TicketMessage.ticket_id))).where(padded.like(f"% {word} %"))
+            )
+            return result.scalar_one()
+
+        search_ms, (hits, has_more, truncated) = await median_ms(AsyncSessionFactory, search, args.repeat)
+        like_ms, like_tickets = await median_ms(AsyncSessionFactory, like_scan, args.repeat)
+        print(f"{word:>12}: search {search_ms:8.2f} ms ({len(hits)} hits{', more' if has_more else ''}{', truncated' if truncated else ''})  "
+              f"LIKE scan {like_ms:8.2f} ms ({like_tickets} tickets)")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    configure_environment(arguments)
+    asyncio.run(run(arguments))
@@ -0,0 +1,139 @@
+# /Users/mac/projects/ticket_bot/app/bench_sqlite.py
+"""
+Бенчмарк конкурентных чтений и записей SQLite: писатели добавляют сообщения в тикеты
+(как message_writer), читатели листают историю (как /history) в течение --duration секунд.
+
+Пример:
+    python -m app.bench_sqlite --writers 4 --readers 16 --duration 10
+    python -m app.bench_sqlite --engine default
+
+--engine app - движок приложения (WAL, synchronous=NORMAL, busy_timeout, пул соединений),
+--engine default - create_async_engine без настроек (rollback journal, NullPool), как было раньше.
+Отчет: операций в секунду, задержка p50/p95/p99 и число ошибок "database is locked" по ролям.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from app.loadtest import FIRST_USER_ID, configure_environment, percentile
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Concurrent read/write benchmark for SQLite.")
+    parser.add_argument("--engine", choices=("app", "default"), default="app")
+    parser.add_argument("--tickets", type=int, default=1000, help="Tickets to seed")
+    parser.add_argument("--messages-per-ticket", type=int, default=50, help="Seeded messages per ticket")
+    parser.add_argument("--writers", type=int, default=4, help="Concurrent writer tasks")
+    parser.add_argument("--readers", type=int, default=16, help="Concurrent reader tasks")
+    parser.add_argument("--batch", type=int, default=20, help="Messages per write transaction")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds to run")
+    args = parser.parse_args()
+    db_path = os.path.join(tempfile.mkdtemp(prefix="ticket_bot_bench_"), "bench.db")
+    args.db_url = f"sqlite+aiosqlite:///{db_path}"
+    return args
+
+
+async def seed_database(session_factory, args):
+    from sqlalchemy import insert
+    from app.database.models import Ticket, TicketMessage, TicketStatus, User
+
+    now = datetime.utcnow()
+    async with session_factory() as session:
+        await session.execute(insert(User), [
+            {"telegram_id": FIRST_USER_ID + i, "username": f"user{i}"} for i in range(args.tickets)
+        ])
+        await session.execute(insert(Ticket), [
+            {"id": i + 1, "owner_id": FIRST_USER_ID + i, "status": TicketStatus.OPEN, "last_message_at": now}
+            for i in range(args.tickets)
+        ])
+        for start in range(0, args.tickets, 1000):
+            await session.execute(insert(TicketMessage), [
+                {
+                    "ticket_id": i + 1,
+                    "sender_id": FIRST_USER_ID + i,
+                    "message_type": "text",
+                    "text": f"seed message {n}",
+                    "created_at": now - timedelta(minutes=args.messages_per_ticket - n),
+                }
+                for i in range(start, min(start + 1000, args.tickets))
+                for n in range(args.messages_per_ticket)
+            ])
+        await session.commit()
+
+
+async def run(args):
+    import logging
+    import random
+    from sqlalchemy import insert, update
+    from sqlalchemy.exc import OperationalError
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.database import crud
+    from app.database.database import create_engine_from_settings, run_migrations
+    from app.database.models import Ticket, TicketMessage
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    engine = create_engine_from_settings() if args.engine == "app" else create_async_engine(args.db_url)
+    session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(run_migrations)
+    print(f"Seeding {args.tickets} tickets, {args.tickets * args.messages_per_ticket} messages...")
+    await seed_database(session_factory, args)
+
+    latencies = {"write": [], "read": []}
+    locked = {"write": 0, "read": 0}
+    deadline = time.perf_counter() + args.duration
+
+    async def write_batch():
+        now = datetime.utcnow()
+        ticket_ids = random.sample(range(1, args.tickets + 1), args.batch)
+        async with session_factory() as session:
+            await session.execute(insert(TicketMessage), [
+                {"ticket_id": ticket_id, "sender_id": 1, "message_type": "text", "text": "reply", "created_at": now}
+                for ticket_id in ticket_ids
+            ])
+            await session.execute(update(Ticket), [{"id": ticket_id, "last_message_at": now} for ticket_id in ticket_ids])
+            await session.commit()
+
+    async def read_page():
+        async with session_factory() as session:
+            await crud.get_ticket_messages_page(session, random.randint(1, args.tickets))
+
+    async def worker(role, operation):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                await operation()
+            except OperationalError as e:
+                if "locked" not in str(e):
+                    raise
+                locked[role] += 1
+                continue
+            latencies[role].append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(worker("write", write_batch) for _ in range(args.writers)),
+        *(worker("read", read_page) for _ in range(args.readers)),
+    )
+    elapsed = time.perf_counter() - started
+
+    print(f"\n== engine {args.engine}: {args.writers} writers (x{args.batch} messages), {args.readers} readers ==")
+    for role, values in latencies.items():
+        if not values:
+            print(f"{role}: no successful operations, {locked[role]} 'database is locked' errors")
+            continue
+        print(f"{role}: {len(values) / elapsed:.0f} ops/s  p50 {percentile(values, 50):.2f} ms  "
+              f"p95 {percentile(values, 95):.2f} ms  p99 {percentile(values, 99):.2f} ms  "
+              f"locked errors {locked[role]}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    configure_environment(arguments)
+    asyncio.run(run(arguments))
@@ -15,13 +15,80 @@ class Settings:
         admin_ids_str = os.getenv("ADMIN_IDS")
         if not admin_ids_str:
             raise ValueError("ADMIN_IDS is not set in the environment variables.")
-        self.admin_ids: list[int] = [int(admin_id) for admin_id in admin_ids_str.split(',') if admin_id.strip()]
+        self.admin_ids: frozenset[int] = frozenset(int(admin_id) for admin_id in admin_ids_str.split(',') if admin_id.strip())
+        # How often to re-read admins added with /addadmin (picks up changes from other processes)
+        self.admin_reload_interval: int = int(os.getenv("ADMIN_RELOAD_INTERVAL", 60)) # seconds
+
+        # Logging: level, format (text or json) and share of frequent events that get logged
+        self.log_level: str = os.getenv("LOG_LEVEL", "INFO")
+        self.log_format: str = os.getenv("LOG_FORMAT", "text")
+        self.log_sample_rate: float = float(os.getenv("LOG_SAMPLE_RATE", 0.01))
 
         # SLA Timer in hours
         self.sla_hours: int = int(os.getenv("SLA_HOURS", 12))
 
-        # Database URL
-        self.db_url: str = "sqlite+aiosqlite:///app/database/data/database.db"
+        # Batched writes of ticket messages
+        self.message_batch_size: int = int(os.getenv("MESSAGE_BATCH_SIZE", 100))
+        self.message_flush_interval: float = float(os.getenv("MESSAGE_FLUSH_INTERVAL", 0.05))
+
+        # In-process cache of users' active tickets (0 disables it)
+        self.active_ticket_cache_size: int = int(os.getenv("ACTIVE_TICKET_CACHE_SIZE", 10000))
+        self.active_ticket_cache_ttl: float = float(os.getenv("ACTIVE_TICKET_CACHE_TTL", 300)) # seconds
+        # Users already registered by this process (skips the upsert on repeat updates)
+        self.seen_users_cache_size: int = int(os.getenv("SEEN_USERS_CACHE_SIZE", 100000))
+
+        # Outgoing notifications: worker pool size and Telegram rate limits
+        self.notify_workers: int = int(os.getenv("NOTIFY_WORKERS", 8))
+        self.telegram_global_rate: float = float(os.getenv("TELEGRAM_GLOBAL_RATE", 25)) # messages per second
+        self.telegram_chat_interval: float = float(os.getenv("TELEGRAM_CHAT_INTERVAL", 1.0)) # seconds between messages to one chat
+
+        # Broadcasts: recipients sent per batch (and saved per transaction), progress message update interval
+        self.broadcast_batch_size: int = int(os.getenv("BROADCAST_BATCH_SIZE", 50))
+        self.broadcast_progress_interval: float = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", 3)) # seconds
+
+        # FSM storage: memory, redis or database
+        self.fsm_storage: str = os.getenv("FSM_STORAGE", "memory")
+        self.redis_url: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        self.fsm_ttl: int = int(os.getenv("FSM_TTL", 24 * 60 * 60)) # seconds
+
+        # Update delivery: polling or webhook
+        self.run_mode: str = os.getenv("RUN_MODE", "polling")
+        self.webhook_base_url: str = os.getenv("WEBHOOK_BASE_URL", "") # public https URL, webhook is registered if set
+        self.webhook_path: str = os.getenv("WEBHOOK_PATH", "/webhook")
+        self.webhook_secret: str = os.getenv("WEBHOOK_SECRET") or None
+        # Without the secret anyone who can reach the port could post forged updates (e.g. as an admin)
+        if self.run_mode == "webhook" and not self.webhook_secret:
+            raise ValueError("WEBHOOK_SECRET must be set when RUN_MODE=webhook.")
+        self.webapp_host: str = os.getenv("WEBAPP_HOST", "0.0.0.0")
+        self.webapp_port: int = int(os.getenv("WEBAPP_PORT", 8080))
+        self.shutdown_timeout: float = float(os.getenv("SHUTDOWN_TIMEOUT", 30)) # seconds to drain in-flight work
+
+        # Prometheus metrics endpoint (/metrics), 0 disables it
+        self.metrics_host: str = os.getenv("METRICS_HOST", "127.0.0.1")
+        self.metrics_port: int = int(os.getenv("METRICS_PORT", 9100))
+
+        # Database URL (sqlite+aiosqlite:///... or postgresql+asyncpg://...)
+        self.db_url: str = os.getenv("DB_URL", "sqlite+aiosqlite:///app/database/data/database.db")
+
+        # Database connection pool
+        self.db_pool_size: int = int(os.getenv("DB_POOL_SIZE", 5))
+        self.db_max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", 10))
+        self.db_pool_timeout: float = float(os.getenv("DB_POOL_TIMEOUT", 30))
+        # Prepared statement cache per connection (PostgreSQL only, 0 disables it for pgbouncer)
+        self.db_statement_cache_size: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100))
+
+        # SQLite PRAGMA settings, applied to every new connection
+        self.sqlite_busy_timeout: int = int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000)) # ms
+        self.sqlite_mmap_size: int = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)) # bytes
+        self.sqlite_cache_size: int = int(os.getenv("SQLITE_CACHE_SIZE", -64000)) # negative = KiB
+
+        # Settings are read once and shared; changing them at runtime is a bug
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, "_frozen", False):
+            raise AttributeError(f"Settings are read-only, cannot set {name!r}")
+        super().__setattr__(name, value)
 
-# Instantiate settings to be imported in other modules
+# The single settings instance, imported by all other modules
 settings = Settings()
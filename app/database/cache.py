@@ -0,0 +1,103 @@
+# /Users/mac/projects/ticket_bot/app/database/cache.py
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Set, Tuple
+from app.config import settings
+from app.database.models import TicketStatus
+
+
+class ActiveTicket(NamedTuple):
+    """Активный тикет пользователя: только то, что нужно для приема сообщения."""
+    id: int
+    status: TicketStatus
+
+
+class ActiveTicketCache:
+    """
+    LRU-кэш с TTL: telegram_id -> активный тикет пользователя (или None).
+
+    Записи сбрасываются функциями crud, меняющими активный тикет или статус, сразу
+    после коммита. Чтобы чтение из БД, начатое до такого изменения, не положило в кэш
+    устаревшее значение, put() принимает версию, полученную через version() до чтения.
+    TTL ограничивает устаревание при изменениях из других процессов.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, Tuple[Optional[ActiveTicket], float]]" = OrderedDict()
+        # ticket_id -> пользователи, у которых этот тикет закэширован как активный
+        self._by_ticket: Dict[int, Set[int]] = {}
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def version(self) -> int:
+        return self._version
+
+    def get(self, telegram_id: int) -> Tuple[bool, Optional[ActiveTicket]]:
+        """Возвращает (найдено ли значение, активный тикет)."""
+        entry = self._entries.get(telegram_id)
+        if entry is None or entry[1] < time.monotonic():
+            if entry is not None:
+                self._remove(telegram_id)
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(telegram_id)
+        self.hits += 1
+        return True, entry[0]
+
+    def put(self, telegram_id: int, ticket: Optional[ActiveTicket], version: int):
+        if self.max_size <= 0 or version != self._version:
+            return
+        self._remove(telegram_id)
+        self._entries[telegram_id] = (ticket, time.monotonic() + self.ttl)
+        if ticket is not None:
+            self._by_ticket.setdefault(ticket.id, set()).add(telegram_id)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, telegram_id: int):
+        self._version += 1
+        self._remove(telegram_id)
+
+    def invalidate_ticket(self, ticket_id: int):
+        self._version += 1
+        for telegram_id in list(self._by_ticket.get(ticket_id, ())):
+            self._remove(telegram_id)
+
+    def set_ticket_status(self, ticket_id: int, status: TicketStatus):
+        """Обновляет статус тикета в закэшированных записях (после коммита)."""
+        self._version += 1
+        for telegram_id in self._by_ticket.get(ticket_id, ()):
+            _, expires_at = self._entries[telegram_id]
+            self._entries[telegram_id] = (ActiveTicket(ticket_id, status), expires_at)
+
+    def clear(self):
+        self._version += 1
+        self._entries.clear()
+        self._by_ticket.clear()
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def _remove(self, telegram_id: int):
+        entry = self._entries.pop(telegram_id, None)
+        if entry is None or entry[0] is None:
+            return
+        users = self._by_ticket.get(entry[0].id)
+        if users is not None:
+            users.discard(telegram_id)
+            if not users:
+                del self._by_ticket[entry[0].id]
+
+
+active_ticket_cache = ActiveTicketCache(
+    settings.active_ticket_cache_size, settings.active_ticket_cache_ttl
+)
@@ -1,21 +1,31 @@
 # /Users/mac/projects/ticket_bot/app/database/crud.py
-from datetime import datetime, timedelta
+import heapq
+import itertools
+import re
+from datetime import datetime, time, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import update, delete, func
-from app.database.models import User, Ticket, TicketMessage, Subscription, TicketStatus
-from typing import List, Optional
+from sqlalchemy import column, insert, update, delete, func, literal, literal_column, or_, table, tuple_
+from sqlalchemy.orm import joinedload
+from app.database.cache import ActiveTicket, active_ticket_cache
+from app.database.database import dialect_insert, engine
+from app.database.models import (
+    Admin, Broadcast, BroadcastRecipient, BroadcastStatus, DeliveryStatus,
+    User, Ticket, TicketMessage, TicketStat, Subscription, TicketStatus,
+)
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 # User CRUD
-async def get_or_create_user(session: AsyncSession, telegram_id: int, username: str) -> User:
-    result = await session.execute(select(User).filter(User.telegram_id == telegram_id))
-    user = result.scalar_one_or_none()
-    if not user:
-        user = User(telegram_id=telegram_id, username=username)
-        session.add(user)
-        await session.commit()
-        await session.refresh(user)
-    return user
+async def upsert_user(session: AsyncSession, telegram_id: int, username: Optional[str]):
+    """Регистрирует пользователя или обновляет его username одним запросом."""
+    stmt = dialect_insert(User).values(telegram_id=telegram_id, username=username)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[User.telegram_id],
+        set_={"username": stmt.excluded.username},
+        where=User.username.is_distinct_from(stmt.excluded.username),
+    )
+    await session.execute(stmt)
+    await session.commit()
 
 async def get_user_by_id(session: AsyncSession, telegram_id: int) -> Optional[User]:
     result = await session.execute(select(User).filter(User.telegram_id == telegram_id))
@@ -24,16 +34,53 @@ async def get_user_by_id(session: AsyncSession, telegram_id: int) -> Optional[Us
 async def set_active_ticket(session: AsyncSession, telegram_id: int, ticket_id: int):
     await session.execute(update(User).where(User.telegram_id == telegram_id).values(active_ticket_id=ticket_id))
     await session.commit()
+    active_ticket_cache.invalidate_user(telegram_id)
 
-async def get_active_ticket_id(session: AsyncSession, telegram_id: int) -> Optional[int]:
-    result = await session.execute(select(User.active_ticket_id).where(User.telegram_id == telegram_id))
-    return result.scalar_one_or_none()
+async def get_active_ticket(session: AsyncSession, telegram_id: int) -> Optional[ActiveTicket]:
+    """Возвращает id и статус активного тикета пользователя, сначала из кэша, затем одним запросом."""
+    found, ticket = active_ticket_cache.get(telegram_id)
+    if found:
+        return ticket
 
-async def get_all_users_with_subscriptions(session: AsyncSession):
+    version = active_ticket_cache.version()
     result = await session.execute(
-        select(User, Subscription).outerjoin(Subscription, User.telegram_id == Subscription.user_id)
+        select(Ticket.id, Ticket.status)
+        .join(User, Ticket.id == User.active_ticket_id)
+        .where(User.telegram_id == telegram_id)
     )
-    return result.all()
+    row = result.first()
+    ticket = ActiveTicket(row.id, row.status) if row else None
+    active_ticket_cache.put(telegram_id, ticket, version)
+    return ticket
+
+# Выгрузки: запросы только с колонками (без ORM-объектов), чтобы их можно было читать потоком
+EXPORT_KINDS = ("users", "subscriptions", "tickets")
+
+def export_query(kind: str):
+    if kind == "users":
+        return (
+            select(User.telegram_id, User.username, User.created_at, Subscription.end_date.label("subscription_end"))
+            .outerjoin(Subscription, User.telegram_id == Subscription.user_id)
+            .order_by(User.id)
+        )
+    if kind == "subscriptions":
+        return (
+            select(Subscription.user_id, User.username, Subscription.end_date)
+            .join(User, User.telegram_id == Subscription.user_id)
+            .order_by(Subscription.end_date)
+        )
+    if kind == "tickets":
+        # Переписка по всем тикетам: сообщения по порядку внутри тикета
+        return (
+            select(
+                Ticket.id.label("ticket_id"), Ticket.owner_id, Ticket.status,
+                TicketMessage.created_at, TicketMessage.sender_id, TicketMessage.message_type,
+                TicketMessage.text, TicketMessage.file_id,
+            )
+            .join(TicketMessage, TicketMessage.ticket_id == Ticket.id)
+            .order_by(Ticket.id, TicketMessage.created_at, TicketMessage.id)
+        )
+    raise ValueError(f"Unknown export: {kind}")
 
 
 # Ticket CRUD
@@ -42,6 +89,7 @@ async def create_ticket(session: AsyncSession, telegram_id: int) -> Ticket:
     session.add(new_ticket)
     await session.commit()
     await session.refresh(new_ticket)
+    active_ticket_cache.invalidate_user(telegram_id)
     return new_ticket
 
 async def get_ticket_by_id(session: AsyncSession, ticket_id: int) -> Optional[Ticket]:
@@ -57,35 +105,186 @@ async def get_user_tickets(session: AsyncSession, telegram_id: int) -> List[Tick
     )
     return result.scalars().all()
 
-async def get_tickets_by_status(session: AsyncSession, status: TicketStatus) -> List[Ticket]:
-    result = await session.execute(
-        select(Ticket).filter(Ticket.status == status).order_by(Ticket.last_message_at.asc())
-    )
-    return result.scalars().all()
+async def get_tickets_page(
+    session: AsyncSession,
+    statuses: List[TicketStatus],
+    cursor: Optional[Tuple[datetime, int]] = None,
+    backward: bool = False,
+    limit: int = 20,
+) -> Tuple[List[Ticket], bool]:
+    """
+    Возвращает страницу тикетов с указанными статусами, упорядоченных по (last_message_at, id).
+    cursor - ключ (last_message_at, id), от которого листаем: вперед - строки после него,
+    назад (backward) - до него. Берется со страницы, а не перечитывается по id: у тикета-курсора
+    last_message_at мог измениться. Второе значение - есть ли еще тикеты в направлении листания.
+    """
+    # По одному упорядоченному чтению индекса ix_tickets_status_last_message_at на статус:
+    # с IN по нескольким статусам SQLite сортирует результат во временном B-дереве
+    key = tuple_(Ticket.last_message_at, Ticket.id)
+    if backward:
+        order_by = (Ticket.last_message_at.desc(), Ticket.id.desc())
+    else:
+        order_by = (Ticket.last_message_at.asc(), Ticket.id.asc())
+
+    pages = []
+    for status in statuses:
+        query = select(Ticket).where(Ticket.status == status)
+        if cursor is not None:
+            query = query.where(key < tuple_(*cursor) if backward else key > tuple_(*cursor))
+        # Берем на одну строку больше, чтобы узнать, есть ли следующая страница
+        result = await session.execute(query.order_by(*order_by).limit(limit + 1))
+        pages.append(result.scalars().all())
+
+    merged = heapq.merge(*pages, key=lambda ticket: (ticket.last_message_at, ticket.id), reverse=backward)
+    tickets = list(itertools.islice(merged, limit + 1))
+    has_more = len(tickets) > limit
+    tickets = tickets[:limit]
+    if backward:
+        tickets.reverse()
+    return tickets, has_more
 
 async def update_ticket_status(session: AsyncSession, ticket_id: int, status: TicketStatus):
     await session.execute(update(Ticket).where(Ticket.id == ticket_id).values(status=status, last_message_at=datetime.utcnow()))
     await session.commit()
+    active_ticket_cache.invalidate_ticket(ticket_id)
 
 # TicketMessage CRUD
-async def add_message_to_ticket(session: AsyncSession, ticket_id: int, sender_id: int, message_type: str, text: str = None, file_id: str = None):
-    new_message = TicketMessage(
-        ticket_id=ticket_id,
-        sender_id=sender_id,
-        message_type=message_type,
-        text=text,
-        file_id=file_id
-    )
-    session.add(new_message)
-    # Update ticket's last message time
-    await session.execute(update(Ticket).where(Ticket.id == ticket_id).values(last_message_at=datetime.utcnow()))
-    await session.commit()
+async def get_ticket_messages_page(
+    session: AsyncSession,
+    ticket_id: int,
+    cursor_id: Optional[int] = None,
+    older: bool = True,
+    limit: int = 20,
+) -> Tuple[List[TicketMessage], bool]:
+    """
+    Возвращает страницу сообщений тикета в хронологическом порядке.
+    Без cursor_id - последние сообщения. С cursor_id - сообщения до него (older) или после него.
+    Второе значение - есть ли еще сообщения в направлении листания.
+    """
+    query = select(TicketMessage).where(TicketMessage.ticket_id == ticket_id)
+    if cursor_id is not None:
+        cursor_time = select(TicketMessage.created_at).where(TicketMessage.id == cursor_id).scalar_subquery()
+        key = tuple_(TicketMessage.created_at, TicketMessage.id)
+        cursor = tuple_(cursor_time, cursor_id)
+        query = query.where(key < cursor if older else key > cursor)
 
-async def get_ticket_messages(session: AsyncSession, ticket_id: int) -> List[TicketMessage]:
-    result = await session.execute(
-        select(TicketMessage).filter(TicketMessage.ticket_id == ticket_id).order_by(TicketMessage.created_at.asc())
+    if older:
+        query = query.order_by(TicketMessage.created_at.desc(), TicketMessage.id.desc())
+    else:
+        query = query.order_by(TicketMessage.created_at.asc(), TicketMessage.id.asc())
+
+    result = await session.execute(query.limit(limit + 1))
+    messages = list(result.scalars().all())
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if older:
+        messages.reverse()
+    return messages, has_more
+
+# Полнотекстовый поиск по сообщениям (индексы создает миграция 0008).
+# Совпадения в сниппете обрамляются управляющими символами, чтобы их можно было
+# выделить уже после экранирования HTML
+SEARCH_MARK_START, SEARCH_MARK_END = "\x02", "\x03"
+# Ранжируются только самые свежие совпадения: оценка релевантности считается для каждой
+# строки, и по частому слову на миллионе сообщений это секунды вместо десятков миллисекунд
+SEARCH_CANDIDATES = 5000
+
+_fts = table("ticket_messages_fts", column("rowid"), column("rank"))
+# Выражение должно совпадать с индексом ix_ticket_messages_text_search (PostgreSQL)
+_pg_search_vector = literal_column("to_tsvector('russian', coalesce(ticket_messages.text, ''))")
+
+class SearchHit(NamedTuple):
+    ticket_id: int
+    owner_id: int
+    status: TicketStatus
+    snippet: str
+
+def _search_words(query: str) -> List[str]:
+    return re.findall(r"\w+", query)
+
+async def search_tickets(
+    session: AsyncSession, query: str, offset: int = 0, limit: int = 5
+) -> Tuple[List[SearchHit], bool, bool]:
+    """
+    Ищет тикеты по тексту сообщений: все слова запроса должны встретиться в одном сообщении.
+    Тикеты упорядочены по релевантности лучшего сообщения (среди SEARCH_CANDIDATES
+    последних совпадений), сниппет берется из него же.
+    Листание по offset: у ранжированной выдачи нет стабильного ключа для курсора.
+    Второе значение - есть ли еще результаты, третье - упирается ли выдача в SEARCH_CANDIDATES:
+    тогда более старые совпадения в нее не попали и запрос стоит уточнить.
+    """
+    words = _search_words(query)
+    if not words:
+        return [], False, False
+
+    if engine.dialect.name == "postgresql":
+        tsquery = func.plainto_tsquery(literal_column("'russian'"), " ".join(words))
+        match = _pg_search_vector.op("@@")(tsquery)
+        # ts_rank тем больше, чем лучше совпадение; сортируем по возрастанию, как bm25 в FTS5
+        candidates = select(
+            TicketMessage.id.label("message_id"), (-func.ts_rank(_pg_search_vector, tsquery)).label("rank")
+        ).where(match).order_by(TicketMessage.id.desc())
+    else:
+        # Каждое слово в кавычках, чтобы операторы FTS5 (OR, NEAR, *, ...) из запроса не разбирались
+        fts_query = " ".join(f'"{word}"' for word in words)
+        match = literal_column("ticket_messages_fts").op("MATCH")(fts_query)
+        candidates = select(
+            _fts.c.rowid.label("message_id"), _fts.c.rank.label("rank")
+        ).where(match).order_by(_fts.c.rowid.desc())
+    candidates = candidates.limit(SEARCH_CANDIDATES).subquery()
+
+    ranked = (
+        select(
+            TicketMessage.ticket_id,
+            candidates.c.message_id,
+            candidates.c.rank,
+            func.row_number().over(
+                partition_by=TicketMessage.ticket_id, order_by=(candidates.c.rank, candidates.c.message_id)
+            ).label("position"),
+            # Сколько совпадений попало в окно, чтобы сообщить об обрезанной выдаче
+            func.count().over().label("candidates"),
+        )
+        .select_from(candidates)
+        .join(TicketMessage, TicketMessage.id == candidates.c.message_id)
+        .subquery()
     )
-    return result.scalars().all()
+    page = await session.execute(
+        select(ranked.c.ticket_id, ranked.c.message_id, ranked.c.candidates, Ticket.owner_id, Ticket.status)
+        .join(Ticket, Ticket.id == ranked.c.ticket_id)
+        .where(ranked.c.position == 1)
+        .order_by(ranked.c.rank, ranked.c.ticket_id)
+        .offset(offset)
+        .limit(limit + 1)
+    )
+    rows = page.all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        return [], False, False
+    truncated = rows[0].candidates >= SEARCH_CANDIDATES
+
+    # Сниппеты только для строк страницы, а не для всех совпадений
+    message_ids = [row.message_id for row in rows]
+    if engine.dialect.name == "postgresql":
+        snippets_query = select(
+            TicketMessage.id,
+            func.ts_headline(
+                literal_column("'russian'"), TicketMessage.text, tsquery,
+                f'StartSel="{SEARCH_MARK_START}", StopSel="{SEARCH_MARK_END}", MaxWords=20, MinWords=8',
+            ),
+        ).where(TicketMessage.id.in_(message_ids))
+    else:
+        snippets_query = select(
+            _fts.c.rowid,
+            func.snippet(literal_column("ticket_messages_fts"), 0, SEARCH_MARK_START, SEARCH_MARK_END, "…", 16),
+        ).where(match, _fts.c.rowid.in_(message_ids))
+    snippets = dict((await session.execute(snippets_query)).all())
+
+    hits = [
+        SearchHit(row.ticket_id, row.owner_id, row.status, snippets.get(row.message_id) or "")
+        for row in rows
+    ]
+    return hits, has_more, truncated
 
 # Subscription CRUD
 async def get_user_subscription(session: AsyncSession, telegram_id: int) -> Optional[Subscription]:
@@ -102,30 +301,249 @@ async def create_or_update_subscription(session: AsyncSession, user_id: int, end
     await session.commit()
     return subscription
 
+async def get_subscription_end_dates(session: AsyncSession, user_ids: List[int]) -> Dict[int, datetime]:
+    result = await session.execute(
+        select(Subscription.user_id, Subscription.end_date).where(Subscription.user_id.in_(user_ids))
+    )
+    return dict(result.all())
+
+async def upsert_subscriptions(session: AsyncSession, end_dates: Dict[int, datetime]):
+    """
+    Задает даты окончания подписок пачкой: недостающие пользователи и подписки создаются,
+    существующие подписки обновляются. Два запроса на всю пачку, одна транзакция.
+    """
+    if not end_dates:
+        return
+    # Список параметров, а не .values([...]): запрос компилируется один раз и кэшируется,
+    # а драйвер все равно получает многострочные INSERT (insertmanyvalues)
+    users = dialect_insert(User).on_conflict_do_nothing(index_elements=[User.telegram_id])
+    await session.execute(users, [{"telegram_id": user_id} for user_id in end_dates])
+    stmt = dialect_insert(Subscription)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Subscription.user_id], set_={"end_date": stmt.excluded.end_date}
+    )
+    await session.execute(
+        stmt, [{"user_id": user_id, "end_date": end_date} for user_id, end_date in end_dates.items()]
+    )
+    await session.commit()
+
 
 async def get_expiring_subscriptions(session: AsyncSession, days: int) -> List[Subscription]:
-    target_date = datetime.utcnow().date() + timedelta(days=days)
+    # Полуоткрытый диапазон по самой колонке, чтобы работал индекс по end_date
+    today_start = datetime.combine(datetime.utcnow().date(), time.min)
+    range_end = today_start + timedelta(days=days + 1)
     result = await session.execute(
-        select(Subscription).filter(func.date(Subscription.end_date) <= target_date)
+        select(Subscription)
+        .options(joinedload(Subscription.user))
+        .filter(Subscription.end_date < range_end)
+        .order_by(Subscription.end_date.asc())
     )
     return result.scalars().all()
-    
-async def find_tickets_for_sla_check(session: AsyncSession, sla_hours: int) -> List[Ticket]:
-    time_threshold = datetime.utcnow() - timedelta(hours=sla_hours)
+
+# Тикеты, ожидающие ответа админа
+SLA_WAITING_STATUSES = (TicketStatus.OPEN, TicketStatus.ANSWERED)
+
+def _sla_not_alerted():
+    # Уведомление еще не отправлялось или после него в тикете была активность
+    return or_(Ticket.sla_alerted_at.is_(None), Ticket.sla_alerted_at < Ticket.last_message_at)
+
+async def claim_tickets_for_sla_alert(session: AsyncSession, sla_hours: int) -> List[Ticket]:
+    """
+    Помечает тикеты с нарушенным SLA как уведомленные и возвращает их вместе с владельцами.
+    Отметка ставится одним UPDATE до отправки, поэтому каждое нарушение достается ровно одному вызову.
+    """
+    now = datetime.utcnow()
+    time_threshold = now - timedelta(hours=sla_hours)
     result = await session.execute(
-        select(Ticket).where(
-            Ticket.status.in_([TicketStatus.OPEN, TicketStatus.ANSWERED]),
-            Ticket.last_message_at < time_threshold
+        update(Ticket)
+        .where(
+            Ticket.status.in_(SLA_WAITING_STATUSES),
+            Ticket.last_message_at < time_threshold,
+            _sla_not_alerted(),
         )
+        # last_message_at указан явно, иначе сработает его onupdate
+        .values(sla_alerted_at=now, last_message_at=Ticket.last_message_at)
+        .returning(Ticket.id)
+        .execution_options(synchronize_session=False)
+    )
+    ticket_ids = result.scalars().all()
+    await session.commit()
+    if not ticket_ids:
+        return []
+
+    result = await session.execute(
+        select(Ticket).options(joinedload(Ticket.owner)).where(Ticket.id.in_(ticket_ids))
     )
     return result.scalars().all()
 
+async def get_sla_pending_tickets(session: AsyncSession) -> List[Tuple[int, datetime]]:
+    """Возвращает (id, last_message_at) тикетов, ожидающих ответа админа, по которым еще не было уведомления."""
+    result = await session.execute(
+        select(Ticket.id, Ticket.last_message_at).where(
+            Ticket.status.in_(SLA_WAITING_STATUSES),
+            _sla_not_alerted(),
+        )
+    )
+    return result.all()
+
+async def get_ticket_stats(session: AsyncSession) -> Dict[str, int]:
+    """Счетчики из ticket_stats (их поддерживают триггеры), несколько строк без обхода тикетов."""
+    result = await session.execute(select(TicketStat.key, TicketStat.value))
+    return dict(result.all())
+
+async def get_oldest_waiting_ticket(session: AsyncSession) -> Optional[Tuple[int, datetime]]:
+    """Возвращает (id, last_message_at) тикета, дольше всех ждущего ответа админа."""
+    oldest = None
+    for status in SLA_WAITING_STATUSES:
+        # По одному чтению индекса ix_tickets_status_last_message_at на статус
+        result = await session.execute(
+            select(Ticket.id, Ticket.last_message_at)
+            .where(Ticket.status == status)
+            .order_by(Ticket.last_message_at.asc(), Ticket.id.asc())
+            .limit(1)
+        )
+        row = result.first()
+        if row and (oldest is None or row.last_message_at < oldest.last_message_at):
+            oldest = row
+    return tuple(oldest) if oldest else None
+
 async def find_subscriptions_for_notification(session: AsyncSession) -> List[Subscription]:
-    today = datetime.utcnow().date()
-    tomorrow = today + timedelta(days=1)
+    # Подписки, истекающие сегодня или завтра: [начало сегодня, начало послезавтра)
+    today_start = datetime.combine(datetime.utcnow().date(), time.min)
+    range_end = today_start + timedelta(days=2)
     result = await session.execute(
         select(Subscription).where(
-            (func.date(Subscription.end_date) == today) | (func.date(Subscription.end_date) == tomorrow)
+            Subscription.end_date >= today_start,
+            Subscription.end_date < range_end,
         )
     )
     return result.scalars().all()
+
+# Admin CRUD
+async def get_admin_ids(session: AsyncSession) -> List[int]:
+    result = await session.execute(select(Admin.telegram_id))
+    return result.scalars().all()
+
+async def add_admin(session: AsyncSession, telegram_id: int, added_by: int) -> bool:
+    """Добавляет администратора. Возвращает False, если он уже был добавлен."""
+    stmt = dialect_insert(Admin).values(telegram_id=telegram_id, added_by=added_by)
+    result = await session.execute(stmt.on_conflict_do_nothing(index_elements=[Admin.telegram_id]))
+    await session.commit()
+    return result.rowcount > 0
+
+async def remove_admin(session: AsyncSession, telegram_id: int) -> bool:
+    result = await session.execute(delete(Admin).where(Admin.telegram_id == telegram_id))
+    await session.commit()
+    return result.rowcount > 0
+
+# Broadcast CRUD
+BROADCAST_SEGMENTS = ("all", "active", "expiring", "open_tickets")
+
+def _segment_user_ids(segment: str, days: Optional[int]):
+    """SELECT telegram_id получателей сегмента (колонка user_id)."""
+    now = datetime.utcnow()
+    if segment == "all":
+        return select(User.telegram_id.label("user_id"))
+    if segment == "active":
+        return select(Subscription.user_id).where(Subscription.end_date >= now)
+    if segment == "expiring":
+        return select(Subscription.user_id).where(
+            Subscription.end_date >= now,
+            Subscription.end_date < now + timedelta(days=days),
+        )
+    if segment == "open_tickets":
+        return select(Ticket.owner_id.label("user_id")).where(Ticket.status != TicketStatus.CLOSED).distinct()
+    raise ValueError(f"Unknown broadcast segment: {segment}")
+
+async def create_broadcast(
+    session: AsyncSession, created_by: int, segment: str, days: Optional[int], from_chat_id: int, message_id: int
+) -> Broadcast:
+    """Создает черновик рассылки и сразу фиксирует список получателей одним INSERT ... SELECT."""
+    broadcast = Broadcast(
+        created_by=created_by, segment=segment, segment_days=days,
+        from_chat_id=from_chat_id, message_id=message_id, status=BroadcastStatus.DRAFT,
+    )
+    session.add(broadcast)
+    await session.flush()
+
+    recipients = _segment_user_ids(segment, days).subquery()
+    result = await session.execute(
+        insert(BroadcastRecipient).from_select(
+            ["broadcast_id", "user_id"],
+            select(literal(broadcast.id), recipients.c.user_id).where(recipients.c.user_id.is_not(None)),
+        )
+    )
+    broadcast.total = result.rowcount
+    await session.commit()
+    return broadcast
+
+async def get_broadcast(session: AsyncSession, broadcast_id: int) -> Optional[Broadcast]:
+    return await session.get(Broadcast, broadcast_id)
+
+async def get_running_broadcasts(session: AsyncSession) -> List[Broadcast]:
+    result = await session.execute(select(Broadcast).where(Broadcast.status == BroadcastStatus.RUNNING))
+    return result.scalars().all()
+
+async def start_broadcast(session: AsyncSession, broadcast_id: int, status_chat_id: int, status_message_id: int) -> bool:
+    """Переводит черновик в отправку. False, если рассылка уже запущена или отменена."""
+    result = await session.execute(
+        update(Broadcast)
+        .where(Broadcast.id == broadcast_id, Broadcast.status == BroadcastStatus.DRAFT)
+        .values(status=BroadcastStatus.RUNNING, status_chat_id=status_chat_id, status_message_id=status_message_id)
+    )
+    await session.commit()
+    return result.rowcount > 0
+
+async def cancel_broadcast(session: AsyncSession, broadcast_id: int) -> bool:
+    result = await session.execute(
+        update(Broadcast)
+        .where(Broadcast.id == broadcast_id, Broadcast.status == BroadcastStatus.DRAFT)
+        .values(status=BroadcastStatus.CANCELLED, finished_at=datetime.utcnow())
+    )
+    cancelled = result.rowcount > 0
+    if cancelled:
+        # Только у отмененного черновика: у запущенной рассылки это ее состояние доставки
+        await session.execute(delete(BroadcastRecipient).where(BroadcastRecipient.broadcast_id == broadcast_id))
+    await session.commit()
+    return cancelled
+
+async def finish_broadcast(session: AsyncSession, broadcast_id: int):
+    await session.execute(
+        update(Broadcast)
+        .where(Broadcast.id == broadcast_id)
+        .values(status=BroadcastStatus.DONE, finished_at=datetime.utcnow())
+    )
+    await session.commit()
+
+async def get_pending_recipients(
+    session: AsyncSession, broadcast_id: int, after_user_id: Optional[int] = None, limit: int = 50
+) -> List[int]:
+    """Следующая пачка неотправленных получателей по возрастанию user_id (по индексу)."""
+    query = select(BroadcastRecipient.user_id).where(
+        BroadcastRecipient.broadcast_id == broadcast_id,
+        BroadcastRecipient.status == DeliveryStatus.PENDING,
+    )
+    if after_user_id is not None:
+        query = query.where(BroadcastRecipient.user_id > after_user_id)
+    result = await session.execute(query.order_by(BroadcastRecipient.user_id).limit(limit))
+    return result.scalars().all()
+
+async def save_delivery_results(session: AsyncSession, broadcast_id: int, sent: List[int], failed: List[int]):
+    """Сохраняет результаты пачки одной транзакцией."""
+    for user_ids, status in ((sent, DeliveryStatus.SENT), (failed, DeliveryStatus.FAILED)):
+        if user_ids:
+            await session.execute(
+                update(BroadcastRecipient)
+                .where(BroadcastRecipient.broadcast_id == broadcast_id, BroadcastRecipient.user_id.in_(user_ids))
+                .values(status=status)
+            )
+    await session.commit()
+
+async def get_broadcast_progress(session: AsyncSession, broadcast_id: int) -> Dict[DeliveryStatus, int]:
+    result = await session.execute(
+        select(BroadcastRecipient.status, func.count())
+        .where(BroadcastRecipient.broadcast_id == broadcast_id)
+        .group_by(BroadcastRecipient.status)
+    )
+    return dict(result.all())
+
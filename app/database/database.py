@@ -1,44 +1,64 @@
 # /Users/mac/projects/ticket_bot/app/database/database.py
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.config import settings
-from .models import Base
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Создание асинхронного движка
-engine = create_async_engine(settings.db_url, echo=False)
 
-# Создание фабрики сессий
-AsyncSessionFactory = sessionmaker(
-    bind=engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
-)
+def create_engine_from_settings(db_url: Optional[str] = None):
+    """Создает асинхронный движок (SQLite или PostgreSQL) с пулом соединений. По умолчанию - для DB_URL."""
+    db_url = db_url or settings.db_url
+    connect_args = {}
+    if make_url(db_url).get_backend_name() == "postgresql":
+        # Кэш подготовленных выражений: asyncpg и адаптер SQLAlchemy держат каждый свой.
+        # now() в server_default должен давать UTC, как и datetime.utcnow() в коде
+        connect_args = {
+            "statement_cache_size": settings.db_statement_cache_size,
+            "prepared_statement_cache_size": settings.db_statement_cache_size,
+            "server_settings": {"timezone": "UTC"},
+        }
 
-async def init_db():
-    """Инициализация базы данных и создание таблиц."""
-    async with engine.begin() as conn:
-        try:
-            # await conn.run_sync(Base.metadata.drop_all) # Для отладки, удаляет все таблицы
-            await conn.run_sync(Base.metadata.create_all)
-            logger.info("Database tables created successfully.")
-        except Exception as e:
-            logger.error(f"Error creating database tables: {e}")
-            raise
+    # aiosqlite по умолчанию использует NullPool и открывает файл заново на каждую сессию,
+    # поэтому явно включаем пул, чтобы соединения (и их PRAGMA) переиспользовались
+    engine = create_async_engine(
+        db_url,
+        echo=False,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        connect_args=connect_args,
+    )
 
-from contextlib import asynccontextmanager
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
-from app.config import settings
-from .models import Base
-import logging
+    if engine.dialect.name == "sqlite":
+        @event.listens_for(engine.sync_engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            # WAL позволяет читателям (планировщик) не блокировать писателей (хендлеры) и наоборот
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute(f"PRAGMA busy_timeout={settings.sqlite_busy_timeout}")
+            cursor.execute(f"PRAGMA mmap_size={settings.sqlite_mmap_size}")
+            cursor.execute(f"PRAGMA cache_size={settings.sqlite_cache_size}")
+            cursor.close()
+
+    return engine
 
-logger = logging.getLogger(__name__)
 
 # Создание асинхронного движка
-engine = create_async_engine(settings.db_url, echo=False)
+engine = create_engine_from_settings()
 
 # Создание фабрики сессий
 AsyncSessionFactory = sessionmaker(
@@ -47,17 +67,38 @@ AsyncSessionFactory = sessionmaker(
     expire_on_commit=False,
 )
 
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+
+
+def run_migrations(connection):
+    """Применяет миграции Alembic на переданном соединении."""
+    config = Config()
+    config.set_main_option("script_location", str(MIGRATIONS_DIR))
+    config.attributes["connection"] = connection
+
+    tables = inspect(connection).get_table_names()
+    if "users" in tables and "alembic_version" not in tables:
+        # База создана до появления миграций (через create_all), помечаем исходную схему
+        command.stamp(config, "0001")
+    command.upgrade(config, "head")
+
+
 async def init_db():
-    """Инициализация базы данных и создание таблиц."""
+    """Инициализация базы данных и применение миграций."""
     async with engine.begin() as conn:
         try:
-            # await conn.run_sync(Base.metadata.drop_all) # Для отладки, удаляет все таблицы
-            await conn.run_sync(Base.metadata.create_all)
-            logger.info("Database tables created successfully.")
+            await conn.run_sync(run_migrations)
+            logger.info("Database migrations applied successfully.")
         except Exception as e:
-            logger.error(f"Error creating database tables: {e}")
+            logger.error(f"Error applying database migrations: {e}")
             raise
 
+def dialect_insert(entity):
+    """Возвращает INSERT с поддержкой ON CONFLICT для диалекта текущего движка (SQLite или PostgreSQL)."""
+    if engine.dialect.name == "postgresql":
+        return postgresql_insert(entity)
+    return sqlite_insert(entity)
+
 @asynccontextmanager
 async def get_session() -> AsyncSession:
     """Зависимость для получения сессии базы данных."""
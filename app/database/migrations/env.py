@@ -0,0 +1,64 @@
+# /Users/mac/projects/ticket_bot/app/database/migrations/env.py
+import asyncio
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy.engine import Connection
+from app.database.models import Base
+
+config = context.config
+
+# Логирование настраиваем только при запуске через CLI (alembic.ini)
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+# Объекты полнотекстового поиска (0008) создаются SQL-ом и не описаны в моделях
+SEARCH_OBJECTS = ("ticket_messages_fts", "ix_ticket_messages_text_search")
+
+
+def include_name(name, type_, parent_names):
+    return not (name or "").startswith(SEARCH_OBJECTS)
+
+
+def do_run_migrations(connection: Connection):
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_name=include_name,
+        # SQLite не умеет большинство ALTER TABLE, batch-режим пересоздает таблицу.
+        # Триггеры таблиц tickets и ticket_messages (0008, 0009) при этом пропадают,
+        # такая миграция должна создать их заново
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations():
+    from app.database.database import engine
+
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+
+
+def run_migrations_offline():
+    from app.config import settings
+
+    context.configure(
+        url=settings.db_url,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+elif config.attributes.get("connection") is not None:
+    # Соединение передано из init_db
+    do_run_migrations(config.attributes["connection"])
+else:
+    asyncio.run(run_async_migrations())
@@ -0,0 +1,81 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('telegram_id', sa.BigInteger(), nullable=True),
+        sa.Column('username', sa.String(), nullable=True),
+        sa.Column('active_ticket_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_users_id', 'users', ['id'], unique=False)
+    op.create_index('ix_users_telegram_id', 'users', ['telegram_id'], unique=True)
+
+    op.create_table(
+        'subscriptions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=True),
+        sa.Column('end_date', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.telegram_id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id'),
+    )
+    op.create_index('ix_subscriptions_id', 'subscriptions', ['id'], unique=False)
+
+    op.create_table(
+        'tickets',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('owner_id', sa.BigInteger(), nullable=True),
+        sa.Column('status', sa.Enum('OPEN', 'PENDING', 'ANSWERED', 'CLOSED', name='ticketstatus'), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.Column('last_message_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.telegram_id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_tickets_id', 'tickets', ['id'], unique=False)
+
+    op.create_table(
+        'ticket_messages',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('ticket_id', sa.Integer(), nullable=True),
+        sa.Column('sender_id', sa.BigInteger(), nullable=True),
+        sa.Column('message_type', sa.String(), nullable=True),
+        sa.Column('text', sa.Text(), nullable=True),
+        sa.Column('file_id', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['ticket_id'], ['tickets.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_ticket_messages_id', 'ticket_messages', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ticket_messages_id', table_name='ticket_messages')
+    op.drop_table('ticket_messages')
+    op.drop_index('ix_tickets_id', table_name='tickets')
+    op.drop_table('tickets')
+    op.drop_index('ix_subscriptions_id', table_name='subscriptions')
+    op.drop_table('subscriptions')
+    op.drop_index('ix_users_telegram_id', table_name='users')
+    op.drop_index('ix_users_id', table_name='users')
+    op.drop_table('users')
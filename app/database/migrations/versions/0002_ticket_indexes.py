@@ -0,0 +1,33 @@
+"""composite indexes for ticket queue, SLA scan and message history
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 12:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # get_tickets_by_status, find_tickets_for_sla_check
+    op.create_index('ix_tickets_status_last_message_at', 'tickets', ['status', 'last_message_at'], unique=False)
+    # get_user_tickets
+    op.create_index('ix_tickets_owner_id_status', 'tickets', ['owner_id', 'status'], unique=False)
+    # get_ticket_messages
+    op.create_index('ix_ticket_messages_ticket_id_created_at', 'ticket_messages', ['ticket_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ticket_messages_ticket_id_created_at', table_name='ticket_messages')
+    op.drop_index('ix_tickets_owner_id_status', table_name='tickets')
+    op.drop_index('ix_tickets_status_last_message_at', table_name='tickets')
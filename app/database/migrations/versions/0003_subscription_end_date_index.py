@@ -0,0 +1,27 @@
+"""index on subscriptions.end_date
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # get_expiring_subscriptions, find_subscriptions_for_notification
+    op.create_index('ix_subscriptions_end_date', 'subscriptions', ['end_date'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_subscriptions_end_date', table_name='subscriptions')
@@ -0,0 +1,35 @@
+"""fsm_records table for database-backed FSM storage
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'fsm_records',
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('state', sa.String(), nullable=True),
+        sa.Column('data', sa.Text(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('key'),
+    )
+    op.create_index('ix_fsm_records_expires_at', 'fsm_records', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_fsm_records_expires_at', table_name='fsm_records')
+    op.drop_table('fsm_records')
@@ -0,0 +1,32 @@
+"""admins table for operators added at runtime
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'admins',
+        sa.Column('telegram_id', sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column('added_by', sa.BigInteger(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('telegram_id'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('admins')
@@ -0,0 +1,64 @@
+"""broadcasts and per-recipient delivery state
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+broadcast_status = sa.Enum('DRAFT', 'RUNNING', 'DONE', 'CANCELLED', name='broadcaststatus')
+delivery_status = sa.Enum('PENDING', 'SENT', 'FAILED', name='deliverystatus')
+
+
+def upgrade() -> None:
+    op.create_table(
+        'broadcasts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('created_by', sa.BigInteger(), nullable=True),
+        sa.Column('segment', sa.String(), nullable=True),
+        sa.Column('segment_days', sa.Integer(), nullable=True),
+        sa.Column('from_chat_id', sa.BigInteger(), nullable=True),
+        sa.Column('message_id', sa.Integer(), nullable=True),
+        sa.Column('status', broadcast_status, nullable=True),
+        sa.Column('total', sa.Integer(), nullable=True),
+        sa.Column('status_chat_id', sa.BigInteger(), nullable=True),
+        sa.Column('status_message_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_broadcasts_status', 'broadcasts', ['status'], unique=False)
+    op.create_table(
+        'broadcast_recipients',
+        sa.Column('broadcast_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('status', delivery_status, server_default='PENDING', nullable=False),
+        sa.ForeignKeyConstraint(['broadcast_id'], ['broadcasts.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('broadcast_id', 'user_id'),
+    )
+    op.create_index(
+        'ix_broadcast_recipients_broadcast_id_status_user_id',
+        'broadcast_recipients',
+        ['broadcast_id', 'status', 'user_id'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_broadcast_recipients_broadcast_id_status_user_id', table_name='broadcast_recipients')
+    op.drop_table('broadcast_recipients')
+    op.drop_index('ix_broadcasts_status', table_name='broadcasts')
+    op.drop_table('broadcasts')
+    delivery_status.drop(op.get_bind(), checkfirst=True)
+    broadcast_status.drop(op.get_bind(), checkfirst=True)
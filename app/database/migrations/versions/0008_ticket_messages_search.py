@@ -0,0 +1,63 @@
+"""full-text search index over ticket message text
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        # Индекс по выражению: запросы в crud.search_tickets используют то же выражение
+        op.execute(
+            "CREATE INDEX ix_ticket_messages_text_search ON ticket_messages "
+            "USING gin (to_tsvector('russian', coalesce(text, '')))"
+        )
+        return
+
+    # Внешний контент: FTS5 хранит только индекс, текст читается из ticket_messages по rowid.
+    # Сообщения без текста тоже попадают в индекс (пустым документом), иначе он расходится с таблицей
+    op.execute(
+        "CREATE VIRTUAL TABLE ticket_messages_fts USING fts5("
+        "text, content='ticket_messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+    )
+    op.execute(
+        "CREATE TRIGGER ticket_messages_fts_insert AFTER INSERT ON ticket_messages BEGIN "
+        "INSERT INTO ticket_messages_fts(rowid, text) VALUES (new.id, new.text); "
+        "END"
+    )
+    op.execute(
+        "CREATE TRIGGER ticket_messages_fts_delete AFTER DELETE ON ticket_messages BEGIN "
+        "INSERT INTO ticket_messages_fts(ticket_messages_fts, rowid, text) VALUES ('delete', old.id, old.text); "
+        "END"
+    )
+    op.execute(
+        "CREATE TRIGGER ticket_messages_fts_update AFTER UPDATE OF text ON ticket_messages BEGIN "
+        "INSERT INTO ticket_messages_fts(ticket_messages_fts, rowid, text) VALUES ('delete', old.id, old.text); "
+        "INSERT INTO ticket_messages_fts(rowid, text) VALUES (new.id, new.text); "
+        "END"
+    )
+    # Индексирует уже сохраненные сообщения
+    op.execute("INSERT INTO ticket_messages_fts(ticket_messages_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_ticket_messages_text_search', table_name='ticket_messages')
+        return
+
+    op.execute("DROP TRIGGER ticket_messages_fts_update")
+    op.execute("DROP TRIGGER ticket_messages_fts_delete")
+    op.execute("DROP TRIGGER ticket_messages_fts_insert")
+    op.execute("DROP TABLE ticket_messages_fts")
@@ -0,0 +1,175 @@
+"""ticket_stats counters maintained by triggers, tickets.first_response_at
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+STATUSES = ('OPEN', 'PENDING', 'ANSWERED', 'CLOSED')
+# Верхние границы корзин времени первого ответа, секунды (последняя корзина - le_inf)
+FIRST_RESPONSE_BUCKETS = (300, 900, 3600, 4 * 3600, 24 * 3600)
+FIRST_RESPONSE_KEYS = (
+    ['first_response:count', 'first_response:seconds']
+    + [f'first_response:le_{bound}' for bound in FIRST_RESPONSE_BUCKETS]
+    + ['first_response:le_inf']
+)
+
+
+def _seconds(dialect: str, row: str) -> str:
+    """SQL-выражение: секунды от создания тикета до первого ответа."""
+    if dialect == 'postgresql':
+        return f"greatest(0, extract(epoch from {row}first_response_at - {row}created_at))::bigint"
+    return f"max(0, CAST(round((julianday({row}first_response_at) - julianday({row}created_at)) * 86400) AS INTEGER))"
+
+
+def _bucket_key(seconds: str) -> str:
+    """SQL-выражение: ключ корзины для числа секунд."""
+    cases = ' '.join(
+        f"WHEN {seconds} <= {bound} THEN 'first_response:le_{bound}'" for bound in FIRST_RESPONSE_BUCKETS
+    )
+    return f"CASE {cases} ELSE 'first_response:le_inf' END"
+
+
+def _first_response_update(dialect: str, row: str) -> str:
+    # Все затронутые счетчики одним UPDATE: блокировки строк берутся в одном порядке
+    seconds = _seconds(dialect, row)
+    return (
+        "UPDATE ticket_stats SET value = value + "
+        f"CASE WHEN key = 'first_response:seconds' THEN {seconds} ELSE 1 END "
+        f"WHERE key IN ('first_response:count', 'first_response:seconds', {_bucket_key(seconds)})"
+    )
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    op.add_column('tickets', sa.Column('first_response_at', sa.DateTime(), nullable=True))
+    ticket_stats = op.create_table(
+        'ticket_stats',
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('value', sa.BigInteger(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('key'),
+    )
+
+    # Заполнение по существующим данным
+    op.execute(
+        "UPDATE tickets SET first_response_at = ("
+        "SELECT min(m.created_at) FROM ticket_messages m "
+        "WHERE m.ticket_id = tickets.id AND m.sender_id <> tickets.owner_id)"
+    )
+    op.bulk_insert(
+        ticket_stats,
+        [{'key': f'status:{status}', 'value': 0} for status in STATUSES]
+        + [{'key': key, 'value': 0} for key in FIRST_RESPONSE_KEYS],
+    )
+    for status in STATUSES:
+        op.execute(
+            f"UPDATE ticket_stats SET value = (SELECT count(*) FROM tickets WHERE status = '{status}') "
+            f"WHERE key = 'status:{status}'"
+        )
+    seconds = _seconds(dialect, '')
+    responded = "FROM tickets WHERE first_response_at IS NOT NULL"
+    op.execute(f"UPDATE ticket_stats SET value = (SELECT count(*) {responded}) WHERE key = 'first_response:count'")
+    op.execute(
+        f"UPDATE ticket_stats SET value = (SELECT coalesce(sum({seconds}), 0) {responded}) "
+        "WHERE key = 'first_response:seconds'"
+    )
+    op.execute(
+        f"UPDATE ticket_stats SET value = (SELECT count(*) {responded} AND {_bucket_key(seconds)} = ticket_stats.key) "
+        "WHERE key LIKE 'first_response:le%'"
+    )
+
+    if dialect == 'postgresql':
+        op.execute(
+            "CREATE FUNCTION ticket_stats_status() RETURNS trigger AS $$ BEGIN "
+            "IF TG_OP = 'UPDATE' AND OLD.status IS NOT DISTINCT FROM NEW.status THEN RETURN NULL; END IF; "
+            # Для INSERT OLD, а для DELETE NEW равны NULL, и их ключ просто не совпадет
+            "UPDATE ticket_stats SET value = value + CASE WHEN key = 'status:' || NEW.status THEN 1 ELSE -1 END "
+            "WHERE key IN ('status:' || OLD.status, 'status:' || NEW.status); "
+            "RETURN NULL; END $$ LANGUAGE plpgsql"
+        )
+        op.execute(
+            "CREATE TRIGGER tickets_stats_status AFTER INSERT OR DELETE OR UPDATE OF status ON tickets "
+            "FOR EACH ROW EXECUTE FUNCTION ticket_stats_status()"
+        )
+        op.execute(
+            "CREATE FUNCTION ticket_stats_first_response() RETURNS trigger AS $$ BEGIN "
+            f"{_first_response_update(dialect, 'NEW.')}; "
+            "RETURN NULL; END $$ LANGUAGE plpgsql"
+        )
+        op.execute(
+            "CREATE TRIGGER tickets_stats_first_response AFTER UPDATE OF first_response_at ON tickets "
+            "FOR EACH ROW WHEN (OLD.first_response_at IS NULL AND NEW.first_response_at IS NOT NULL) "
+            "EXECUTE FUNCTION ticket_stats_first_response()"
+        )
+        op.execute(
+            "CREATE FUNCTION ticket_first_response() RETURNS trigger AS $$ BEGIN "
+            "UPDATE tickets SET first_response_at = NEW.created_at "
+            "WHERE id = NEW.ticket_id AND first_response_at IS NULL AND owner_id IS DISTINCT FROM NEW.sender_id; "
+            "RETURN NULL; END $$ LANGUAGE plpgsql"
+        )
+        op.execute(
+            "CREATE TRIGGER ticket_messages_first_response AFTER INSERT ON ticket_messages "
+            "FOR EACH ROW EXECUTE FUNCTION ticket_first_response()"
+        )
+        return
+
+    op.execute(
+        "CREATE TRIGGER tickets_stats_insert AFTER INSERT ON tickets BEGIN "
+        "UPDATE ticket_stats SET value = value + 1 WHERE key = 'status:' || new.status; "
+        "END"
+    )
+    op.execute(
+        "CREATE TRIGGER tickets_stats_delete AFTER DELETE ON tickets BEGIN "
+        "UPDATE ticket_stats SET value = value - 1 WHERE key = 'status:' || old.status; "
+        "END"
+    )
+    op.execute(
+        "CREATE TRIGGER tickets_stats_status AFTER UPDATE OF status ON tickets "
+        "WHEN old.status IS NOT new.status BEGIN "
+        "UPDATE ticket_stats SET value = value + CASE WHEN key = 'status:' || new.status THEN 1 ELSE -1 END "
+        "WHERE key IN ('status:' || old.status, 'status:' || new.status); "
+        "END"
+    )
+    op.execute(
+        "CREATE TRIGGER tickets_stats_first_response AFTER UPDATE OF first_response_at ON tickets "
+        "WHEN old.first_response_at IS NULL AND new.first_response_at IS NOT NULL BEGIN "
+        f"{_first_response_update(dialect, 'new.')}; "
+        "END"
+    )
+    op.execute(
+        "CREATE TRIGGER ticket_messages_first_response AFTER INSERT ON ticket_messages BEGIN "
+        "UPDATE tickets SET first_response_at = new.created_at "
+        "WHERE id = new.ticket_id AND first_response_at IS NULL AND owner_id IS NOT new.sender_id; "
+        "END"
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP TRIGGER ticket_messages_first_response ON ticket_messages")
+        op.execute("DROP TRIGGER tickets_stats_first_response ON tickets")
+        op.execute("DROP TRIGGER tickets_stats_status ON tickets")
+        op.execute("DROP FUNCTION ticket_first_response()")
+        op.execute("DROP FUNCTION ticket_stats_first_response()")
+        op.execute("DROP FUNCTION ticket_stats_status()")
+    else:
+        op.execute("DROP TRIGGER ticket_messages_first_response")
+        op.execute("DROP TRIGGER tickets_stats_first_response")
+        op.execute("DROP TRIGGER tickets_stats_status")
+        op.execute("DROP TRIGGER tickets_stats_delete")
+        op.execute("DROP TRIGGER tickets_stats_insert")
+    op.drop_table('ticket_stats')
+    with op.batch_alter_table('tickets') as batch_op:
+        batch_op.drop_column('first_response_at')
@@ -1,24 +1,37 @@
 # /Users/mac/projects/ticket_bot/app/database/models.py
 import enum
-from sqlalchemy import (Column, Integer, String, DateTime, Enum, ForeignKey, BigInteger, Text)
+from sqlalchemy import (Column, Integer, String, DateTime, Enum, ForeignKey, BigInteger, Text, Index, PrimaryKeyConstraint)
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.sql import func
 
 Base = declarative_base()
 
+# Все даты хранятся как naive UTC (datetime.utcnow()), одинаково для SQLite и PostgreSQL
+
 class TicketStatus(enum.Enum):
     OPEN = "open"
     PENDING = "pending" # Ждет ответа клиента
     ANSWERED = "answered" # Ждет ответа админа
     CLOSED = "closed"
 
+class BroadcastStatus(enum.Enum):
+    DRAFT = "draft" # Получатели выбраны, ждет подтверждения
+    RUNNING = "running"
+    DONE = "done"
+    CANCELLED = "cancelled"
+
+class DeliveryStatus(enum.Enum):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+
 class User(Base):
     __tablename__ = 'users'
     id = Column(Integer, primary_key=True, index=True)
     telegram_id = Column(BigInteger, unique=True, index=True)
     username = Column(String)
     active_ticket_id = Column(Integer, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime, server_default=func.now())
 
     tickets = relationship("Ticket", back_populates="owner")
     subscription = relationship("Subscription", uselist=False, back_populates="user")
@@ -28,12 +41,21 @@ class Ticket(Base):
     id = Column(Integer, primary_key=True, index=True)
     owner_id = Column(BigInteger, ForeignKey('users.telegram_id'))
     status = Column(Enum(TicketStatus), default=TicketStatus.OPEN)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    last_message_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
+    created_at = Column(DateTime, server_default=func.now())
+    last_message_at = Column(DateTime, onupdate=func.now(), server_default=func.now())
+    sla_alerted_at = Column(DateTime, nullable=True) # Когда админам отправлено уведомление о нарушении SLA
+    first_response_at = Column(DateTime, nullable=True) # Первое сообщение не от владельца; ставит триггер БД
 
     owner = relationship("User", back_populates="tickets")
     messages = relationship("TicketMessage", back_populates="ticket", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Очередь тикетов по статусу и проверка SLA
+        Index("ix_tickets_status_last_message_at", "status", "last_message_at"),
+        # Тикеты пользователя
+        Index("ix_tickets_owner_id_status", "owner_id", "status"),
+    )
+
 class TicketMessage(Base):
     __tablename__ = 'ticket_messages'
     id = Column(Integer, primary_key=True, index=True)
@@ -42,14 +64,73 @@ class TicketMessage(Base):
     message_type = Column(String) # 'text', 'photo', 'video', 'document'
     text = Column(Text, nullable=True)
     file_id = Column(String, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime, server_default=func.now())
 
     ticket = relationship("Ticket", back_populates="messages")
 
+    __table_args__ = (
+        # История сообщений тикета
+        Index("ix_ticket_messages_ticket_id_created_at", "ticket_id", "created_at"),
+    )
+
 class Subscription(Base):
     __tablename__ = 'subscriptions'
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(BigInteger, ForeignKey('users.telegram_id'), unique=True)
-    end_date = Column(DateTime(timezone=True))
+    end_date = Column(DateTime, index=True)
     
     user = relationship("User", back_populates="subscription")
+
+class FsmRecord(Base):
+    """Состояние и данные FSM для DatabaseStorage."""
+    __tablename__ = 'fsm_records'
+    key = Column(String, primary_key=True)
+    state = Column(String, nullable=True)
+    data = Column(Text, nullable=True) # JSON
+    expires_at = Column(DateTime, index=True)
+
+class TicketStat(Base):
+    """
+    Счетчики по тикетам для /stats. Обновляются триггерами БД (миграция 0009) при каждой
+    смене статуса и первом ответе, поэтому читать их можно без обхода таблицы тикетов.
+    """
+    __tablename__ = 'ticket_stats'
+    key = Column(String, primary_key=True) # 'status:OPEN', 'first_response:count', 'first_response:le_300'...
+    value = Column(BigInteger, nullable=False, server_default='0')
+
+class Admin(Base):
+    """Администраторы, добавленные командой /addadmin (в дополнение к ADMIN_IDS)."""
+    __tablename__ = 'admins'
+    telegram_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    added_by = Column(BigInteger, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+
+class Broadcast(Base):
+    """Рассылка: сообщение админа, копируемое всем получателям сегмента."""
+    __tablename__ = 'broadcasts'
+    id = Column(Integer, primary_key=True)
+    created_by = Column(BigInteger)
+    segment = Column(String) # all, active, expiring, open_tickets
+    segment_days = Column(Integer, nullable=True) # для expiring
+    from_chat_id = Column(BigInteger) # исходное сообщение для copy_message
+    message_id = Column(Integer)
+    status = Column(Enum(BroadcastStatus), default=BroadcastStatus.DRAFT, index=True)
+    total = Column(Integer, default=0)
+    status_chat_id = Column(BigInteger, nullable=True) # сообщение с прогрессом
+    status_message_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+    finished_at = Column(DateTime, nullable=True)
+
+class BroadcastRecipient(Base):
+    """Состояние доставки рассылки одному пользователю; по нему рассылка продолжается после перезапуска."""
+    __tablename__ = 'broadcast_recipients'
+    broadcast_id = Column(Integer, ForeignKey('broadcasts.id', ondelete='CASCADE'))
+    user_id = Column(BigInteger)
+    # Заполняется сервером, чтобы получателей можно было вставлять через INSERT ... SELECT
+    status = Column(Enum(DeliveryStatus), server_default=DeliveryStatus.PENDING.name, nullable=False)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("broadcast_id", "user_id"),
+        # Выборка следующей пачки неотправленных и подсчет прогресса
+        Index("ix_broadcast_recipients_broadcast_id_status_user_id", "broadcast_id", "status", "user_id"),
+    )
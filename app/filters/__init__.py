@@ -0,0 +1 @@
+# /Users/mac/projects/ticket_bot/app/filters/__init__.py
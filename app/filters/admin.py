@@ -0,0 +1,19 @@
+# /Users/mac/projects/ticket_bot/app/filters/admin.py
+from typing import Union
+from aiogram.filters import BaseFilter
+from aiogram.types import CallbackQuery, Message
+from app.services.admins import admin_registry
+
+
+class IsAdmin(BaseFilter):
+    """Пропускает апдейты от администраторов (владельцев, если owner=True)."""
+
+    def __init__(self, owner: bool = False):
+        self.owner = owner
+
+    async def __call__(self, event: Union[Message, CallbackQuery]) -> bool:
+        if event.from_user is None:
+            return False
+        if self.owner:
+            return admin_registry.is_owner(event.from_user.id)
+        return admin_registry.is_admin(event.from_user.id)
@@ -1,25 +1,43 @@
 # /Users/mac/projects/ticket_bot/app/handlers/admin.py
 import contextlib
+import csv
+import html
+import os
+import tempfile
 from aiogram import Router, F, Bot
+from aiogram.exceptions import TelegramAPIError
 from aiogram.fsm.context import FSMContext
-from aiogram.types import Message, CallbackQuery
-from aiogram.filters import Command
+from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.filters import Command, CommandObject
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import crud
-from app.database.database import get_session
 from app.database.models import TicketStatus
+from app.filters.admin import IsAdmin
 from app.keyboards import admin_kb
 from app.config import settings
-from app.states.states import AdminState, ManageSubscription
+from app.states.states import AdminState, BroadcastState, ManageSubscription
+from app.services.message_writer import message_writer
+from app.services.sla import sla_tracker
+from app.services.admins import admin_registry
+from app.services.broadcast import broadcast_sender
+from app.services.export import EXPORT_FORMATS, export_to_file
+from app.services.subscription_import import ImportReport, import_subscriptions, renewal_end_date
+from app.services.history import HISTORY_PAGE_SIZE, format_search_snippet, page_cursors, render_history_chunks
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
+from typing import Optional
 import logging # New import
 
 logger = logging.getLogger(__name__) # New line
 
-router = Router()
-router.message.filter(F.from_user.id.in_(settings.admin_ids))
-router.callback_query.filter(F.from_user.id.in_(settings.admin_ids))
+# Максимальный размер файла, который бот может отправить
+TELEGRAM_DOCUMENT_LIMIT = 50 * 1024 * 1024
+# Максимальный размер файла, который бот может скачать
+TELEGRAM_DOWNLOAD_LIMIT = 20 * 1024 * 1024
+
+router = Router(name="admin")
+router.message.filter(IsAdmin())
+router.callback_query.filter(IsAdmin())
 
 
 @router.message(Command("admin"))
@@ -27,177 +45,451 @@ async def admin_menu_handler(message: Message):
     await message.answer("Админ-панель", reply_markup=admin_kb.get_admin_main_menu())
 
 
-@router.message(Command("list"))
-async def list_users_handler(message: Message):
-    async with get_session() as session:
-        users_with_subscriptions = await crud.get_all_users_with_subscriptions(session)
-    
-    if not users_with_subscriptions:
-        await message.answer("Пользователи не найдены.")
+@router.message(Command("export", "list"))
+async def export_handler(message: Message, command: CommandObject):
+    # /list - краткая форма /export users
+    args = (command.args or "").split() if command.command == "export" else ["users"]
+    kind = args[0] if args else "users"
+    fmt = args[1] if len(args) > 1 else "csv"
+    if kind not in crud.EXPORT_KINDS or fmt not in EXPORT_FORMATS:
+        await message.answer(
+            f"Использование: /export [{'|'.join(crud.EXPORT_KINDS)}] [{'|'.join(EXPORT_FORMATS)}]"
+        )
         return
 
-    current_response_part = "<b>Список пользователей:</b>\n\n"
-    for user, subscription in users_with_subscriptions:
-        end_date_str = subscription.end_date.strftime('%d.%m.%Y') if subscription else "Нет"
-        user_info = (
-            f"ID: <code>{user.telegram_id}</code>\n"
-            f"Username: @{user.username}\n"
-            f"Подписка до: {end_date_str}\n\n"
+    status_message = await message.answer("Готовлю выгрузку...")
+    path = None
+    try:
+        path = await export_to_file(kind, fmt)
+        if os.path.getsize(path) > TELEGRAM_DOCUMENT_LIMIT:
+            await status_message.edit_text("Выгрузка больше 50 МБ, Telegram не примет такой файл.")
+            return
+        filename = f"{kind}_{datetime.utcnow():%Y%m%d_%H%M}.{fmt}.gz"
+        await message.answer_document(FSInputFile(path, filename=filename))
+        await status_message.delete()
+    except (SQLAlchemyError, OSError, TelegramAPIError):
+        logger.exception("Export failed", extra={"admin_id": message.from_user.id, "kind": kind, "format": fmt})
+        await status_message.edit_text("Не удалось подготовить выгрузку, подробности в логах.")
+    finally:
+        # Недописанный файл export_to_file удаляет сам, здесь - готовый
+        if path is not None:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+
+
+STATS_STATUSES = (
+    (TicketStatus.OPEN, "Новые"),
+    (TicketStatus.ANSWERED, "Ждут ответа поддержки"),
+    (TicketStatus.PENDING, "Ждут ответа клиента"),
+    (TicketStatus.CLOSED, "Закрытые"),
+)
+
+
+def format_duration(seconds: float) -> str:
+    minutes = int(seconds // 60)
+    if minutes < 60:
+        return f"{minutes} мин"
+    hours, minutes = divmod(minutes, 60)
+    if hours < 24:
+        return f"{hours} ч {minutes} мин"
+    days, hours = divmod(hours, 24)
+    return f"{days} д {hours} ч"
+
+
+def first_response_median(stats: dict) -> Optional[str]:
+    """Медиана времени первого ответа с точностью до корзины: 'до 15 мин' или 'больше 24 ч'."""
+    count = stats.get("first_response:count", 0)
+    if not count:
+        return None
+    buckets = sorted(
+        (int(key.rsplit("_", 1)[1]), value)
+        for key, value in stats.items()
+        if key.startswith("first_response:le_") and key != "first_response:le_inf"
+    )
+    seen = 0
+    for bound, value in buckets:
+        seen += value
+        if seen * 2 >= count:
+            return f"до {format_duration(bound)}"
+    return f"больше {format_duration(buckets[-1][0])}" if buckets else None
+
+
+@router.message(Command("stats"))
+async def stats_handler(message: Message, session: AsyncSession):
+    stats = await crud.get_ticket_stats(session)
+    oldest = await crud.get_oldest_waiting_ticket(session)
+
+    counts = {status: stats.get(f"status:{status.name}", 0) for status, _ in STATS_STATUSES}
+    waiting = sum(counts[status] for status in crud.SLA_WAITING_STATUSES)
+    lines = ["📊 <b>Тикеты</b>"]
+    for status, title in STATS_STATUSES:
+        lines.append(f"{admin_kb.STATUS_EMOJI[status]} {title}: {counts[status]}")
+    lines.append(f"Всего: {sum(counts.values())}")
+    lines.append(f"\nВ очереди поддержки: {waiting}")
+    if oldest:
+        ticket_id, waiting_since = oldest
+        lines.append(
+            f"Дольше всех ждет тикет #{ticket_id}: {format_duration((datetime.utcnow() - waiting_since).total_seconds())}"
         )
-        
-        if len(current_response_part) + len(user_info) > 4000: # Keep some buffer for HTML tags
-            await message.answer(current_response_part)
-            current_response_part = user_info
-        else:
-            current_response_part += user_info
-    
-    if current_response_part:
-        await message.answer(current_response_part)
 
+    responded = stats.get("first_response:count", 0)
+    if responded:
+        average = stats.get("first_response:seconds", 0) / responded
+        lines.append(f"\nПервый ответ, тикетов с ответом: {responded}")
+        lines.append(f"в среднем {format_duration(average)}, медиана {first_response_median(stats)}")
+    await message.answer("\n".join(lines))
 
 
-@router.message(F.text == "Открытые тикеты")
-async def open_tickets_handler(message: Message):
-    async with get_session() as session:
-        open_tickets = await crud.get_tickets_by_status(session, TicketStatus.OPEN)
-        answered_tickets = await crud.get_tickets_by_status(
-            session, TicketStatus.ANSWERED
+SEARCH_PAGE_SIZE = 5
+
+
+@router.message(Command("search"))
+async def search_handler(
+    message: Message, command: CommandObject, state: FSMContext, session: AsyncSession
+):
+    if not command.args or not command.args.strip():
+        await message.answer("Использование: /search &lt;слова из переписки&gt;")
+        return
+
+    search_query = command.args.strip()
+    await state.update_data(search_query=search_query)
+    text, reply_markup = await render_search_page(session, search_query, 0)
+    await message.answer(text, reply_markup=reply_markup)
+
+
+@router.callback_query(admin_kb.SearchPageCallback.filter())
+async def search_page_handler(
+    query: CallbackQuery,
+    callback_data: admin_kb.SearchPageCallback,
+    state: FSMContext,
+    session: AsyncSession,
+):
+    search_query = (await state.get_data()).get("search_query")
+    if not search_query:
+        await query.answer("Поиск устарел, повторите /search.", show_alert=True)
+        return
+
+    text, reply_markup = await render_search_page(session, search_query, callback_data.offset)
+    await query.message.edit_text(text, reply_markup=reply_markup)
+    await query.answer()
+
+
+async def render_search_page(session: AsyncSession, search_query: str, offset: int):
+    """Возвращает текст и клавиатуру страницы результатов поиска, начиная с offset."""
+    hits, has_next, truncated = await crud.search_tickets(session, search_query, offset, SEARCH_PAGE_SIZE)
+
+    title = f"Поиск: <b>{html.escape(search_query, quote=False)}</b>"
+    if not hits:
+        return f"{title}\nНичего не найдено.", None
+
+    lines = [f"{title}\n"]
+    for number, hit in enumerate(hits, start=offset + 1):
+        lines.append(f"{number}. Тикет #{hit.ticket_id}: {format_search_snippet(hit.snippet)}")
+    if truncated:
+        lines.append(
+            f"\nСовпадений слишком много: показаны тикеты только из {crud.SEARCH_CANDIDATES} последних "
+            "подходящих сообщений. Уточните запрос, чтобы найти более старые."
         )
+    reply_markup = admin_kb.get_search_results_kb(hits, offset, SEARCH_PAGE_SIZE, has_next)
+    return "\n".join(lines), reply_markup
 
-        tickets = open_tickets + answered_tickets
 
-        if not tickets:
-            await message.answer("Нет открытых тикетов.")
-            return
+@router.message(Command("import"))
+async def import_subscriptions_start(message: Message, state: FSMContext):
+    await state.set_state(ManageSubscription.get_import_file)
+    await message.answer(
+        "Отправьте CSV-файл, по строке на пользователя:\n"
+        "<code>telegram_id,ДД-ММ-ГГГГ</code> - задать дату окончания подписки\n"
+        "<code>telegram_id,+N</code> - продлить на N месяцев"
+    )
 
-        await message.answer(
-            "Открытые тикеты:",
-            reply_markup=await admin_kb.get_tickets_list_kb(tickets, "open"),
+
+@router.message(ManageSubscription.get_import_file, F.document)
+async def import_subscriptions_file(message: Message, state: FSMContext, bot: Bot):
+    if message.document.file_size and message.document.file_size > TELEGRAM_DOWNLOAD_LIMIT:
+        await message.answer("Файл больше 20 МБ, бот не может его скачать. Разбейте его на части.")
+        return
+    await state.clear()
+
+    status_message = await message.answer("Загружаю подписки...")
+    fd, path = tempfile.mkstemp(prefix="import_", suffix=".csv")
+    os.close(fd)
+    report = ImportReport()
+    try:
+        await bot.download(message.document, destination=path)
+        await import_subscriptions(path, report=report)
+    except (UnicodeDecodeError, csv.Error, SQLAlchemyError) as e:
+        logger.exception(
+            "Subscription import failed",
+            extra={"admin_id": message.from_user.id, "applied": report.applied},
+        )
+        if isinstance(e, UnicodeDecodeError):
+            reason = "файл должен быть в кодировке UTF-8"
+        elif isinstance(e, csv.Error):
+            reason = f"файл не разбирается как CSV ({html.escape(str(e), quote=False)})"
+        else:
+            reason = "ошибка базы данных"
+        await status_message.edit_text(
+            f"Импорт прерван: {reason}.\n"
+            f"До ошибки применено строк: {report.applied}, они остаются в силе."
         )
+        return
+    finally:
+        os.remove(path)
+
+    lines = [
+        "Импорт завершен.",
+        f"Задана дата окончания: {report.set_dates}",
+        f"Продлено: {report.extended}",
+        f"Отклонено строк: {report.rejected}",
+    ]
+    for line_number, reason in report.rejected_rows:
+        lines.append(f"  строка {line_number}: {html.escape(reason, quote=False)}")
+    if report.rejected > len(report.rejected_rows):
+        lines.append(f"  ...и еще {report.rejected - len(report.rejected_rows)}")
+    await status_message.edit_text("\n".join(lines))
+
+
+@router.message(ManageSubscription.get_import_file)
+async def import_subscriptions_not_file(message: Message):
+    await message.answer("Нужен CSV-файл, отправленный документом.")
+
+
+@router.message(Command("addadmin", "deladmin"), IsAdmin(owner=True))
+async def manage_admins_handler(message: Message, command: CommandObject, session: AsyncSession):
+    if not command.args or not command.args.strip().isdigit():
+        await message.answer(f"Использование: /{command.command} &lt;Telegram ID&gt;")
+        return
+
+    admin_id = int(command.args.strip())
+    if admin_registry.is_owner(admin_id):
+        await message.answer("Этот администратор задан в ADMIN_IDS, его нельзя изменить из бота.")
+        return
+
+    if command.command == "addadmin":
+        changed = await crud.add_admin(session, admin_id, message.from_user.id)
+        text = f"Администратор {admin_id} добавлен." if changed else f"{admin_id} уже администратор."
+    else:
+        changed = await crud.remove_admin(session, admin_id)
+        text = f"Администратор {admin_id} удален." if changed else f"{admin_id} не был администратором."
+    await admin_registry.reload()
+    await message.answer(text)
+
+
+
+TICKETS_PAGE_SIZE = 20
+
+TICKET_LISTS = {
+    "open": ("Открытые тикеты:", "Нет открытых тикетов.", [TicketStatus.OPEN, TicketStatus.ANSWERED]),
+    "closed": ("Закрытые тикеты:", "Нет закрытых тикетов.", [TicketStatus.CLOSED]),
+}
+
+
+@router.message(F.text == "Открытые тикеты")
+async def open_tickets_handler(message: Message, session: AsyncSession):
+    await send_tickets_first_page(message, session, "open")
 
 
 @router.message(F.text == "Закрытые тикеты")
-async def closed_tickets_handler(message: Message):
-    async with get_session() as session:
-        tickets = await crud.get_tickets_by_status(session, TicketStatus.CLOSED)
+async def closed_tickets_handler(message: Message, session: AsyncSession):
+    await send_tickets_first_page(message, session, "closed")
 
-        if not tickets:
-            await message.answer("Нет закрытых тикетов.")
-            return
 
-        await message.answer(
-            "Закрытые тикеты:",
-            reply_markup=await admin_kb.get_tickets_list_kb(tickets, "closed"),
+async def send_tickets_first_page(message: Message, session: AsyncSession, ticket_type: str):
+    title, empty_text, statuses = TICKET_LISTS[ticket_type]
+    tickets, has_next = await crud.get_tickets_page(
+        session, statuses, limit=TICKETS_PAGE_SIZE
+    )
+
+    if not tickets:
+        await message.answer(empty_text)
+        return
+
+    await message.answer(
+        title,
+        reply_markup=await admin_kb.get_tickets_list_kb(tickets, ticket_type, has_next=has_next),
+    )
+
+
+@router.callback_query(admin_kb.AdminTicketPageCallback.filter())
+async def tickets_page_handler(
+    query: CallbackQuery, callback_data: admin_kb.AdminTicketPageCallback, session: AsyncSession
+):
+    _, _, statuses = TICKET_LISTS[callback_data.ticket_type]
+    tickets, has_more = await crud.get_tickets_page(
+        session,
+        statuses,
+        cursor=callback_data.cursor,
+        backward=callback_data.backward,
+        limit=TICKETS_PAGE_SIZE,
+    )
+
+    if not tickets:
+        await query.answer("Больше тикетов нет.")
+        return
+
+    # Пришли с соседней страницы, значит в обратном направлении она есть
+    if callback_data.backward:
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = True, has_more
+
+    await query.message.edit_reply_markup(
+        reply_markup=await admin_kb.get_tickets_list_kb(
+            tickets, callback_data.ticket_type, has_prev=has_prev, has_next=has_next
         )
+    )
+    await query.answer()
 
 
 @router.callback_query(admin_kb.AdminTicketCallback.filter())
 async def handle_admin_ticket_action(
-    query: CallbackQuery, callback_data: admin_kb.AdminTicketCallback, state: FSMContext
+    query: CallbackQuery,
+    callback_data: admin_kb.AdminTicketCallback,
+    state: FSMContext,
+    session: AsyncSession,
 ):
-    async with get_session() as session:
-        ticket_id = callback_data.ticket_id
-        action = callback_data.action
-        user_id = callback_data.user_id
-
-        if action == "view_ticket":
-            messages = await crud.get_ticket_messages(session, ticket_id)
-            ticket = await crud.get_ticket_by_id(session, ticket_id)
-            user = await crud.get_user_by_id(session, ticket.owner_id)
-
-            logger.info(f"Admin {query.from_user.id} viewing ticket {ticket_id}. Bot admin_ids: {query.bot.settings.admin_ids}")
-
-            history = f"<b>История сообщений по тикету #{ticket_id}</b>\nПользователь: @{user.username} ({user.telegram_id})\nСтатус: {ticket.status.value}\n\n"
-            for msg in messages:
-                logger.info(f"  Message sender_id: {msg.sender_id}")
-                sender_id = msg.sender_id
-                if sender_id == user.telegram_id: # user is the ticket owner
-                    sender = "Клиент"
-                elif sender_id in query.bot.settings.admin_ids: # any admin, including the current one
-                    sender = "Поддержка"
-                else:
-                    sender = "Неизвестный отправитель" # Fallback, should ideally not be reached
-                time = msg.created_at.strftime("%Y-%m-%d %H:%M")
-                history += f"<u>{sender} ({time}):</u>\n"
-                if msg.message_type == "text":
-                    history += f"{msg.text}\n\n"
-                else:
-                    history += f"<i>[{msg.message_type.capitalize()}]</i>\n\n"
-
-            for i in range(0, len(history), 4096):
-                await query.message.answer(
-                    history[i : i + 4096],
-                    reply_markup=admin_kb.get_ticket_actions_kb(
-                        ticket_id, user.telegram_id
-                    ),
-                )
-
-        elif action == "reply_to_ticket":
-            await state.set_state(AdminState.reply_to_ticket)
-            await state.update_data(ticket_id=ticket_id, user_id=user_id)
-            await query.message.answer(f"Введите ответ для тикета #{ticket_id}:")
-
-        elif action == "close_ticket":
-            await crud.update_ticket_status(session, ticket_id, TicketStatus.CLOSED)
-            await query.message.edit_text(f"Тикет #{ticket_id} закрыт.")
-            try:
-                await query.bot.send_message(
-                    user_id, f"Ваш тикет #{ticket_id} был закрыт администратором."
-                )
-            except Exception as e:
-                logger.error(f"Failed to send ticket close notification to user {user_id} for ticket {ticket_id}: {e}")
-
-        elif action == "reopen_ticket":
-            await crud.update_ticket_status(session, ticket_id, TicketStatus.OPEN)
-            await query.message.edit_text(f"Тикет #{ticket_id} переоткрыт.")
-            try:
-                await query.bot.send_message(
-                    user_id, f"Ваш тикет #{ticket_id} был переоткрыт администратором."
-                )
-            except Exception as e:
-                logger.error(f"Failed to send ticket reopen notification to user {user_id} for ticket {ticket_id}: {e}")
+    ticket_id = callback_data.ticket_id
+    action = callback_data.action
+    user_id = callback_data.user_id
+
+    if action == "view_ticket":
+        logger.info(
+            "Admin viewing ticket",
+            extra={"admin_id": query.from_user.id, "ticket_id": ticket_id, "sample_rate": settings.log_sample_rate},
+        )
+        await send_admin_history_page(query, session, ticket_id)
+
+    elif action == "reply_to_ticket":
+        await state.set_state(AdminState.reply_to_ticket)
+        await state.update_data(ticket_id=ticket_id, user_id=user_id)
+        await query.message.answer(f"Введите ответ для тикета #{ticket_id}:")
+
+    elif action == "close_ticket":
+        await crud.update_ticket_status(session, ticket_id, TicketStatus.CLOSED)
+        sla_tracker.touch(ticket_id, TicketStatus.CLOSED, datetime.utcnow())
+        await query.message.edit_text(f"Тикет #{ticket_id} закрыт.")
+        try:
+            await query.bot.send_message(
+                user_id, f"Ваш тикет #{ticket_id} был закрыт администратором."
+            )
+        except Exception as e:
+            logger.error(f"Failed to send ticket close notification to user {user_id} for ticket {ticket_id}: {e}")
+
+    elif action == "reopen_ticket":
+        await crud.update_ticket_status(session, ticket_id, TicketStatus.OPEN)
+        sla_tracker.touch(ticket_id, TicketStatus.OPEN, datetime.utcnow())
+        await query.message.edit_text(f"Тикет #{ticket_id} переоткрыт.")
+        try:
+            await query.bot.send_message(
+                user_id, f"Ваш тикет #{ticket_id} был переоткрыт администратором."
+            )
+        except Exception as e:
+            logger.error(f"Failed to send ticket reopen notification to user {user_id} for ticket {ticket_id}: {e}")
 
     await query.answer()
 
 
+@router.callback_query(admin_kb.AdminHistoryCallback.filter())
+async def admin_history_page_handler(
+    query: CallbackQuery, callback_data: admin_kb.AdminHistoryCallback, session: AsyncSession
+):
+    sent = await send_admin_history_page(
+        query, session, callback_data.ticket_id, callback_data.cursor_id, callback_data.older
+    )
+    if sent:
+        await query.answer()
+    else:
+        await query.answer("Больше сообщений нет.", show_alert=True)
+
+
+async def send_admin_history_page(
+    query: CallbackQuery,
+    session: AsyncSession,
+    ticket_id: int,
+    cursor_id: Optional[int] = None,
+    older: bool = True,
+):
+    """
+    Отправляет админу одну страницу истории тикета с кнопками листания и действиями.
+    Возвращает False, если при листании сообщений больше нет.
+    """
+    ticket = await crud.get_ticket_by_id(session, ticket_id)
+    user = await crud.get_user_by_id(session, ticket.owner_id)
+    messages, has_more = await crud.get_ticket_messages_page(
+        session, ticket_id, cursor_id, older, limit=HISTORY_PAGE_SIZE
+    )
+    if not messages and cursor_id is not None:
+        return False
+
+    def sender_label(msg):
+        if msg.sender_id == user.telegram_id: # user is the ticket owner
+            return "Клиент"
+        if admin_registry.is_admin(msg.sender_id): # any admin, including the current one
+            return "Поддержка"
+        return "Неизвестный отправитель" # Fallback, should ideally not be reached
+
+    header = (
+        f"<b>История сообщений по тикету #{ticket_id}</b>\n"
+        f"Пользователь: @{user.username} ({user.telegram_id})\n"
+        f"Статус: {ticket.status.value}\n\n"
+    )
+    chunks = render_history_chunks(header, messages, sender_label)
+    if messages:
+        older_cursor, newer_cursor = page_cursors(messages, has_more, cursor_id, older)
+    else:
+        older_cursor = newer_cursor = None
+    history_kb = admin_kb.get_ticket_history_kb(
+        ticket_id, user.telegram_id, older_cursor, newer_cursor
+    )
+
+    # Кнопки листания и действия - под последней частью страницы
+    for i, chunk in enumerate(chunks):
+        is_last = i == len(chunks) - 1
+        await query.message.answer(chunk, reply_markup=history_kb if is_last else None)
+    return True
+
+
 @router.message(AdminState.reply_to_ticket)
 async def process_reply(message: Message, state: FSMContext, bot: Bot):
     data = await state.get_data() # data needs to be defined before using it
-    logger.info(f"Admin {message.from_user.id} is replying to ticket {data.get('ticket_id')}")
-    async with get_session() as session:
-        ticket_id = data.get("ticket_id")
-        user_id = data.get("user_id")
-
-        content_type = message.content_type.value
-        text = message.text or message.caption
-        file_id = None
-        if message.photo:
-            file_id = message.photo[-1].file_id
-        elif message.video:
-            file_id = message.video.file_id
-        elif message.document:
-            file_id = message.document.file_id
-
-        await crud.add_message_to_ticket(
-            session, ticket_id, message.from_user.id, content_type, text, file_id
-        )
-        # Админ ответил, значит ждем ответа клиента
-        await crud.update_ticket_status(session, ticket_id, TicketStatus.PENDING)
+    logger.info(
+        "Admin replying to ticket",
+        extra={"admin_id": message.from_user.id, "ticket_id": data.get("ticket_id"), "sample_rate": settings.log_sample_rate},
+    )
+    ticket_id = data.get("ticket_id")
+    user_id = data.get("user_id")
+
+    content_type = message.content_type.value
+    text = message.text or message.caption
+    file_id = None
+    if message.photo:
+        file_id = message.photo[-1].file_id
+    elif message.video:
+        file_id = message.video.file_id
+    elif message.document:
+        file_id = message.document.file_id
+
+    # Админ ответил, значит ждем ответа клиента
+    await message_writer.submit(
+        ticket_id, message.from_user.id, content_type, text, file_id,
+        status=TicketStatus.PENDING,
+    )
 
-        await message.answer(f"Ваш ответ в тикет #{ticket_id} отправлен.")
+    await message.answer(f"Ваш ответ в тикет #{ticket_id} отправлен.")
 
-        # Уведомляем клиента
-        try:
-            await bot.send_message(
-                user_id, f"Поступил ответ от поддержки в тикете #{ticket_id}"
-            )
-            await bot.copy_message(
-                chat_id=user_id,
-                from_chat_id=message.chat.id,
-                message_id=message.message_id,
-            )
-        except Exception as e:
-            logger.error(f"Failed to send admin reply and copy message to user {user_id} for ticket {ticket_id}: {e}")
+    # Уведомляем клиента
+    try:
+        await bot.send_message(
+            user_id, f"Поступил ответ от поддержки в тикете #{ticket_id}"
+        )
+        await bot.copy_message(
+            chat_id=user_id,
+            from_chat_id=message.chat.id,
+            message_id=message.message_id,
+        )
+    except Exception as e:
+        logger.error(f"Failed to send admin reply and copy message to user {user_id} for ticket {ticket_id}: {e}")
 
     await state.clear()
 
@@ -239,43 +531,119 @@ async def send_direct_message(message: Message, state: FSMContext, bot: Bot):
     await state.clear()
 
 
+@router.message(F.text == "Рассылка")
+async def broadcast_start(message: Message, state: FSMContext):
+    await state.clear()
+    await message.answer("Кому отправить рассылку?", reply_markup=admin_kb.BROADCAST_SEGMENTS_KB)
+
+
+@router.callback_query(admin_kb.BroadcastCallback.filter(F.action == "segment"))
+async def broadcast_segment_selected(
+    query: CallbackQuery, callback_data: admin_kb.BroadcastCallback, state: FSMContext
+):
+    await state.update_data(segment=callback_data.segment, days=None)
+    if callback_data.segment == "expiring":
+        await state.set_state(BroadcastState.get_days)
+        await query.message.answer("За сколько дней до окончания подписки? Введите число:")
+    else:
+        await state.set_state(BroadcastState.get_message)
+        await query.message.answer("Отправьте сообщение для рассылки (текст, фото, видео или документ):")
+    await query.answer()
+
+
+@router.message(BroadcastState.get_days)
+async def broadcast_days_entered(message: Message, state: FSMContext):
+    if not message.text or not message.text.isdigit() or int(message.text) == 0:
+        await message.answer("Введите положительное число дней.")
+        return
+    await state.update_data(days=int(message.text))
+    await state.set_state(BroadcastState.get_message)
+    await message.answer("Отправьте сообщение для рассылки (текст, фото, видео или документ):")
+
+
+@router.message(BroadcastState.get_message)
+async def broadcast_message_entered(message: Message, state: FSMContext, session: AsyncSession):
+    data = await state.get_data()
+    await state.clear()
+    # Получатели фиксируются сразу, исходное сообщение потом копируется каждому из них
+    broadcast = await crud.create_broadcast(
+        session, message.from_user.id, data["segment"], data.get("days"),
+        message.chat.id, message.message_id,
+    )
+    if not broadcast.total:
+        await crud.cancel_broadcast(session, broadcast.id)
+        await message.answer("В выбранном сегменте нет получателей.")
+        return
+
+    await message.answer(
+        f"Рассылка #{broadcast.id}: получателей {broadcast.total}. Отправить сообщение выше?",
+        reply_markup=admin_kb.get_broadcast_confirm_kb(broadcast.id),
+    )
+
+
+@router.callback_query(admin_kb.BroadcastCallback.filter(F.action.in_({"send", "cancel"})))
+async def broadcast_confirm(
+    query: CallbackQuery, callback_data: admin_kb.BroadcastCallback, bot: Bot, session: AsyncSession
+):
+    broadcast_id = callback_data.broadcast_id
+    if callback_data.action == "cancel":
+        changed = await crud.cancel_broadcast(session, broadcast_id)
+        text = f"Рассылка #{broadcast_id} отменена."
+    else:
+        # Это сообщение дальше редактируется как прогресс рассылки
+        changed = await crud.start_broadcast(
+            session, broadcast_id, query.message.chat.id, query.message.message_id
+        )
+        text = f"📣 Рассылка #{broadcast_id} запущена."
+    if not changed:
+        await query.answer("Рассылка уже запущена или отменена.", show_alert=True)
+        return
+
+    await query.message.edit_text(text)
+    if callback_data.action == "send":
+        broadcast_sender.launch(bot, broadcast_id)
+    await query.answer()
+
+
 @router.message(F.text == "Истекающие подписки")
-async def expiring_subscriptions_handler(message: Message):
-    async with get_session() as session:
-        subscriptions = await crud.get_expiring_subscriptions(
-            session, days=7
-        )  # Например, за 7 дней
-        if not subscriptions:
-            await message.answer("Нет подписок, истекающих в ближайшее время.")
-            return
+async def expiring_subscriptions_handler(message: Message, session: AsyncSession):
+    subscriptions = await crud.get_expiring_subscriptions(
+        session, days=7
+    )  # Например, за 7 дней
+    if not subscriptions:
+        await message.answer("Нет подписок, истекающих в ближайшее время.")
+        return
 
-        response = "<b>Истекающие подписки (ближайшие 7 дней):</b>\n\n"
-        for sub in sorted(subscriptions, key=lambda s: s.end_date):
-            user = await crud.get_user_by_id(session, sub.user_id)
-            response += f"Пользователь: @{user.username} ({user.telegram_id})\n"
-            response += f"Дата окончания: {sub.end_date.strftime('%d.%m.%Y')}\n\n"
+    response = "<b>Истекающие подписки (ближайшие 7 дней):</b>\n\n"
+    # Подписки уже отсортированы по дате и загружены вместе с пользователями
+    for sub in subscriptions:
+        user = sub.user
+        response += f"Пользователь: @{user.username} ({user.telegram_id})\n"
+        response += f"Дата окончания: {sub.end_date.strftime('%d.%m.%Y')}\n\n"
 
-        await message.answer(response)
+    await message.answer(response)
 
 
 @router.message(F.text == "Управление подпиской")
 async def start_manage_subscription(message: Message, state: FSMContext):
     await state.set_state(ManageSubscription.get_user_id)
-    await message.answer("Введите Telegram ID пользователя для управления подпиской:")
+    await message.answer(
+        "Введите Telegram ID пользователя для управления подпиской "
+        "(для загрузки подписок из CSV-файла - /import):"
+    )
 
 
 @router.message(ManageSubscription.get_user_id)
-async def process_subscription_user_id(message: Message, state: FSMContext):
+async def process_subscription_user_id(message: Message, state: FSMContext, session: AsyncSession):
     if not message.text.isdigit():
         await message.answer("ID должен быть числом. Попробуйте снова.")
         return
 
     user_id = int(message.text)
-    async with get_session() as session:
-        user = await crud.get_user_by_id(session, user_id)
-        if not user:
-            await message.answer("Пользователь с таким ID не найден. Попробуйте снова.")
-            return
+    user = await crud.get_user_by_id(session, user_id)
+    if not user:
+        await message.answer("Пользователь с таким ID не найден. Попробуйте снова.")
+        return
 
     await state.update_data(target_user_id=user_id)
     await state.set_state(ManageSubscription.get_end_date)
@@ -286,29 +654,26 @@ async def process_subscription_user_id(message: Message, state: FSMContext):
 
 
 @router.callback_query(admin_kb.ManageSubscriptionCallback.filter(F.action == "renew"))
-async def process_subscription_action(query: CallbackQuery, callback_data: admin_kb.ManageSubscriptionCallback, state: FSMContext):
+async def process_subscription_action(
+    query: CallbackQuery,
+    callback_data: admin_kb.ManageSubscriptionCallback,
+    state: FSMContext,
+    session: AsyncSession,
+):
     user_id = callback_data.user_id
     months_to_add = callback_data.months
 
-    async with get_session() as session:
-        subscription = await crud.get_user_subscription(session, user_id)
-        
-        if subscription and subscription.end_date > datetime.now():
-            # Если подписка активна, продлеваем от даты окончания
-            new_end_date = subscription.end_date + relativedelta(months=months_to_add)
-        else:
-            # Если подписка истекла или ее нет, продлеваем от текущей даты
-            new_end_date = datetime.now() + relativedelta(months=months_to_add)
-
-        await crud.create_or_update_subscription(session, user_id, new_end_date)
-        await query.message.edit_text(f"Подписка для пользователя {user_id} успешно продлена.\n"
-                                     f"Новая дата окончания: {new_end_date.strftime('%d.%m.%Y')}")
+    subscription = await crud.get_user_subscription(session, user_id)
+    new_end_date = renewal_end_date(subscription.end_date if subscription else None, months_to_add)
+    await crud.create_or_update_subscription(session, user_id, new_end_date)
+    await query.message.edit_text(f"Подписка для пользователя {user_id} успешно продлена.\n"
+                                 f"Новая дата окончания: {new_end_date.strftime('%d.%m.%Y')}")
     await state.clear()
     await query.answer()
 
 
 @router.message(ManageSubscription.get_end_date)
-async def process_subscription_end_date(message: Message, state: FSMContext):
+async def process_subscription_end_date(message: Message, state: FSMContext, session: AsyncSession):
     try:
         end_date = datetime.strptime(message.text, "%d-%m-%Y")
     except ValueError:
@@ -318,9 +683,8 @@ async def process_subscription_end_date(message: Message, state: FSMContext):
     data = await state.get_data()
     user_id = data.get("target_user_id")
 
-    async with get_session() as session:
-        await crud.create_or_update_subscription(session, user_id, end_date)
-        await message.answer(f"Подписка для пользователя {user_id} успешно обновлена/создана.\n"
-                             f"Дата окончания: {end_date.strftime('%d.%m.%Y')}")
+    await crud.create_or_update_subscription(session, user_id, end_date)
+    await message.answer(f"Подписка для пользователя {user_id} успешно обновлена/создана.\n"
+                         f"Дата окончания: {end_date.strftime('%d.%m.%Y')}")
 
     await state.clear()
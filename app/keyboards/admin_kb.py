@@ -1,43 +1,109 @@
 # /Users/mac/projects/ticket_bot/app/keyboards/admin_kb.py
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters.callback_data import CallbackData
-from typing import List
-from app.database.models import Ticket, TicketStatus
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import List, Optional, Tuple
+from app.database.crud import SearchHit
+from app.database.models import Ticket
+from app.keyboards.client_kb import STATUS_EMOJI
+
+# Время в callback_data передается целым числом микросекунд (даты в БД - наивные UTC)
+EPOCH = datetime(1970, 1, 1)
 
 class AdminTicketCallback(CallbackData, prefix="admin_ticket"):
     action: str
     ticket_id: int
     user_id: int # Добавляем user_id для прямого ответа
 
+class AdminTicketPageCallback(CallbackData, prefix="admin_tickets"):
+    ticket_type: str # 'open' или 'closed'
+    # Ключ тикета, от которого листаем: last_message_at (микросекунды от эпохи) и id
+    cursor_time: int
+    cursor_id: int
+    backward: bool = False
+
+    @classmethod
+    def from_ticket(cls, ticket_type: str, ticket: Ticket, backward: bool = False) -> "AdminTicketPageCallback":
+        cursor_time = (ticket.last_message_at - EPOCH) // timedelta(microseconds=1)
+        return cls(ticket_type=ticket_type, cursor_time=cursor_time, cursor_id=ticket.id, backward=backward)
+
+    @property
+    def cursor(self) -> Tuple[datetime, int]:
+        return EPOCH + timedelta(microseconds=self.cursor_time), self.cursor_id
+
+class AdminHistoryCallback(CallbackData, prefix="admin_history"):
+    ticket_id: int
+    user_id: int
+    cursor_id: int # Сообщение, от которого листаем
+    older: bool
+
+class SearchPageCallback(CallbackData, prefix="search"):
+    offset: int # Запрос хранится в данных FSM, в callback_data он может не поместиться
+
+class BroadcastCallback(CallbackData, prefix="broadcast"):
+    action: str # 'segment', 'send' или 'cancel'
+    segment: Optional[str] = None
+    broadcast_id: int = 0
+
 class ManageSubscriptionCallback(CallbackData, prefix="manage_sub"):
     action: str
     user_id: int
     months: int = 0
 
+# Клавиатуры ниже создаются один раз и переиспользуются, поэтому их нельзя изменять
+
+ADMIN_MAIN_MENU = ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="Открытые тикеты"), KeyboardButton(text="Закрытые тикеты")],
+        [KeyboardButton(text="Истекающие подписки"), KeyboardButton(text="Написать пользователю")],
+        [KeyboardButton(text="Управление подпиской"), KeyboardButton(text="Рассылка")]
+    ],
+    resize_keyboard=True
+)
+
+BROADCAST_SEGMENTS_KB = InlineKeyboardMarkup(
+    inline_keyboard=[
+        [InlineKeyboardButton(text=text, callback_data=BroadcastCallback(action="segment", segment=segment).pack())]
+        for segment, text in (
+            ("all", "Все пользователи"),
+            ("active", "Активные подписчики"),
+            ("expiring", "Подписка истекает в ближайшие N дней"),
+            ("open_tickets", "С открытыми тикетами"),
+        )
+    ]
+)
+
 def get_admin_main_menu() -> ReplyKeyboardMarkup:
     """Возвращает клавиатуру главного меню администратора."""
-    return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="Открытые тикеты"), KeyboardButton(text="Закрытые тикеты")],
-            [KeyboardButton(text="Истекающие подписки"), KeyboardButton(text="Написать пользователю")],
-            [KeyboardButton(text="Управление подпиской")]
-        ],
-        resize_keyboard=True
+    return ADMIN_MAIN_MENU
+
+def get_broadcast_confirm_kb(broadcast_id: int) -> InlineKeyboardMarkup:
+    """Возвращает кнопки подтверждения рассылки."""
+    return InlineKeyboardMarkup(
+        inline_keyboard=[[
+            InlineKeyboardButton(
+                text="Отправить",
+                callback_data=BroadcastCallback(action="send", broadcast_id=broadcast_id).pack()
+            ),
+            InlineKeyboardButton(
+                text="Отмена",
+                callback_data=BroadcastCallback(action="cancel", broadcast_id=broadcast_id).pack()
+            ),
+        ]]
     )
 
-async def get_tickets_list_kb(tickets: List[Ticket], ticket_type: str) -> InlineKeyboardMarkup:
+async def get_tickets_list_kb(
+    tickets: List[Ticket], ticket_type: str, has_prev: bool = False, has_next: bool = False
+) -> InlineKeyboardMarkup:
     """
-    Возвращает инлайн-клавиатуру со списком тикетов для админа.
+    Возвращает инлайн-клавиатуру со страницей тикетов для админа.
     ticket_type: 'open' или 'closed'
+    has_prev / has_next: показывать ли кнопки листания.
     """
     buttons = []
     for ticket in tickets:
-        status_emoji = {
-            TicketStatus.OPEN: "🟢",     # Новый, не отвеченный
-            TicketStatus.ANSWERED: "🟡", # Клиент ответил, ждет админа
-            TicketStatus.PENDING: "🔵",  # Админ ответил, ждет клиента
-            TicketStatus.CLOSED: "🔴",   # Закрыт
-        }.get(ticket.status, "⚪️")
+        status_emoji = STATUS_EMOJI.get(ticket.status, "⚪️")
         
         text = f"{status_emoji} Тикет #{ticket.id} от {ticket.owner_id}"
         
@@ -51,9 +117,54 @@ async def get_tickets_list_kb(tickets: List[Ticket], ticket_type: str) -> Inline
                 ).pack()
             )
         ])
-    
+
+    navigation = []
+    if has_prev and tickets:
+        navigation.append(InlineKeyboardButton(
+            text="◀️ Назад",
+            callback_data=AdminTicketPageCallback.from_ticket(ticket_type, tickets[0], backward=True).pack()
+        ))
+    if has_next and tickets:
+        navigation.append(InlineKeyboardButton(
+            text="Вперед ▶️",
+            callback_data=AdminTicketPageCallback.from_ticket(ticket_type, tickets[-1]).pack()
+        ))
+    if navigation:
+        buttons.append(navigation)
+
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+def get_search_results_kb(
+    hits: List[SearchHit], offset: int, page_size: int, has_next: bool
+) -> InlineKeyboardMarkup:
+    """Возвращает кнопки найденных тикетов и листания результатов поиска."""
+    buttons = [
+        [InlineKeyboardButton(
+            text=f"{STATUS_EMOJI.get(hit.status, '⚪️')} Тикет #{hit.ticket_id} от {hit.owner_id}",
+            callback_data=AdminTicketCallback(
+                action="view_ticket", ticket_id=hit.ticket_id, user_id=hit.owner_id
+            ).pack()
+        )]
+        for hit in hits
+    ]
+
+    navigation = []
+    if offset > 0:
+        navigation.append(InlineKeyboardButton(
+            text="◀️ Назад",
+            callback_data=SearchPageCallback(offset=max(offset - page_size, 0)).pack()
+        ))
+    if has_next:
+        navigation.append(InlineKeyboardButton(
+            text="Вперед ▶️",
+            callback_data=SearchPageCallback(offset=offset + len(hits)).pack()
+        ))
+    if navigation:
+        buttons.append(navigation)
+
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+@lru_cache(maxsize=1024)
 def get_ticket_actions_kb(ticket_id: int, user_id: int) -> InlineKeyboardMarkup:
     """Возвращает инлайн-клавиатуру с действиями для конкретного тикета."""
     buttons = [
@@ -80,6 +191,28 @@ def get_ticket_actions_kb(ticket_id: int, user_id: int) -> InlineKeyboardMarkup:
     ]
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+def get_ticket_history_kb(
+    ticket_id: int, user_id: int, older_cursor: Optional[int], newer_cursor: Optional[int]
+) -> InlineKeyboardMarkup:
+    """Возвращает кнопки листания истории тикета вместе с действиями по тикету."""
+    navigation = []
+    if older_cursor is not None:
+        navigation.append(InlineKeyboardButton(
+            text="⬅️ Старые",
+            callback_data=AdminHistoryCallback(
+                ticket_id=ticket_id, user_id=user_id, cursor_id=older_cursor, older=True
+            ).pack()
+        ))
+    if newer_cursor is not None:
+        navigation.append(InlineKeyboardButton(
+            text="Новые ➡️",
+            callback_data=AdminHistoryCallback(
+                ticket_id=ticket_id, user_id=user_id, cursor_id=newer_cursor, older=False
+            ).pack()
+        ))
+    actions = get_ticket_actions_kb(ticket_id, user_id).inline_keyboard
+    return InlineKeyboardMarkup(inline_keyboard=([navigation] if navigation else []) + actions)
+
 def get_subscription_management_kb(user_id: int) -> InlineKeyboardMarkup:
     """Возвращает инлайн-клавиатуру для управления подпиской."""
     buttons = [
@@ -1,33 +1,45 @@
 # /Users/mac/projects/ticket_bot/app/keyboards/client_kb.py
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters.callback_data import CallbackData
-from typing import List
+from functools import lru_cache
+from typing import List, Optional
 from app.database.models import Ticket, TicketStatus
 
 class TicketCallback(CallbackData, prefix="ticket"):
     action: str
     ticket_id: int
 
+class HistoryCallback(CallbackData, prefix="history"):
+    ticket_id: int
+    cursor_id: int # Сообщение, от которого листаем
+    older: bool
+
+# Клавиатуры ниже создаются один раз и переиспользуются, поэтому их нельзя изменять
+
+STATUS_EMOJI = {
+    TicketStatus.OPEN: "🟢",     # Новый, не отвеченный
+    TicketStatus.ANSWERED: "🟡", # Клиент ответил, ждет админа
+    TicketStatus.PENDING: "🔵",  # Админ ответил, ждет клиента
+    TicketStatus.CLOSED: "🔴",   # Закрыт
+}
+
+MAIN_MENU = ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="Создать тикет"), KeyboardButton(text="Мои тикеты")],
+        [KeyboardButton(text="Активный тикет"), KeyboardButton(text="Срок подписки")],
+    ],
+    resize_keyboard=True
+)
+
 def get_main_menu() -> ReplyKeyboardMarkup:
     """Возвращает клавиатуру главного меню клиента."""
-    return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="Создать тикет"), KeyboardButton(text="Мои тикеты")],
-            [KeyboardButton(text="Активный тикет"), KeyboardButton(text="Срок подписки")],
-        ],
-        resize_keyboard=True
-    )
+    return MAIN_MENU
 
 async def get_user_tickets_kb(tickets: List[Ticket]) -> InlineKeyboardMarkup:
     """Возвращает инлайн-клавиатуру со списком тикетов пользователя."""
     buttons = []
     for ticket in tickets:
-        status_emoji = {
-            TicketStatus.OPEN: "🟢",
-            TicketStatus.ANSWERED: "🟡",
-            TicketStatus.PENDING: "🔵",
-            TicketStatus.CLOSED: "🔴",
-        }.get(ticket.status, "⚪️")
+        status_emoji = STATUS_EMOJI.get(ticket.status, "⚪️")
         
         text = f"{status_emoji} Тикет #{ticket.id} - {ticket.status.name}"
         
@@ -54,6 +66,7 @@ async def get_user_tickets_kb(tickets: List[Ticket]) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@lru_cache(maxsize=1024)
 def get_active_ticket_menu(ticket_id: int) -> InlineKeyboardMarkup:
     """Возвращает инлайн-клавиатуру для управления активным тикетом."""
     return InlineKeyboardMarkup(
@@ -70,3 +83,21 @@ def get_active_ticket_menu(ticket_id: int) -> InlineKeyboardMarkup:
             ]
         ]
     )
+
+
+def get_history_nav_kb(ticket_id: int, older_cursor: Optional[int], newer_cursor: Optional[int]) -> Optional[InlineKeyboardMarkup]:
+    """Возвращает кнопки листания истории тикета или None, если листать некуда."""
+    row = []
+    if older_cursor is not None:
+        row.append(InlineKeyboardButton(
+            text="⬅️ Старые",
+            callback_data=HistoryCallback(ticket_id=ticket_id, cursor_id=older_cursor, older=True).pack()
+        ))
+    if newer_cursor is not None:
+        row.append(InlineKeyboardButton(
+            text="Новые ➡️",
+            callback_data=HistoryCallback(ticket_id=ticket_id, cursor_id=newer_cursor, older=False).pack()
+        ))
+    if not row:
+        return None
+    return InlineKeyboardMarkup(inline_keyboard=[row])
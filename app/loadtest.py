@@ -0,0 +1,285 @@
+# /Users/mac/projects/ticket_bot/app/loadtest.py
+"""
+Офлайн нагрузочный тест: прогоняет синтетические апдейты через настоящий Dispatcher
+(роутеры admin и client) с подменной сессией Bot, которая не ходит в Telegram.
+
+Пример:
+    python -m app.loadtest --users 10000 --updates 5000 --concurrency 50
+    python -m app.loadtest --scenario admin_reply --transport webhook
+
+Отчет: задержка обработки апдейта (p50/p95/p99), SQL-запросов и вызовов Bot API на апдейт,
+пропускная способность. База создается во временном файле и заполняется заново.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from itertools import count
+
+ADMIN_COUNT = 20
+FIRST_ADMIN_ID = 1
+FIRST_USER_ID = 100_000
+SCENARIOS = ("client_message", "create_ticket", "admin_reply")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline load test for the ticket bot handlers.")
+    parser.add_argument("--users", type=int, default=1000, help="Users (each with an active ticket) to seed")
+    parser.add_argument("--messages-per-ticket", type=int, default=10, help="Seeded messages per ticket")
+    parser.add_argument("--updates", type=int, default=2000, help="Synthetic updates to send per scenario")
+    parser.add_argument("--concurrency", type=int, default=20, help="Updates processed at the same time")
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument(
+        "--transport",
+        choices=("dispatcher", "webhook"),
+        default="dispatcher",
+        help="Feed updates to the Dispatcher directly or POST them to a local webhook server",
+    )
+    parser.add_argument("--db-url", help="Database URL (default: a fresh temporary SQLite file)")
+    return parser.parse_args()
+
+
+def configure_environment(args):
+    """Окружение задается до импорта app.*, так как настройки читаются при импорте."""
+    if args.db_url:
+        os.environ["DB_URL"] = args.db_url
+    else:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="ticket_bot_loadtest_"), "loadtest.db")
+        os.environ["DB_URL"] = f"sqlite+aiosqlite:///{db_path}"
+    os.environ.setdefault("BOT_TOKEN", "123456:LOADTEST")
+    os.environ["ADMIN_IDS"] = ",".join(str(FIRST_ADMIN_ID + i) for i in range(ADMIN_COUNT))
+    os.environ["FSM_STORAGE"] = "memory"
+    os.environ["RUN_MODE"] = "polling"
+    os.environ["WEBHOOK_SECRET"] = "loadtest"
+    # Подменная сессия отвечает мгновенно, лимиты Telegram здесь не нужны
+    os.environ.setdefault("TELEGRAM_GLOBAL_RATE", "1000000")
+    os.environ.setdefault("TELEGRAM_CHAT_INTERVAL", "0")
+
+
+def create_recording_session():
+    from aiogram.client.session.base import BaseSession
+    from aiogram.types import Chat, Message, MessageId
+
+    class RecordingSession(BaseSession):
+        """Сессия Bot, которая записывает вызовы API и возвращает правдоподобные ответы."""
+
+        def __init__(self):
+            super().__init__()
+            self.calls = 0
+            self._message_ids = count(1)
+
+        async def make_request(self, bot, method, timeout=None):
+            self.calls += 1
+            returning = method.__returning__
+            if returning is MessageId:
+                return MessageId(message_id=next(self._message_ids))
+            if returning is Message or "Message" in str(returning):
+                chat_id = getattr(method, "chat_id", None) or 0
+                return Message(
+                    message_id=next(self._message_ids),
+                    date=datetime.now(),
+                    chat=Chat(id=chat_id if isinstance(chat_id, int) else 0, type="private"),
+                    text=getattr(method, "text", None),
+                ).as_(bot)  # как у настоящей сессии: у ответа можно вызывать методы
+            return True
+
+        async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+            yield b""
+
+        async def close(self):
+            pass
+
+    return RecordingSession()
+
+
+async def seed_database(args):
+    """Заполняет БД пользователями, их активными тикетами и историей сообщений."""
+    from sqlalchemy import insert
+    from app.database.database import AsyncSessionFactory
+    from app.database.models import Ticket, TicketMessage, TicketStatus, User
+
+    now = datetime.utcnow()
+    async with AsyncSessionFactory() as session:
+        for start in range(0, args.users, 1000):
+            batch = range(start, min(start + 1000, args.users))
+            await session.execute(insert(User), [
+                {"telegram_id": FIRST_USER_ID + i, "username": f"user{i}", "active_ticket_id": i + 1}
+                for i in batch
+            ])
+            await session.execute(insert(Ticket), [
+                {"id": i + 1, "owner_id": FIRST_USER_ID + i, "status": TicketStatus.OPEN, "last_message_at": now}
+                for i in batch
+            ])
+            await session.execute(insert(TicketMessage), [
+                {
+                    "ticket_id": i + 1,
+                    "sender_id": FIRST_USER_ID + i if n % 2 == 0 else FIRST_ADMIN_ID,
+                    "message_type": "text",
+                    "text": f"seed message {n}",
+                    "created_at": now - timedelta(minutes=args.messages_per_ticket - n),
+                }
+                for i in batch
+                for n in range(args.messages_per_ticket)
+            ])
+            await session.commit()
+
+
+def build_updates(scenario: str, total: int, users: int):
+    """Возвращает список (update, подготовка FSM или None) для сценария."""
+    from aiogram.types import Chat, Message, Update, User as TelegramUser
+
+    update_ids = count(1)
+
+    def message_update(user_id: int, text: str) -> Update:
+        update_id = next(update_ids)
+        return Update(
+            update_id=update_id,
+            message=Message(
+                message_id=update_id,
+                date=datetime.now(),
+                chat=Chat(id=user_id, type="private"),
+                from_user=TelegramUser(id=user_id, is_bot=False, first_name="Load", username=f"user{user_id}"),
+                text=text,
+            ),
+        )
+
+    updates = []
+    for n in range(total):
+        user_index = n % users
+        if scenario == "client_message":
+            updates.append((message_update(FIRST_USER_ID + user_index, "VPN doesn't work"), None))
+        elif scenario == "create_ticket":
+            updates.append((message_update(FIRST_USER_ID + user_index, "Создать тикет"), None))
+        elif scenario == "admin_reply":
+            admin_id = FIRST_ADMIN_ID + n % ADMIN_COUNT
+            fsm = {"ticket_id": user_index + 1, "user_id": FIRST_USER_ID + user_index}
+            updates.append((message_update(admin_id, "Перезагрузите роутер"), (admin_id, fsm)))
+    return updates
+
+
+def percentile(values, p):
+    return statistics.quantiles(values, n=100)[p - 1] if len(values) > 1 else values[0]
+
+
+async def run_scenario(scenario, args, dp, bot, session, statements, post_update=None):
+    from aiogram.fsm.storage.base import StorageKey
+    from app.states.states import AdminState
+
+    updates = build_updates(scenario, args.updates, args.users)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    # Ответы одного админа в одном FSM-ключе не должны пересекаться
+    admin_locks = {FIRST_ADMIN_ID + i: asyncio.Lock() for i in range(ADMIN_COUNT)}
+    latencies = []
+
+    async def process(update, fsm):
+        async with semaphore:
+            if fsm:
+                admin_id, data = fsm
+                key = StorageKey(bot_id=bot.id, chat_id=admin_id, user_id=admin_id)
+                async with admin_locks[admin_id]:
+                    await dp.storage.set_state(key, AdminState.reply_to_ticket)
+                    await dp.storage.set_data(key, data)
+                    latencies.append(await timed(update))
+            else:
+                latencies.append(await timed(update))
+
+    async def timed(update):
+        started = time.perf_counter()
+        if post_update:
+            await post_update(update)
+        else:
+            await dp.feed_update(bot, update)
+        return time.perf_counter() - started
+
+    statements_before, calls_before = statements[0], session.calls
+    started = time.perf_counter()
+    await asyncio.gather(*(process(update, fsm) for update, fsm in updates))
+    elapsed = time.perf_counter() - started
+
+    latencies_ms = [latency * 1000 for latency in latencies]
+    print(f"\n== {scenario} ({len(updates)} updates, concurrency {args.concurrency}, {args.transport}) ==")
+    print(f"latency ms: p50 {percentile(latencies_ms, 50):.2f}  p95 {percentile(latencies_ms, 95):.2f}  "
+          f"p99 {percentile(latencies_ms, 99):.2f}  max {max(latencies_ms):.2f}")
+    print(f"throughput: {len(updates) / elapsed:.0f} updates/s")
+    print(f"DB statements per update: {(statements[0] - statements_before) / len(updates):.2f}")
+    # Включая уведомления, отправленные notification_dispatcher за время прогона
+    print(f"Bot API calls per update: {(session.calls - calls_before) / len(updates):.2f}")
+
+
+async def run(args):
+    import logging
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.fsm.storage.memory import MemoryStorage
+    from sqlalchemy import event
+    from app.config import settings
+    from app.database.cache import active_ticket_cache
+    from app.database.database import engine, init_db
+    from app.main import setup_dispatcher
+    from app.services.message_writer import message_writer
+    from app.services.notification_dispatcher import notification_dispatcher
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    statements = [0]
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count_statement(*_):
+        statements[0] += 1
+
+    await init_db()
+    print(f"Seeding {args.users} users / tickets, {args.users * args.messages_per_ticket} messages...")
+    await seed_database(args)
+
+    session = create_recording_session()
+    bot = Bot(token=settings.bot_token, session=session, default=DefaultBotProperties(parse_mode="HTML"))
+    bot.settings = settings
+    dp = setup_dispatcher(MemoryStorage())
+    message_writer.start()
+    notification_dispatcher.start()
+
+    post_update = None
+    runner = None
+    if args.transport == "webhook":
+        import aiohttp
+        from aiohttp import web
+        from app.webhook import create_webhook_app
+
+        runner = web.AppRunner(create_webhook_app(dp, bot, settings))
+        await runner.setup()
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        await web.SockSite(runner, sock).start()
+        url = f"http://127.0.0.1:{port}{settings.webhook_path}"
+        http = aiohttp.ClientSession(headers={"X-Telegram-Bot-Api-Secret-Token": settings.webhook_secret})
+
+        async def post_update(update):
+            async with http.post(url, json=update.model_dump(mode="json", exclude_none=True)) as response:
+                response.raise_for_status()
+
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    try:
+        for scenario in scenarios:
+            await run_scenario(scenario, args, dp, bot, session, statements, post_update)
+    finally:
+        if runner:
+            await http.close()
+            await runner.cleanup()
+        await message_writer.close()
+        await notification_dispatcher.close(settings.shutdown_timeout)
+        print(f"\nTotal Bot API calls after draining notifications: {session.calls}")
+        cache = active_ticket_cache.stats()
+        print(f"Active ticket cache: {cache['hits']} hits, {cache['misses']} misses "
+              f"(hit rate {cache['hit_rate']:.0%})")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    configure_environment(arguments)
+    asyncio.run(run(arguments))
@@ -0,0 +1,96 @@
+# /Users/mac/projects/ticket_bot/app/logs.py
+import copy
+import json
+import logging
+import queue
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Атрибуты, которые есть у любой LogRecord; остальное пришло через extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+
+def _extra_fields(record: logging.LogRecord) -> dict:
+    """Поля, переданные через extra= (кроме служебного sample_rate)."""
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS and key != "sample_rate"}
+
+
+class TextFormatter(logging.Formatter):
+    """TEXT_FORMAT, после сообщения - поля из extra= в виде key=value (user_id, ticket_id, ...)."""
+
+    def __init__(self):
+        super().__init__(TEXT_FORMAT)
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        line = super().formatMessage(record)
+        fields = " ".join(f"{key}={value}" for key, value in _extra_fields(record).items())
+        return f"{line} {fields}" if fields else line
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON; поля из extra= попадают в запись как есть."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает запись с extra={"sample_rate": p} с вероятностью p.
+    Так частые события пишутся выборочно, а записи без sample_rate - всегда.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, "sample_rate", None)
+        return rate is None or random.random() < rate
+
+
+class _LogQueueHandler(QueueHandler):
+    """QueueHandler, который не склеивает трейсбек с сообщением (его форматирует listener)."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        # Аргументы подставляются сразу: к моменту записи объекты могут измениться
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(level: str = "INFO", fmt: str = "text") -> QueueListener:
+    """
+    Направляет логи через очередь: обработчик корневого логгера только кладет запись
+    в очередь, а форматирование и запись в stderr выполняет поток QueueListener,
+    поэтому вывод логов не блокирует event loop. Возвращает запущенный listener.
+    """
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _LogQueueHandler(log_queue)
+    # Выборка до постановки в очередь, чтобы отброшенные записи ничего не стоили
+    queue_handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level.upper())
+
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -2,57 +2,108 @@
 import asyncio
 import logging
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 
 from aiogram.client.default import DefaultBotProperties
-from app.config import Settings
-from app.database.database import init_db, get_session
+from aiogram.fsm.storage.base import BaseStorage
+from app.config import settings
+from app.database.database import init_db, get_session, AsyncSessionFactory, engine
 from app.handlers import client, admin
-from app.services.scheduler import setup_scheduler
+from app.middlewares.db import DbSessionMiddleware, ActiveTicketMiddleware, UserRegistrationMiddleware
+from app.middlewares.metrics import HandlerMetricsMiddleware, TelegramMetricsMiddleware
+from app.services.scheduler import setup_scheduler, shutdown_scheduler
+from app.states.storage import create_fsm_storage
+from app.services.message_writer import message_writer
+from app.services.notification_dispatcher import notification_dispatcher
+from app.services.sla import sla_tracker
+from app.services.admins import admin_registry
+from app.services.broadcast import broadcast_sender
+from app.services.metrics import instrument_engine, start_metrics_server
+from app.webhook import run_webhook
+from app.logs import setup_logging
 
-# Включаем логирование
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def setup_dispatcher(storage: BaseStorage) -> Dispatcher:
+    """Создает диспетчер с middleware и роутерами бота."""
+    dp = Dispatcher(storage=storage)
+
+    # Одна сессия БД на апдейт
+    dp.update.middleware(DbSessionMiddleware(AsyncSessionFactory))
+    dp.update.middleware(UserRegistrationMiddleware(settings.seen_users_cache_size))
+    # Метрики хендлеров с именем роутера
+    for router in (admin.router, client.router):
+        router.message.middleware(HandlerMetricsMiddleware(router.name))
+        router.callback_query.middleware(HandlerMetricsMiddleware(router.name))
+    client.router.message.middleware(ActiveTicketMiddleware())
+
+    # Регистрация роутеров
+    dp.include_router(admin.router)
+    dp.include_router(client.router)
+    logger.info("Routers included.")
+    return dp
+
+
 async def main():
     """Основная функция запуска бота."""
     logger.info("Starting bot...")
 
-    # Загрузка конфигурации
-    settings = Settings()
-
     # Инициализация базы данных
     await init_db()
+    instrument_engine(engine)
     logger.info("Database initialized.")
+    await admin_registry.reload()
 
     # Инициализация бота и диспетчера
     bot = Bot(token=settings.bot_token, default=DefaultBotProperties(parse_mode="HTML"))
     bot.settings = settings # Attach settings to the bot object
-    storage = MemoryStorage()
-    dp = Dispatcher(storage=storage)
-
-    # Регистрация роутеров
-    dp.include_router(admin.router)
-    dp.include_router(client.router)
-    logger.info("Routers included.")
+    bot.session.middleware(TelegramMetricsMiddleware())
+    storage = create_fsm_storage(settings)
+    dp = setup_dispatcher(storage)
 
     # Настройка и запуск фоновых задач
-    scheduler = await setup_scheduler(bot)
+    scheduler = await setup_scheduler(bot, storage)
+    metrics_runner = None
     try:
+        if settings.metrics_port:
+            metrics_runner = await start_metrics_server(settings.metrics_host, settings.metrics_port)
         scheduler.start()
         logger.info("Scheduler started.")
+        message_writer.start()
+        logger.info("Ticket message writer started.")
+        notification_dispatcher.start()
+        logger.info("Notification dispatcher started.")
+        await sla_tracker.start(bot)
+        await broadcast_sender.start(bot)
 
-        # Запуск поллинга
-        await dp.start_polling(bot)
+        if settings.run_mode == "webhook":
+            await run_webhook(dp, bot, settings)
+        else:
+            # Запуск поллинга (вебхук, если был установлен, мешает getUpdates)
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
     finally:
-        scheduler.shutdown()
+        await shutdown_scheduler(scheduler, settings.shutdown_timeout)
         logger.info("Scheduler shut down.")
+        await sla_tracker.close()
+        # До остановки диспетчера уведомлений: текущие пачки рассылок досылаются и сохраняются
+        await broadcast_sender.close(settings.shutdown_timeout)
+        await message_writer.close()
+        logger.info("Ticket message writer flushed.")
+        await notification_dispatcher.close(settings.shutdown_timeout)
+        logger.info("Notification dispatcher drained.")
+        await storage.close()
         await bot.session.close()
         logger.info("Bot session closed.")
+        if metrics_runner:
+            await metrics_runner.cleanup()
 
 
 if __name__ == '__main__':
+    # Логи пишутся из отдельного потока, чтобы вывод не блокировал event loop
+    log_listener = setup_logging(settings.log_level, settings.log_format)
     try:
         asyncio.run(main())
     except (KeyboardInterrupt, SystemExit):
         logger.info("Bot stopped.")
+    finally:
+        log_listener.stop()
@@ -0,0 +1 @@
+# /Users/mac/projects/ticket_bot/app/middlewares/__init__.py
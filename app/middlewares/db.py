@@ -0,0 +1,91 @@
+# /Users/mac/projects/ticket_bot/app/middlewares/db.py
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import TelegramObject
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from app.database import crud
+
+logger = logging.getLogger(__name__)
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """Открывает одну сессию БД на апдейт и передает ее в хендлеры как `session`."""
+
+    def __init__(self, session_pool: sessionmaker):
+        self.session_pool = session_pool
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        async with self.session_pool() as session:
+            data["session"] = session
+            return await handler(event, data)
+
+
+class ActiveTicketMiddleware(BaseMiddleware):
+    """
+    Для хендлеров с флагом `active_ticket` передает id и статус активного тикета
+    пользователя как `active_ticket` (ActiveTicket или None). Значение берется из
+    кэша, при промахе - одним запросом.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        if get_flag(data, "active_ticket") and from_user:
+            session: AsyncSession = data["session"]
+            data["active_ticket"] = await crud.get_active_ticket(session, from_user.id)
+            # Завершаем читающую транзакцию, чтобы соединение вернулось в пул
+            # и не удерживалось, пока хендлер ждет message_writer и Telegram
+            await session.commit()
+        return await handler(event, data)
+
+
+class UserRegistrationMiddleware(BaseMiddleware):
+    """
+    Регистрирует отправителя апдейта (upsert по telegram_id) и обновляет его username.
+    Уже зарегистрированные процессом пользователи с тем же username хранятся в LRU
+    и повторно в БД не пишутся.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._seen: "OrderedDict[int, str]" = OrderedDict()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        if from_user and not from_user.is_bot:
+            if from_user.id in self._seen and self._seen[from_user.id] == from_user.username:
+                self._seen.move_to_end(from_user.id)
+            else:
+                await self._register(data["session"], from_user.id, from_user.username)
+        return await handler(event, data)
+
+    async def _register(self, session: AsyncSession, telegram_id: int, username: str):
+        try:
+            await crud.upsert_user(session, telegram_id, username)
+        except Exception as e:
+            # Ошибка регистрации не должна мешать обработке апдейта
+            logger.error(f"Failed to register user {telegram_id}: {e}")
+            await session.rollback()
+            return
+        self._seen[telegram_id] = username
+        self._seen.move_to_end(telegram_id)
+        while len(self._seen) > self.max_size:
+            self._seen.popitem(last=False)
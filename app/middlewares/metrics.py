@@ -0,0 +1,55 @@
+# /Users/mac/projects/ticket_bot/app/middlewares/metrics.py
+import time
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.types import TelegramObject
+from app.services.metrics import HANDLER_ERRORS, HANDLER_LATENCY, TELEGRAM_ERRORS, TELEGRAM_REQUESTS
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Внутренний middleware роутера: замеряет время хендлера и считает его исключения
+    с метками router (имя роутера) и handler (имя функции).
+    """
+
+    def __init__(self, router_name: str):
+        self.router_name = router_name
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        handler_name = handler_object.callback.__name__ if handler_object else "unknown"
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.labels(self.router_name, handler_name).inc()
+            raise
+        finally:
+            HANDLER_LATENCY.labels(self.router_name, handler_name).observe(time.perf_counter() - started)
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии Bot: время каждого вызова Bot API и ошибки по типу исключения."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+    ) -> Response:
+        method_name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            TELEGRAM_ERRORS.labels(method_name, type(e).__name__).inc()
+            raise
+        finally:
+            TELEGRAM_REQUESTS.labels(method_name).observe(time.perf_counter() - started)
@@ -0,0 +1,45 @@
+# /Users/mac/projects/ticket_bot/app/services/admins.py
+import logging
+from typing import FrozenSet, Iterable
+from sqlalchemy.orm import sessionmaker
+from app.config import settings
+from app.database import crud
+from app.database.database import AsyncSessionFactory
+
+logger = logging.getLogger(__name__)
+
+
+class AdminRegistry:
+    """
+    Множество id администраторов для проверок за O(1).
+
+    Состоит из владельцев (ADMIN_IDS из настроек, их нельзя удалить из бота) и
+    администраторов из таблицы admins. Таблица перечитывается reload() - сразу после
+    /addadmin и /deladmin и периодически планировщиком, чтобы изменения из других
+    процессов подхватывались без перезапуска.
+    """
+
+    def __init__(self, session_factory: sessionmaker, owner_ids: Iterable[int]):
+        self.session_factory = session_factory
+        self.owner_ids: FrozenSet[int] = frozenset(owner_ids)
+        self.ids: FrozenSet[int] = self.owner_ids
+
+    def is_admin(self, telegram_id: int) -> bool:
+        return telegram_id in self.ids
+
+    def is_owner(self, telegram_id: int) -> bool:
+        return telegram_id in self.owner_ids
+
+    async def reload(self):
+        try:
+            async with self.session_factory() as session:
+                admin_ids = await crud.get_admin_ids(session)
+        except Exception as e:
+            # Оставляем прежний набор, следующая перезагрузка попробует снова
+            logger.error(f"Failed to reload admins: {e}")
+            return
+        # Набор заменяется целиком, читатели всегда видят согласованное состояние
+        self.ids = self.owner_ids | frozenset(admin_ids)
+
+
+admin_registry = AdminRegistry(AsyncSessionFactory, settings.admin_ids)
@@ -0,0 +1,138 @@
+# /Users/mac/projects/ticket_bot/app/services/broadcast.py
+import asyncio
+import logging
+import time
+from functools import partial
+from typing import Dict
+from aiogram import Bot
+from sqlalchemy.orm import sessionmaker
+from app.config import settings
+from app.database import crud
+from app.database.database import AsyncSessionFactory
+from app.database.models import Broadcast, DeliveryStatus
+from .notification_dispatcher import NotificationDispatcher, notification_dispatcher
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastSender:
+    """
+    Отправляет запущенные рассылки через NotificationDispatcher.
+
+    Получатели выбираются из БД пачками по batch_size; после отправки пачки её результаты
+    сохраняются одной транзакцией. После перезапуска рассылка продолжается с
+    неотправленных получателей, повторно может уйти не больше одной пачки.
+    Прогресс показывается редактированием одного сообщения не чаще progress_interval секунд.
+    """
+
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        dispatcher: NotificationDispatcher,
+        batch_size: int = 50,
+        progress_interval: float = 3.0,
+    ):
+        self.session_factory = session_factory
+        self.dispatcher = dispatcher
+        self.batch_size = batch_size
+        self.progress_interval = progress_interval
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._stopping = False
+
+    async def start(self, bot: Bot):
+        """Продолжает рассылки, прерванные остановкой бота."""
+        async with self.session_factory() as session:
+            broadcasts = await crud.get_running_broadcasts(session)
+        for broadcast in broadcasts:
+            logger.info(f"Resuming broadcast {broadcast.id}")
+            self.launch(bot, broadcast.id)
+
+    def launch(self, bot: Bot, broadcast_id: int):
+        if broadcast_id in self._tasks:
+            return
+        task = asyncio.create_task(self._run(bot, broadcast_id))
+        self._tasks[broadcast_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(broadcast_id, None))
+
+    async def close(self, timeout: float):
+        """Дает текущим пачкам досохраниться (не дольше timeout), остальное продолжится после запуска."""
+        self._stopping = True
+        tasks = list(self._tasks.values())
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, bot: Bot, broadcast_id: int):
+        try:
+            async with self.session_factory() as session:
+                broadcast = await crud.get_broadcast(session, broadcast_id)
+                progress = await crud.get_broadcast_progress(session, broadcast_id)
+            sent = progress.get(DeliveryStatus.SENT, 0)
+            failed = progress.get(DeliveryStatus.FAILED, 0)
+
+            after_user_id = None
+            last_report = 0.0
+            while True:
+                if self._stopping:
+                    return  # Рассылка останется запущенной и продолжится после перезапуска
+                async with self.session_factory() as session:
+                    user_ids = await crud.get_pending_recipients(
+                        session, broadcast_id, after_user_id, self.batch_size
+                    )
+                if not user_ids:
+                    break
+
+                futures = [
+                    await self.dispatcher.enqueue(
+                        user_id, partial(bot.copy_message, user_id, broadcast.from_chat_id, broadcast.message_id)
+                    )
+                    for user_id in user_ids
+                ]
+                errors = await asyncio.gather(*futures)
+                batch_sent = [user_id for user_id, error in zip(user_ids, errors) if error is None]
+                batch_failed = [user_id for user_id, error in zip(user_ids, errors) if error is not None]
+                async with self.session_factory() as session:
+                    await crud.save_delivery_results(session, broadcast_id, batch_sent, batch_failed)
+                sent += len(batch_sent)
+                failed += len(batch_failed)
+                after_user_id = user_ids[-1]
+
+                if time.monotonic() - last_report >= self.progress_interval:
+                    last_report = time.monotonic()
+                    await self._report(bot, broadcast, sent, failed)
+
+            async with self.session_factory() as session:
+                await crud.finish_broadcast(session, broadcast_id)
+            await self._report(bot, broadcast, sent, failed, done=True)
+            logger.info(f"Broadcast {broadcast_id} finished: {sent} sent, {failed} failed")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Broadcast {broadcast_id} stopped with an error: {e}")
+
+    async def _report(self, bot: Bot, broadcast: Broadcast, sent: int, failed: int, done: bool = False):
+        if broadcast.status_message_id is None:
+            return
+        title = "завершена" if done else "идет"
+        try:
+            await bot.edit_message_text(
+                f"📣 Рассылка #{broadcast.id} {title}\n"
+                f"Отправлено: {sent} из {broadcast.total}\n"
+                f"Не доставлено: {failed}",
+                chat_id=broadcast.status_chat_id,
+                message_id=broadcast.status_message_id,
+            )
+        except Exception as e:
+            # Прогресс не важнее самой рассылки (например, "message is not modified")
+            logger.warning(f"Failed to update broadcast {broadcast.id} progress: {e}")
+
+
+broadcast_sender = BroadcastSender(
+    AsyncSessionFactory,
+    notification_dispatcher,
+    batch_size=settings.broadcast_batch_size,
+    progress_interval=settings.broadcast_progress_interval,
+)
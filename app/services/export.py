@@ -0,0 +1,65 @@
+# /Users/mac/projects/ticket_bot/app/services/export.py
+import asyncio
+import csv
+import enum
+import gzip
+import json
+import os
+import tempfile
+from datetime import datetime
+from typing import Iterable, List, Sequence
+from sqlalchemy.orm import sessionmaker
+from app.database import crud
+from app.database.database import AsyncSessionFactory
+
+EXPORT_FORMATS = ("csv", "jsonl")
+
+# Сколько строк читается из курсора и записывается в файл за раз
+EXPORT_CHUNK_SIZE = 1000
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+
+def _write_rows(stream, fmt: str, columns: Sequence[str], rows: Iterable[Sequence], writer=None):
+    for row in rows:
+        values = [_plain(value) for value in row]
+        if fmt == "csv":
+            writer.writerow(values)
+        else:
+            stream.write(json.dumps(dict(zip(columns, values)), ensure_ascii=False) + "\n")
+
+
+async def export_to_file(kind: str, fmt: str, session_factory: sessionmaker = AsyncSessionFactory) -> str:
+    """
+    Выгружает таблицу kind в сжатый gzip файл формата fmt (csv или jsonl) и возвращает путь к нему.
+
+    Строки читаются серверным курсором (session.stream) частями по EXPORT_CHUNK_SIZE и сразу
+    пишутся в файл в отдельном потоке, поэтому память не зависит от размера таблицы,
+    а сжатие не блокирует event loop. Удалить файл после отправки должен вызывающий.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    query = crud.export_query(kind)
+
+    fd, path = tempfile.mkstemp(prefix=f"export_{kind}_", suffix=f".{fmt}.gz")
+    os.close(fd)
+    try:
+        with gzip.open(path, "wt", encoding="utf-8", newline="") as stream:
+            writer = csv.writer(stream) if fmt == "csv" else None
+            async with session_factory() as session:
+                result = await session.stream(query.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+                columns: List[str] = list(result.keys())
+                if writer:
+                    writer.writerow(columns)
+                async for chunk in result.partitions():
+                    await asyncio.to_thread(_write_rows, stream, fmt, columns, chunk, writer)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
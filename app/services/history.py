@@ -0,0 +1,99 @@
+# /Users/mac/projects/ticket_bot/app/services/history.py
+import html
+from typing import Callable, Iterable, List
+from app.database.crud import SEARCH_MARK_END, SEARCH_MARK_START
+from app.database.models import TicketMessage
+
+# Максимальная длина сообщения в Telegram
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Сколько сообщений тикета показывать на одной странице истории
+HISTORY_PAGE_SIZE = 20
+
+
+def format_history_message(msg: TicketMessage, sender: str) -> str:
+    """Форматирует одно сообщение тикета для истории (HTML)."""
+    time = msg.created_at.strftime("%Y-%m-%d %H:%M")
+    if msg.message_type == "text":
+        body = html.escape(msg.text or "", quote=False)
+    else:
+        body = f"<i>[{msg.message_type.capitalize()}]</i>"
+    return f"<u>{sender} ({time}):</u>\n{body}\n\n"
+
+
+def format_search_snippet(snippet: str) -> str:
+    """Экранирует сниппет результата поиска и выделяет совпадения жирным (HTML)."""
+    body = html.escape(" ".join(snippet.split()), quote=False)
+    return body.replace(SEARCH_MARK_START, "<b>").replace(SEARCH_MARK_END, "</b>")
+
+
+def _split_oversized(block: str, limit: int) -> List[str]:
+    """Режет блок длиннее лимита, не разрывая HTML-сущности и теги."""
+    pieces = []
+    current = []
+    size = 0
+    # Токены - теги, сущности (&amp;) или отдельные символы
+    i = 0
+    while i < len(block):
+        if block[i] == "<":
+            end = block.index(">", i) + 1
+        elif block[i] == "&":
+            end = block.index(";", i) + 1
+        else:
+            end = i + 1
+        token = block[i:end]
+        if size + len(token) > limit:
+            pieces.append("".join(current))
+            current = []
+            size = 0
+        current.append(token)
+        size += len(token)
+        i = end
+    if current:
+        pieces.append("".join(current))
+    return pieces
+
+
+def render_history_chunks(
+    header: str,
+    messages: Iterable[TicketMessage],
+    sender_label: Callable[[TicketMessage], str],
+    limit: int = TELEGRAM_MESSAGE_LIMIT,
+) -> List[str]:
+    """
+    Собирает страницу истории в сообщения не длиннее limit.
+    Сообщения тикета не разрываются между частями, если помещаются целиком.
+    """
+    chunks = []
+    parts = [header]
+    size = len(header)
+    for msg in messages:
+        block = format_history_message(msg, sender_label(msg))
+        pieces = [block] if len(block) <= limit else _split_oversized(block, limit)
+        for piece in pieces:
+            if size + len(piece) > limit and parts:
+                chunks.append("".join(parts))
+                parts = []
+                size = 0
+            parts.append(piece)
+            size += len(piece)
+    if parts:
+        chunks.append("".join(parts))
+    return chunks
+
+
+def page_cursors(messages: List[TicketMessage], has_more: bool, cursor_id, older: bool):
+    """
+    Возвращает курсоры (older_cursor, newer_cursor) для кнопок листания страницы.
+    None означает, что в эту сторону листать некуда.
+    """
+    if cursor_id is None:
+        # Первая страница - последние сообщения тикета
+        has_older, has_newer = has_more, False
+    elif older:
+        has_older, has_newer = has_more, True
+    else:
+        has_older, has_newer = True, has_more
+    older_cursor = messages[0].id if has_older else None
+    newer_cursor = messages[-1].id if has_newer else None
+    return older_cursor, newer_cursor
@@ -0,0 +1,182 @@
+# /Users/mac/projects/ticket_bot/app/services/message_writer.py
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import Boolean, and_, bindparam, case, insert, select, update
+from sqlalchemy.orm import sessionmaker
+from app.config import settings
+from app.database.cache import active_ticket_cache
+from app.database.database import AsyncSessionFactory
+from app.database.models import Ticket, TicketMessage, TicketStatus
+from .sla import sla_tracker
+
+logger = logging.getLogger(__name__)
+
+_tickets = Ticket.__table__
+
+# С keep_closed закрытый тикет сообщением не переоткрывается (сообщение клиента, пришедшее
+# одновременно с закрытием), без него статус меняется всегда (ответ админа переоткрывает тикет).
+# Core-UPDATE с WHERE по параметрам выполняется через executemany одним скомпилированным запросом
+_update_status = (
+    update(_tickets)
+    .where(_tickets.c.id == bindparam("ticket_id"))
+    .values(
+        status=case(
+            (
+                and_(_tickets.c.status == TicketStatus.CLOSED, bindparam("keep_closed", type_=Boolean)),
+                _tickets.c.status,
+            ),
+            else_=bindparam("new_status", type_=_tickets.c.status.type),
+        ),
+        last_message_at=bindparam("at"),
+    )
+)
+
+
+class TicketMessageWriter:
+    """
+    Буферизует сообщения тикетов и записывает их в БД пачками.
+
+    Пачка сбрасывается одной транзакцией, когда в буфере набралось `max_batch`
+    сообщений или прошло `flush_interval` секунд с момента появления первого из них.
+    `submit()` возвращает управление только после коммита пачки.
+    """
+
+    def __init__(self, session_factory: sessionmaker, max_batch: int = 100, flush_interval: float = 0.05):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._pending: List[Tuple[dict, Optional[TicketStatus], bool, asyncio.Future]] = []
+        self._has_items = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def start(self):
+        """Запускает фоновую задачу сброса буфера."""
+        self._closed = False
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Дописывает все накопленные сообщения и останавливает фоновую задачу."""
+        self._closed = True
+        self._has_items.set()
+        self._batch_full.set()
+        if self._task:
+            await self._task
+            self._task = None
+
+    async def submit(
+        self,
+        ticket_id: int,
+        sender_id: int,
+        message_type: str,
+        text: str = None,
+        file_id: str = None,
+        status: Optional[TicketStatus] = None,
+        keep_closed: bool = False,
+    ):
+        """
+        Ставит сообщение в очередь и ждет, пока оно будет записано в БД.
+        keep_closed - не менять status, если тикет к моменту записи уже закрыт.
+        """
+        if self._task is None or self._closed:
+            raise RuntimeError("TicketMessageWriter is not running")
+
+        future = asyncio.get_running_loop().create_future()
+        row = {
+            "ticket_id": ticket_id,
+            "sender_id": sender_id,
+            "message_type": message_type,
+            "text": text,
+            "file_id": file_id,
+            "created_at": datetime.utcnow(),
+        }
+        self._pending.append((row, status, keep_closed, future))
+        self._has_items.set()
+        if len(self._pending) >= self.max_batch:
+            self._batch_full.set()
+        await future
+
+    async def _run(self):
+        while True:
+            await self._has_items.wait()
+            if not self._closed:
+                # Ждем наполнения пачки, но не дольше flush_interval
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            await self._flush()
+            if self._closed and not self._pending:
+                return
+
+    async def _flush(self):
+        batch, self._pending = self._pending, []
+        self._has_items.clear()
+        self._batch_full.clear()
+        if not batch:
+            return
+
+        # Для каждого тикета достаточно последнего обновления из пачки
+        tickets = {}
+        for row, status, keep_closed, _ in batch:
+            values = tickets.setdefault(row["ticket_id"], {"id": row["ticket_id"]})
+            values["last_message_at"] = row["created_at"]
+            if status is not None:
+                values["status"] = status
+                values["keep_closed"] = keep_closed
+        with_status = [values for values in tickets.values() if "status" in values]
+        without_status = [values for values in tickets.values() if "status" not in values]
+
+        try:
+            async with self.session_factory() as session:
+                await session.execute(insert(TicketMessage), [row for row, _, _, _ in batch])
+                if with_status:
+                    await session.execute(
+                        _update_status,
+                        [
+                            {
+                                "ticket_id": values["id"],
+                                "new_status": values["status"],
+                                "keep_closed": values["keep_closed"],
+                                "at": values["last_message_at"],
+                            }
+                            for values in with_status
+                        ],
+                    )
+                    guarded = [values["id"] for values in with_status if values["keep_closed"]]
+                    if guarded:
+                        # Строки уже заблокированы нашим UPDATE, так что прочитанный статус окончательный
+                        closed = await session.scalars(
+                            select(Ticket.id).where(Ticket.id.in_(guarded), Ticket.status == TicketStatus.CLOSED)
+                        )
+                        for ticket_id in closed:
+                            tickets[ticket_id]["status"] = TicketStatus.CLOSED
+                if without_status:
+                    await session.execute(update(Ticket), without_status)
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Failed to write a batch of {len(batch)} ticket messages: {e}")
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Flushed ticket messages", extra={"messages": len(batch), "tickets": len(tickets)})
+        for values in tickets.values():
+            if "status" in values:
+                active_ticket_cache.set_ticket_status(values["id"], values["status"])
+            sla_tracker.touch(values["id"], values.get("status"), values["last_message_at"])
+        for _, _, _, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+
+message_writer = TicketMessageWriter(
+    AsyncSessionFactory,
+    max_batch=settings.message_batch_size,
+    flush_interval=settings.message_flush_interval,
+)
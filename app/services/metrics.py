@@ -0,0 +1,107 @@
+# /Users/mac/projects/ticket_bot/app/services/metrics.py
+import logging
+import time
+from aiohttp import web
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from app.database.cache import active_ticket_cache
+
+logger = logging.getLogger(__name__)
+
+HANDLER_LATENCY = Histogram(
+    "bot_handler_duration_seconds",
+    "Время обработки апдейта хендлером",
+    ["router", "handler"],
+)
+HANDLER_ERRORS = Counter(
+    "bot_handler_errors_total",
+    "Исключения, вылетевшие из хендлеров",
+    ["router", "handler"],
+)
+
+DB_QUERIES = Histogram(
+    "bot_db_query_duration_seconds",
+    "Время выполнения SQL-запросов",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+DB_ERRORS = Counter("bot_db_query_errors_total", "SQL-запросы, завершившиеся ошибкой", ["operation"])
+
+TELEGRAM_REQUESTS = Histogram(
+    "bot_telegram_request_duration_seconds",
+    "Время вызовов Bot API",
+    ["method"],
+)
+TELEGRAM_ERRORS = Counter("bot_telegram_errors_total", "Ошибки вызовов Bot API", ["method", "error"])
+TELEGRAM_RETRIES = Counter("bot_telegram_retries_total", "Повторы отправок уведомлений", ["reason"])
+
+JOB_DURATION = Histogram(
+    "bot_job_duration_seconds",
+    "Время выполнения фоновых задач",
+    ["job"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+
+NOTIFICATION_QUEUE = Gauge("bot_notification_queue_size", "Уведомления, ожидающие отправки")
+
+
+def instrument_engine(engine: AsyncEngine):
+    """Подписывается на события движка и считает число и время SQL-запросов."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        DB_QUERIES.labels(_operation(statement)).observe(time.perf_counter() - context._metrics_started)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(exception_context):
+        DB_ERRORS.labels(_operation(exception_context.statement)).inc()
+
+
+def _operation(statement) -> str:
+    # Первое слово запроса: select, insert, update, delete, pragma...
+    if not statement:
+        return "other"
+    return statement.lstrip().split(None, 1)[0].lower()
+
+
+class CacheCollector:
+    """Отдает счетчики кэша (объект с методом stats()) при каждом сборе метрик."""
+
+    def __init__(self, name: str, cache):
+        self.name = name
+        self.cache = cache
+
+    def collect(self):
+        stats = self.cache.stats()
+        hits = CounterMetricFamily(f"bot_{self.name}_cache_hits", f"Попадания в кэш {self.name}")
+        hits.add_metric([], stats["hits"])
+        misses = CounterMetricFamily(f"bot_{self.name}_cache_misses", f"Промахи кэша {self.name}")
+        misses.add_metric([], stats["misses"])
+        size = GaugeMetricFamily(f"bot_{self.name}_cache_size", f"Записей в кэше {self.name}")
+        size.add_metric([], stats["size"])
+        return [hits, misses, size]
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(body=generate_latest(REGISTRY), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Запускает HTTP-сервер с метриками Prometheus на /metrics."""
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Metrics server listening on {host}:{port}/metrics")
+    return runner
+
+
+REGISTRY.register(CacheCollector("active_ticket", active_ticket_cache))
@@ -0,0 +1,152 @@
+# /Users/mac/projects/ticket_bot/app/services/notification_dispatcher.py
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
+from app.config import settings
+from .metrics import NOTIFICATION_QUEUE, TELEGRAM_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Отправка - функция без аргументов, возвращающая корутину вызова Bot API
+# (например, functools.partial(bot.send_message, chat_id, text))
+SendCall = Callable[[], Awaitable[Any]]
+
+
+class NotificationDispatcher:
+    """
+    Очередь исходящих сообщений с пулом воркеров.
+
+    Соблюдает общий лимит Telegram (global_rate сообщений в секунду) и интервал
+    между сообщениями в один чат, повторяет отправку после TelegramRetryAfter
+    и сетевых ошибок. Отправки одного задания выполняются по порядку.
+    """
+
+    def __init__(
+        self,
+        workers: int = 8,
+        global_rate: float = 25,
+        chat_interval: float = 1.0,
+        max_queue: int = 10000,
+        max_retries: int = 3,
+    ):
+        self.workers = workers
+        self.global_interval = 1 / global_rate
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._tasks = []
+        # Заданий, которые воркеры отправляют прямо сейчас
+        self._in_progress = 0
+        self._next_global_slot = 0.0
+        self._next_chat_slot: Dict[int, float] = {}
+
+    def start(self):
+        """Запускает воркеры."""
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+        NOTIFICATION_QUEUE.set_function(self._queue.qsize)
+
+    async def close(self, timeout: float):
+        """
+        Дожидается отправки всех заданий из очереди (не дольше timeout) и останавливает воркеры.
+        Не отправленные к этому моменту задания отбрасываются, их future отменяются.
+        """
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            dropped = self._queue.qsize() + self._in_progress
+            logger.warning(f"Notification queue not drained in {timeout}s, dropping {dropped} pending deliveries.")
+            while not self._queue.empty():
+                _, _, future = self._queue.get_nowait()
+                future.cancel()
+                self._queue.task_done()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def enqueue(self, chat_id: int, *calls: SendCall) -> asyncio.Future:
+        """
+        Ставит отправку в очередь и сразу возвращает управление.
+        Возвращаемый future завершается с None при успехе или с исключением
+        последней неудачной попытки в качестве результата.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((chat_id, calls, future))
+        return future
+
+    async def _worker(self):
+        while True:
+            chat_id, calls, future = await self._queue.get()
+            self._in_progress += 1
+            try:
+                error = await self._deliver(chat_id, calls)
+                if not future.done():
+                    future.set_result(error)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                logger.error(f"Unexpected error while delivering to chat {chat_id}: {e}")
+                if not future.done():
+                    future.set_result(e)
+            finally:
+                self._in_progress -= 1
+                self._queue.task_done()
+
+    async def _deliver(self, chat_id: int, calls) -> Optional[Exception]:
+        for call in calls:
+            attempt = 0
+            while True:
+                await self._wait_for_slot(chat_id)
+                try:
+                    await call()
+                    break
+                except TelegramRetryAfter as e:
+                    # Flood control: сдвигаем все отправки, а не только в этот чат
+                    attempt += 1
+                    if attempt > self.max_retries:
+                        logger.error(f"Giving up on chat {chat_id} after {attempt} flood waits: {e}")
+                        return e
+                    logger.warning(f"Flood control for chat {chat_id}, retrying in {e.retry_after}s")
+                    TELEGRAM_RETRIES.labels("retry_after").inc()
+                    self._delay_all(e.retry_after)
+                except TelegramNetworkError as e:
+                    attempt += 1
+                    if attempt > self.max_retries:
+                        logger.error(f"Failed to deliver to chat {chat_id}: {e}")
+                        return e
+                    TELEGRAM_RETRIES.labels("network_error").inc()
+                    await asyncio.sleep(2 ** attempt)
+                except Exception as e:
+                    logger.error(f"Failed to deliver to chat {chat_id}: {e}")
+                    return e
+        return None
+
+    async def _wait_for_slot(self, chat_id: int):
+        """Резервирует ближайшее время отправки с учетом общего лимита и лимита чата."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._next_global_slot, self._next_chat_slot.get(chat_id, 0.0))
+        self._next_global_slot = slot + self.global_interval
+        self._next_chat_slot[chat_id] = slot + self.chat_interval
+        if len(self._next_chat_slot) > 10000:
+            self._next_chat_slot = {
+                chat: next_slot for chat, next_slot in self._next_chat_slot.items() if next_slot > now
+            }
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def _delay_all(self, seconds: float):
+        now = asyncio.get_running_loop().time()
+        self._next_global_slot = max(self._next_global_slot, now + seconds)
+
+
+notification_dispatcher = NotificationDispatcher(
+    workers=settings.notify_workers,
+    global_rate=settings.telegram_global_rate,
+    chat_interval=settings.telegram_chat_interval,
+)
@@ -1,39 +1,44 @@
 # /Users/mac/projects/ticket_bot/app/services/notifications.py
 import logging
 from datetime import datetime
+from functools import partial
+from typing import Optional
 from aiogram import Bot
 from aiogram.types import Message
 from app.database import crud
 from app.database.database import AsyncSessionFactory
 from app.keyboards import admin_kb
+from app.services.admins import admin_registry
+from app.services.notification_dispatcher import notification_dispatcher
 
 logger = logging.getLogger(__name__)
 
-async def check_sla(bot: Bot, sla_hours: int):
-    """Проверяет тикеты на нарушение SLA и отправляет уведомления."""
+async def check_sla(bot: Bot, sla_hours: int) -> Optional[int]:
+    """
+    Находит тикеты с нарушенным SLA, по которым еще не было уведомления, и уведомляет админов.
+    Возвращает число нарушений или None при ошибке.
+    """
     logger.info("Running SLA check...")
     async with AsyncSessionFactory() as session:
         try:
-            tickets_to_notify = await crud.find_tickets_for_sla_check(session, sla_hours)
+            tickets_to_notify = await crud.claim_tickets_for_sla_alert(session, sla_hours)
             if not tickets_to_notify:
                 logger.info("SLA check complete. No violations found.")
-                return
+                return 0
 
             for ticket in tickets_to_notify:
-                user = await crud.get_user_by_id(session, ticket.owner_id)
-                for admin_id in bot.settings.admin_ids:
-                    try:
-                        await bot.send_message(
-                            admin_id,
-                            f"⚠️ <b>SLA НАРУШЕНИЕ</b> ⚠️\n\n"
-                            f"Тикет #{ticket.id} от пользователя @{user.username} ({user.telegram_id}) "
-                            f"ожидает ответа более {sla_hours} часов."
-                        )
-                    except Exception as e:
-                        logger.error(f"Failed to send SLA notification to admin {admin_id}: {e}")
+                user = ticket.owner  # загружен вместе с тикетом
+                await notify_admins(
+                    bot,
+                    f"⚠️ <b>SLA НАРУШЕНИЕ</b> ⚠️\n\n"
+                    f"Тикет #{ticket.id} от пользователя @{user.username} ({user.telegram_id}) "
+                    f"ожидает ответа более {sla_hours} часов."
+                )
             logger.info(f"SLA check complete. Found {len(tickets_to_notify)} violations.")
+            return len(tickets_to_notify)
         except Exception as e:
             logger.error(f"Error during SLA check: {e}")
+            return None
 
 
 async def check_subscriptions(bot: Bot):
@@ -69,34 +74,33 @@ async def check_subscriptions(bot: Bot):
 
 
 async def notify_admins(bot: Bot, text: str):
-    """Отправляет текстовое уведомление всем администраторам."""
-    for admin_id in bot.settings.admin_ids:
-        try:
-            await bot.send_message(admin_id, text)
-        except Exception as e:
-            logger.error(f"Failed to send notification to admin {admin_id}: {e}")
+    """Ставит в очередь текстовое уведомление всем администраторам."""
+    for admin_id in admin_registry.ids:
+        await notification_dispatcher.enqueue(admin_id, partial(bot.send_message, admin_id, text))
 
 
 async def notify_admins_new_message(bot: Bot, message: Message, ticket_id: int):
-    """Уведомляет админов о новом сообщении в тикете."""
+    """Ставит в очередь уведомления админов о новом сообщении в тикете."""
     notification_text = (
         f"Новое сообщение в тикете #{ticket_id} "
         f"от @{message.from_user.username} ({message.from_user.id})"
     )
-    for admin_id in bot.settings.admin_ids:
-        try:
-            await bot.send_message(
+    for admin_id in admin_registry.ids:
+        await notification_dispatcher.enqueue(
+            admin_id,
+            partial(
+                bot.send_message,
                 admin_id,
                 notification_text,
                 reply_markup=admin_kb.get_ticket_actions_kb(
                     ticket_id, message.from_user.id
                 ),
-            )
+            ),
             # Пересылаем сообщение клиента
-            await bot.copy_message(
+            partial(
+                bot.copy_message,
                 chat_id=admin_id,
                 from_chat_id=message.chat.id,
                 message_id=message.message_id,
-            )
-        except Exception as e:
-            logger.error(f"Failed to send message notification to admin {admin_id}: {e}")
+            ),
+        )
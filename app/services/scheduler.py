@@ -1,21 +1,40 @@
 # /Users/mac/projects/ticket_bot/app/services/scheduler.py
+import asyncio
+import time
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_SUBMITTED
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from aiogram import Bot
+from aiogram.fsm.storage.base import BaseStorage
 from app.config import settings
+from app.states.storage import DatabaseStorage
 from . import notifications
+from .admins import admin_registry
+from .metrics import JOB_DURATION
 
-async def setup_scheduler(bot: Bot):
+async def setup_scheduler(bot: Bot, storage: BaseStorage = None):
     """Настраивает и возвращает экземпляр планировщика."""
     scheduler = AsyncIOScheduler(timezone="Europe/Moscow")
+
+    # Учитываем выполняющиеся задачи, чтобы дождаться их при остановке,
+    # и время их выполнения для метрик
+    scheduler.running_jobs = set()
+    started_at = {}
+
+    def track_running_jobs(event):
+        if event.code == EVENT_JOB_SUBMITTED:
+            scheduler.running_jobs.add(event.job_id)
+            started_at[event.job_id] = time.perf_counter()
+        else:
+            scheduler.running_jobs.discard(event.job_id)
+            started = started_at.pop(event.job_id, None)
+            job = scheduler.get_job(event.job_id)
+            if started is not None and job:
+                JOB_DURATION.labels(job.name).observe(time.perf_counter() - started)
+
+    scheduler.add_listener(track_running_jobs, EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
     
-    # Добавляем задачу для проверки SLA
-    scheduler.add_job(
-        notifications.check_sla, 
-        'interval', 
-        minutes=30, 
-        args=(bot, settings.sla_hours)
-    )
-    
+    # Проверка SLA выполняется SlaTracker (app/services/sla.py) точно в момент дедлайна
+
     # Добавляем задачу для проверки подписок (например, раз в день в 9 утра)
     scheduler.add_job(
         notifications.check_subscriptions,
@@ -24,5 +43,22 @@ async def setup_scheduler(bot: Bot):
         minute=0,
         args=(bot,)
     )
-    
+
+    # Администраторы, добавленные в других процессах
+    scheduler.add_job(admin_registry.reload, 'interval', seconds=settings.admin_reload_interval)
+
+    # Очистка просроченных состояний FSM, если они хранятся в БД
+    if isinstance(storage, DatabaseStorage):
+        scheduler.add_job(storage.purge_expired, 'interval', hours=1)
+
     return scheduler
+
+
+async def shutdown_scheduler(scheduler: AsyncIOScheduler, timeout: float):
+    """Останавливает запуск новых задач и ждет завершения текущих (не дольше timeout)."""
+    scheduler.pause()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while scheduler.running_jobs and loop.time() < deadline:
+        await asyncio.sleep(0.1)
+    scheduler.shutdown(wait=False)
@@ -0,0 +1,113 @@
+# /Users/mac/projects/ticket_bot/app/services/sla.py
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from aiogram import Bot
+from app.config import settings
+from app.database import crud
+from app.database.database import AsyncSessionFactory
+from app.database.models import TicketStatus
+from . import notifications
+from .metrics import JOB_DURATION
+
+logger = logging.getLogger(__name__)
+
+# Через сколько повторить проверку, если она не удалась
+RETRY_DELAY = timedelta(minutes=1)
+
+
+class SlaTracker:
+    """
+    Следит за дедлайнами SLA тикетов, ожидающих ответа админа.
+
+    Дедлайны хранятся в min-куче: при старте она строится из БД, затем обновляется
+    через touch() при каждом сообщении и смене статуса. Проверка запускается ровно
+    в момент ближайшего дедлайна, а отметка sla_alerted_at в БД гарантирует одно
+    уведомление на нарушение, в том числе после перезапуска.
+    """
+
+    def __init__(self, sla_hours: int):
+        self.sla_hours = sla_hours
+        self.sla = timedelta(hours=sla_hours)
+        self._heap: List[Tuple[datetime, int]] = []
+        # Актуальный дедлайн тикета; записи в куче с другим дедлайном устарели
+        self._deadlines: Dict[int, datetime] = {}
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, bot: Bot):
+        """Загружает ожидающие тикеты из БД и запускает фоновую задачу."""
+        async with AsyncSessionFactory() as session:
+            pending = await crud.get_sla_pending_tickets(session)
+        self._heap = []
+        self._deadlines = {}
+        for ticket_id, last_message_at in pending:
+            self._schedule(ticket_id, last_message_at + self.sla)
+        logger.info(f"SLA tracker started with {len(self._deadlines)} pending tickets.")
+        self._task = asyncio.create_task(self._run(bot))
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def touch(self, ticket_id: int, status: Optional[TicketStatus], at: datetime):
+        """
+        Учитывает активность в тикете: новое сообщение и/или смену статуса в момент at.
+        status=None - статус не менялся, сдвигается только дедлайн уже отслеживаемого тикета.
+        """
+        if status is None:
+            if ticket_id in self._deadlines:
+                self._schedule(ticket_id, at + self.sla)
+        elif status in crud.SLA_WAITING_STATUSES:
+            self._schedule(ticket_id, at + self.sla)
+        else:
+            self._deadlines.pop(ticket_id, None)
+
+    def _schedule(self, ticket_id: int, deadline: datetime):
+        self._deadlines[ticket_id] = deadline
+        heapq.heappush(self._heap, (deadline, ticket_id))
+        self._changed.set()
+
+    def _pop_stale(self):
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    async def _run(self, bot: Bot):
+        while True:
+            self._changed.clear()
+            self._pop_stale()
+            if not self._heap:
+                await self._changed.wait()
+                continue
+
+            delay = (self._heap[0][0] - datetime.utcnow()).total_seconds()
+            if delay > 0:
+                try:
+                    # Ждем дедлайна или изменения кучи
+                    await asyncio.wait_for(self._changed.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # Снимаем все наступившие дедлайны, уведомления отправит check_sla
+            now = datetime.utcnow()
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                deadline, ticket_id = heapq.heappop(self._heap)
+                if self._deadlines.get(ticket_id) == deadline:
+                    del self._deadlines[ticket_id]
+                    due.append(ticket_id)
+
+            with JOB_DURATION.labels("check_sla").time():
+                violations = await notifications.check_sla(bot, self.sla_hours)
+            if violations is None:
+                for ticket_id in due:
+                    if ticket_id not in self._deadlines:
+                        self._schedule(ticket_id, now + RETRY_DELAY)
+
+
+sla_tracker = SlaTracker(settings.sla_hours)
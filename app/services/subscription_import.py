@@ -0,0 +1,140 @@
+# /Users/mac/projects/ticket_bot/app/services/subscription_import.py
+import csv
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from dateutil.relativedelta import relativedelta
+from sqlalchemy.orm import sessionmaker
+from app.database import crud
+from app.database.database import AsyncSessionFactory
+
+# Сколько строк файла применяется одной транзакцией
+IMPORT_CHUNK_SIZE = 1000
+
+# Сколько отклоненных строк хранить для отчета (счетчик ведется по всем)
+IMPORT_REJECTED_LIMIT = 20
+
+# Необязательная первая строка файла
+IMPORT_HEADER = ["telegram_id", "end_date"]
+
+DATE_FORMATS = ("%d-%m-%Y", "%Y-%m-%d")
+MONTHS_PATTERN = re.compile(r"\+(\d{1,3})")
+
+
+@dataclass
+class ImportReport:
+    set_dates: int = 0
+    extended: int = 0
+    rejected: int = 0
+    # (номер строки, причина) для первых IMPORT_REJECTED_LIMIT отклоненных строк
+    rejected_rows: List[Tuple[int, str]] = field(default_factory=list)
+
+    @property
+    def applied(self) -> int:
+        """Сколько строк уже закоммичено."""
+        return self.set_dates + self.extended
+
+    def reject(self, line_number: int, reason: str):
+        self.rejected += 1
+        if len(self.rejected_rows) < IMPORT_REJECTED_LIMIT:
+            self.rejected_rows.append((line_number, reason))
+
+
+def renewal_end_date(current_end_date: Optional[datetime], months: int) -> datetime:
+    """Активная подписка продлевается от даты окончания, истекшая или отсутствующая - от текущей даты."""
+    now = datetime.utcnow()
+    start = current_end_date if current_end_date and current_end_date > now else now
+    return start + relativedelta(months=months)
+
+
+def _parse_row(row: List[str]) -> Tuple[int, Optional[datetime], Optional[int]]:
+    """Возвращает (telegram_id, дата окончания, месяцы продления) или бросает ValueError с причиной."""
+    if len(row) != 2:
+        raise ValueError("ожидается 2 колонки: telegram_id,end_date")
+    user_id, value = row[0].strip(), row[1].strip()
+    if not user_id.isdigit():
+        raise ValueError(f"неверный telegram_id {user_id!r}")
+
+    match = MONTHS_PATTERN.fullmatch(value)
+    if match:
+        months = int(match.group(1))
+        if months == 0:
+            raise ValueError("продление на 0 месяцев")
+        return int(user_id), None, months
+    for date_format in DATE_FORMATS:
+        try:
+            return int(user_id), datetime.strptime(value, date_format), None
+        except ValueError:
+            continue
+    raise ValueError(f"неверная дата {value!r}, нужна ДД-ММ-ГГГГ, ГГГГ-ММ-ДД или +N")
+
+
+async def _apply_chunk(
+    session_factory: sessionmaker,
+    end_dates: Dict[int, datetime],
+    extensions: Dict[int, int],
+    report: ImportReport,
+):
+    async with session_factory() as session:
+        if extensions:
+            # Текущие даты для "+N" одним запросом на пачку
+            current = await crud.get_subscription_end_dates(session, list(extensions))
+            for user_id, months in extensions.items():
+                end_dates[user_id] = renewal_end_date(current.get(user_id), months)
+        await crud.upsert_subscriptions(session, end_dates)
+    report.set_dates += len(end_dates) - len(extensions)
+    report.extended += len(extensions)
+
+
+async def import_subscriptions(
+    path: str,
+    session_factory: sessionmaker = AsyncSessionFactory,
+    report: Optional[ImportReport] = None,
+) -> ImportReport:
+    """
+    Загружает подписки из CSV со строками telegram_id,end_date или telegram_id,+months.
+
+    Файл читается построчно и применяется пачками по IMPORT_CHUNK_SIZE строк, каждая -
+    своей транзакцией из upsert-запросов; в памяти держится только текущая пачка и множество
+    уже встреченных ID. Ошибка в середине не откатывает уже примененные пачки.
+    Некорректные строки и повторы одного telegram_id пропускаются и попадают в отчет.
+    Первая строка может быть заголовком telegram_id,end_date.
+
+    Счетчики переданного report обновляются после коммита каждой пачки, поэтому при
+    исключении (csv.Error, ошибка БД) в нем остается то, что уже применено.
+    """
+    report = report if report is not None else ImportReport()
+    seen = set()
+    end_dates: Dict[int, datetime] = {}
+    extensions: Dict[int, int] = {}
+
+    with open(path, encoding="utf-8-sig", newline="") as stream:
+        reader = csv.reader(stream)
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            if reader.line_num == 1 and [cell.strip().lower() for cell in row] == IMPORT_HEADER:
+                continue
+            try:
+                user_id, end_date, months = _parse_row(row)
+            except ValueError as e:
+                report.reject(reader.line_num, str(e))
+                continue
+            if user_id in seen:
+                # В одном upsert строка не может обновиться дважды (PostgreSQL)
+                report.reject(reader.line_num, f"повтор telegram_id {user_id}")
+                continue
+            seen.add(user_id)
+
+            if months is not None:
+                extensions[user_id] = months
+            else:
+                end_dates[user_id] = end_date
+            if len(end_dates) + len(extensions) >= IMPORT_CHUNK_SIZE:
+                await _apply_chunk(session_factory, end_dates, extensions, report)
+                end_dates, extensions = {}, {}
+
+    if end_dates or extensions:
+        await _apply_chunk(session_factory, end_dates, extensions, report)
+    return report
@@ -9,3 +9,8 @@ class AdminState(StatesGroup):
 class ManageSubscription(StatesGroup):
     get_user_id = State()
     get_end_date = State()
+    get_import_file = State()
+
+class BroadcastState(StatesGroup):
+    get_days = State()
+    get_message = State()
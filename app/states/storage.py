@@ -0,0 +1,117 @@
+# /Users/mac/projects/ticket_bot/app/states/storage.py
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from sqlalchemy import case, delete, select
+from sqlalchemy.orm import sessionmaker
+from app.config import Settings
+from app.database.database import AsyncSessionFactory, dialect_insert
+from app.database.models import FsmRecord
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseStorage(BaseStorage):
+    """
+    FSM-хранилище в основной БД (SQLite или PostgreSQL).
+
+    Состояние и данные ключа хранятся одной строкой, пустые записи удаляются.
+    Запись живет ttl секунд с момента последнего изменения.
+    """
+
+    def __init__(self, session_factory: sessionmaker, ttl: int):
+        self.session_factory = session_factory
+        self.ttl = ttl
+
+    @staticmethod
+    def _build_key(key: StorageKey) -> str:
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+    async def _write(self, key: StorageKey, **values):
+        record_key = self._build_key(key)
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.ttl)
+        # Непереданное поле просроченной (но еще не удаленной) записи сбрасывается,
+        # иначе новый expires_at воскресил бы старые state/data
+        expired = FsmRecord.expires_at <= now
+        kept = {
+            name: case((expired, None), else_=getattr(FsmRecord, name))
+            for name in ("state", "data")
+            if name not in values
+        }
+        async with self.session_factory() as session:
+            stmt = dialect_insert(FsmRecord).values(key=record_key, expires_at=expires_at, **values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[FsmRecord.key],
+                set_={**values, **kept, "expires_at": expires_at},
+            )
+            await session.execute(stmt)
+            # Не храним пустые записи (после state.clear())
+            await session.execute(
+                delete(FsmRecord).where(
+                    FsmRecord.key == record_key,
+                    FsmRecord.state.is_(None),
+                    FsmRecord.data.is_(None),
+                )
+            )
+            await session.commit()
+
+    async def _read(self, key: StorageKey) -> Optional[FsmRecord]:
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(FsmRecord).where(
+                    FsmRecord.key == self._build_key(key),
+                    FsmRecord.expires_at > datetime.utcnow(),
+                )
+            )
+            return result.scalar_one_or_none()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._write(key, state=state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = await self._read(key)
+        return record.state if record else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._write(key, data=json.dumps(data, separators=(",", ":")) if data else None)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = await self._read(key)
+        if not record or not record.data:
+            return {}
+        return json.loads(record.data)
+
+    async def purge_expired(self):
+        """Удаляет просроченные записи."""
+        async with self.session_factory() as session:
+            result = await session.execute(
+                delete(FsmRecord).where(FsmRecord.expires_at <= datetime.utcnow())
+            )
+            await session.commit()
+        logger.info(f"Purged {result.rowcount} expired FSM records.")
+
+    async def close(self) -> None:
+        pass
+
+
+def create_fsm_storage(settings: Settings) -> BaseStorage:
+    """Создает FSM-хранилище, выбранное в настройках (FSM_STORAGE)."""
+    if settings.fsm_storage == "redis":
+        # redis нужен только для этого бэкенда
+        from aiogram.fsm.storage.redis import RedisStorage
+
+        return RedisStorage.from_url(
+            settings.redis_url,
+            state_ttl=settings.fsm_ttl,
+            data_ttl=settings.fsm_ttl,
+        )
+    if settings.fsm_storage == "database":
+        return DatabaseStorage(AsyncSessionFactory, ttl=settings.fsm_ttl)
+    if settings.fsm_storage == "memory":
+        return MemoryStorage()
+    raise ValueError(f"Unknown FSM_STORAGE: {settings.fsm_storage}")
@@ -0,0 +1,55 @@
+# /Users/mac/projects/ticket_bot/app/webhook.py
+import asyncio
+import logging
+import signal
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from app.config import Settings
+
+logger = logging.getLogger(__name__)
+
+
+def create_webhook_app(dp: Dispatcher, bot: Bot, settings: Settings) -> web.Application:
+    """Создает aiohttp-приложение, принимающее апдейты Telegram на WEBHOOK_PATH."""
+    app = web.Application()
+    # Апдейт обрабатывается внутри запроса (не в фоне), чтобы при остановке
+    # aiohttp дождался всех обрабатываемых апдейтов
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=False,
+        secret_token=settings.webhook_secret,
+    ).register(app, path=settings.webhook_path)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, settings: Settings):
+    """Запускает веб-сервер для вебхука и работает до SIGINT/SIGTERM."""
+    app = create_webhook_app(dp, bot, settings)
+    runner = web.AppRunner(app, shutdown_timeout=settings.shutdown_timeout)
+    await runner.setup()
+    site = web.TCPSite(runner, settings.webapp_host, settings.webapp_port)
+    await site.start()
+    logger.info(f"Webhook server listening on {settings.webapp_host}:{settings.webapp_port}{settings.webhook_path}")
+
+    if settings.webhook_base_url:
+        await bot.set_webhook(
+            url=settings.webhook_base_url.rstrip("/") + settings.webhook_path,
+            secret_token=settings.webhook_secret,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logger.info("Webhook registered in Telegram.")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        logger.info("Stopping webhook server, waiting for in-flight updates...")
+        # Перестает принимать соединения и ждет завершения начатых запросов (до shutdown_timeout)
+        await runner.cleanup()
+        logger.info("Webhook server stopped.")
@@ -0,0 +1,91 @@
+# /Users/mac/projects/ticket_bot/tests/conftest.py
+import asyncio
+import inspect
+import os
+import tempfile
+
+# Настройки читаются при импорте app.config, поэтому окружение задается до импорта приложения
+_tmp_dir = tempfile.TemporaryDirectory()
+os.environ.setdefault("BOT_TOKEN", "1:test")
+os.environ.setdefault("ADMIN_IDS", "1")
+os.environ["DB_URL"] = f"sqlite+aiosqlite:///{_tmp_dir.name}/app.db"
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import crud, database
+from app.database.cache import active_ticket_cache
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    """Запускает async-тесты в цикле событий фикстуры event_loop."""
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    loop = pyfuncitem.funcargs["event_loop"]
+    kwargs = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+    loop.run_until_complete(pyfuncitem.obj(**kwargs))
+    return True
+
+
+@pytest.fixture(autouse=True)
+def event_loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def _open_database(url: str, event_loop, monkeypatch) -> sessionmaker:
+    engine = database.create_engine_from_settings(url)
+
+    async def migrate():
+        async with engine.begin() as conn:
+            if engine.dialect.name == "postgresql":
+                # TEST_PG_URL должен указывать на отдельную базу: схема пересоздается
+                await conn.execute(text("DROP SCHEMA public CASCADE"))
+                await conn.execute(text("CREATE SCHEMA public"))
+            await conn.run_sync(database.run_migrations)
+
+    event_loop.run_until_complete(migrate())
+    # dialect_insert и диалектные ветки crud смотрят на движок модуля
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(crud, "engine", engine)
+    active_ticket_cache.clear()
+    return sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+
+@pytest.fixture
+def sqlite_db(event_loop, monkeypatch, tmp_path):
+    """Фабрика сессий для свежей SQLite-базы с примененными миграциями."""
+    session_factory = _open_database(f"sqlite+aiosqlite:///{tmp_path}/test.db", event_loop, monkeypatch)
+    yield session_factory
+    event_loop.run_until_complete(session_factory.kw["bind"].dispose())
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def db(request, event_loop, monkeypatch, tmp_path):
+    """Как sqlite_db, но тест прогоняется и на PostgreSQL, если задан TEST_PG_URL (postgresql+asyncpg://...)."""
+    if request.param == "postgresql":
+        url = os.getenv("TEST_PG_URL")
+        if not url:
+            pytest.skip("TEST_PG_URL is not set")
+    else:
+        url = f"sqlite+aiosqlite:///{tmp_path}/test.db"
+    session_factory = _open_database(url, event_loop, monkeypatch)
+    yield session_factory
+    event_loop.run_until_complete(session_factory.kw["bind"].dispose())
+
+
+@pytest.fixture
+def queries():
+    """Список SQL-запросов (statement, parameters), выполненных за время теста."""
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append((statement, parameters))
+
+    event.listen(Engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(Engine, "before_cursor_execute", record)
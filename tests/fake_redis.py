@@ -0,0 +1,98 @@
+# /Users/mac/projects/ticket_bot/tests/fake_redis.py
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class FakeRedisServer:
+    """
+    Минимальный Redis-сервер в процессе теста: RESP2 и команды, которые использует RedisStorage
+    (GET, SET с EX/PX, DEL, EXISTS, TTL). Время сдвигается через advance(), чтобы проверять TTL без ожидания.
+    """
+
+    def __init__(self):
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self._offset = 0.0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.port: Optional[int] = None
+
+    @property
+    def url(self) -> str:
+        return f"redis://127.0.0.1:{self.port}/0"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def advance(self, seconds: float):
+        self._offset += seconds
+
+    def _now(self) -> float:
+        return time.monotonic() + self._offset
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at <= self._now():
+            del self.data[key]
+            return None
+        return value
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                command = await self._read_command(reader)
+                if command is None:
+                    break
+                writer.write(self._execute(command))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+        header = await reader.readline()
+        if not header:
+            return None
+        if not header.startswith(b"*"):
+            raise ValueError(f"Unsupported request: {header!r}")
+        args = []
+        for _ in range(int(header[1:])):
+            length = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    def _execute(self, command: List[bytes]) -> bytes:
+        name, args = command[0].upper(), command[1:]
+        if name == b"GET":
+            value = self._get(args[0])
+            return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+        if name == b"SET":
+            expires_at = None
+            options = [arg.upper() for arg in args[2:]]
+            if b"EX" in options:
+                expires_at = self._now() + int(args[2 + options.index(b"EX") + 1])
+            elif b"PX" in options:
+                expires_at = self._now() + int(args[2 + options.index(b"PX") + 1]) / 1000
+            self.data[args[0]] = (args[1], expires_at)
+            return b"+OK\r\n"
+        if name in (b"DEL", b"EXISTS"):
+            found = [key for key in args if self._get(key) is not None]
+            if name == b"DEL":
+                for key in found:
+                    del self.data[key]
+            return b":%d\r\n" % len(found)
+        if name == b"TTL":
+            if self._get(args[0]) is None:
+                return b":-2\r\n"
+            expires_at = self.data[args[0]][1]
+            return b":%d\r\n" % (-1 if expires_at is None else round(expires_at - self._now()))
+        if name == b"PING":
+            return b"+PONG\r\n"
+        if name == b"SELECT":
+            return b"+OK\r\n"
+        # Например, CLIENT SETINFO при подключении: redis-py игнорирует ошибку
+        return b"-ERR unknown command '%s'\r\n" % name
@@ -0,0 +1,68 @@
+# /Users/mac/projects/ticket_bot/tests/test_active_ticket_cache.py
+from app.database import crud
+from app.database.cache import ActiveTicket, active_ticket_cache
+from app.database.models import TicketStatus
+
+CLIENT_ID = 100
+
+
+def _selects(queries) -> list:
+    return [statement for statement, _ in queries if statement.lstrip().upper().startswith("SELECT")]
+
+
+async def _two_tickets(session_factory):
+    async with session_factory() as session:
+        await crud.upsert_user(session, CLIENT_ID, "client")
+        first = await crud.create_ticket(session, CLIENT_ID)
+        second = await crud.create_ticket(session, CLIENT_ID)
+        await crud.set_active_ticket(session, CLIENT_ID, first.id)
+        return first.id, second.id
+
+
+async def test_repeated_read_is_served_from_cache(db, queries):
+    first, _ = await _two_tickets(db)
+
+    queries.clear()
+    async with db() as session:
+        assert await crud.get_active_ticket(session, CLIENT_ID) == ActiveTicket(first, TicketStatus.OPEN)
+        assert await crud.get_active_ticket(session, CLIENT_ID) == ActiveTicket(first, TicketStatus.OPEN)
+
+    assert len(_selects(queries)) == 1
+
+
+async def test_writes_invalidate_cached_ticket(db):
+    first, second = await _two_tickets(db)
+
+    async with db() as session:
+        await crud.get_active_ticket(session, CLIENT_ID)
+        await crud.update_ticket_status(session, first, TicketStatus.CLOSED)
+        closed = await crud.get_active_ticket(session, CLIENT_ID)
+        await crud.set_active_ticket(session, CLIENT_ID, second)
+        switched = await crud.get_active_ticket(session, CLIENT_ID)
+
+    assert closed == ActiveTicket(first, TicketStatus.CLOSED)
+    assert switched == ActiveTicket(second, TicketStatus.OPEN)
+
+
+async def test_read_racing_a_write_is_not_cached(db):
+    first, second = await _two_tickets(db)
+
+    async with db() as reader, db() as writer:
+        read = reader.execute
+
+        async def read_then_write(*args, **kwargs):
+            result = await read(*args, **kwargs)
+            # Другой апдейт меняет активный тикет между чтением из БД и put() в кэш
+            await crud.set_active_ticket(writer, CLIENT_ID, second)
+            return result
+
+        reader.execute = read_then_write
+        stale = await crud.get_active_ticket(reader, CLIENT_ID)
+        reader.execute = read
+        found, _ = active_ticket_cache.get(CLIENT_ID)
+        fresh = await crud.get_active_ticket(reader, CLIENT_ID)
+
+    # Прочитанное до записи значение возвращается, но в кэш не попадает
+    assert stale == ActiveTicket(first, TicketStatus.OPEN)
+    assert not found
+    assert fresh == ActiveTicket(second, TicketStatus.OPEN)
@@ -0,0 +1,108 @@
+# /Users/mac/projects/ticket_bot/tests/test_broadcast.py
+import asyncio
+from collections import Counter
+import pytest
+from app.database import crud
+from app.database.models import BroadcastStatus
+from app.services.broadcast import BroadcastSender
+from app.services.notification_dispatcher import NotificationDispatcher
+
+ADMIN_ID = 1
+USER_IDS = list(range(100, 110))
+
+
+class FakeBot:
+    """Записывает copy_message и правки сообщения о прогрессе."""
+
+    def __init__(self, fail_for=(), on_copy=None):
+        self.fail_for = set(fail_for)
+        self.on_copy = on_copy
+        self.copied = []
+        self.progress = []
+
+    async def copy_message(self, chat_id, from_chat_id, message_id):
+        self.copied.append(chat_id)
+        if self.on_copy:
+            self.on_copy(chat_id)
+        if chat_id in self.fail_for:
+            raise RuntimeError("bot was blocked by the user")
+
+    async def edit_message_text(self, text, chat_id, message_id):
+        self.progress.append(text)
+
+
+@pytest.fixture
+def dispatcher(event_loop):
+    dispatcher = NotificationDispatcher(workers=2, global_rate=1000, chat_interval=0)
+
+    async def start():
+        # Воркеры создаются в работающем цикле событий
+        dispatcher.start()
+
+    event_loop.run_until_complete(start())
+    yield dispatcher
+    event_loop.run_until_complete(dispatcher.close(timeout=5))
+
+
+async def _running_broadcast(session_factory) -> int:
+    async with session_factory() as session:
+        for user_id in USER_IDS:
+            await crud.upsert_user(session, user_id, f"user{user_id}")
+        broadcast = await crud.create_broadcast(session, ADMIN_ID, "all", None, ADMIN_ID, 42)
+        await crud.start_broadcast(session, broadcast.id, ADMIN_ID, 7)
+        return broadcast.id
+
+
+async def _finish(sender: BroadcastSender):
+    await asyncio.wait_for(asyncio.gather(*sender._tasks.values()), 5)
+
+
+async def _status(session_factory, broadcast_id: int) -> BroadcastStatus:
+    async with session_factory() as session:
+        return (await crud.get_broadcast(session, broadcast_id)).status
+
+
+async def test_start_resumes_from_pending_recipients(db, dispatcher):
+    broadcast_id = await _running_broadcast(db)
+    # Результаты пачек, сохраненные до остановки бота
+    async with db() as session:
+        await crud.save_delivery_results(session, broadcast_id, USER_IDS[:3], USER_IDS[3:4])
+
+    bot = FakeBot(fail_for=USER_IDS[-1:])
+    sender = BroadcastSender(db, dispatcher, batch_size=3, progress_interval=0)
+    await sender.start(bot)
+    await _finish(sender)
+
+    assert sorted(bot.copied) == USER_IDS[4:]
+    assert await _status(db, broadcast_id) == BroadcastStatus.DONE
+    assert "Отправлено: 8 из 10" in bot.progress[-1]
+    assert "Не доставлено: 2" in bot.progress[-1]
+
+
+async def test_stopped_broadcast_is_finished_after_restart(db, dispatcher):
+    broadcast_id = await _running_broadcast(db)
+    stopping = []
+
+    def stop_after_first_batch(chat_id):
+        if len(first_bot.copied) == 3:
+            stopping.append(asyncio.ensure_future(first.close(timeout=5)))
+
+    first_bot = FakeBot(on_copy=stop_after_first_batch)
+    first = BroadcastSender(db, dispatcher, batch_size=3, progress_interval=0)
+    await first.start(first_bot)
+    await _finish(first)
+    await stopping[0]
+
+    # Остановка между пачками: рассылка остается запущенной
+    assert len(first_bot.copied) == 3
+    assert await _status(db, broadcast_id) == BroadcastStatus.RUNNING
+
+    second_bot = FakeBot()
+    second = BroadcastSender(db, dispatcher, batch_size=3, progress_interval=0)
+    await second.start(second_bot)
+    await _finish(second)
+
+    copies = Counter(first_bot.copied + second_bot.copied)
+    assert sorted(copies) == USER_IDS
+    assert set(copies.values()) == {1}
+    assert await _status(db, broadcast_id) == BroadcastStatus.DONE
@@ -0,0 +1,138 @@
+# /Users/mac/projects/ticket_bot/tests/test_dialects.py
+# Запросы с диалектными ветками: ON CONFLICT, UPDATE ... RETURNING и триггеры миграций
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, select, update
+from app.database import crud
+from app.database.models import Ticket, TicketMessage, TicketStatus, User
+
+ADMIN_ID = 1
+CLIENT_ID = 100
+
+
+async def _add_message(session, ticket_id: int, sender_id: int, text: str, created_at: datetime = None):
+    await session.execute(
+        insert(TicketMessage).values(
+            ticket_id=ticket_id,
+            sender_id=sender_id,
+            message_type="text",
+            text=text,
+            created_at=created_at or datetime.utcnow(),
+        )
+    )
+    await session.commit()
+
+
+async def test_upsert_user(db):
+    async with db() as session:
+        await crud.upsert_user(session, CLIENT_ID, "old")
+        await crud.upsert_user(session, CLIENT_ID, "new")
+        await crud.upsert_user(session, CLIENT_ID, "new")
+        user = await crud.get_user_by_id(session, CLIENT_ID)
+        count = await session.scalar(select(func.count()).select_from(User))
+
+    assert user.username == "new"
+    assert count == 1
+
+
+async def test_upsert_subscriptions(db):
+    first = datetime(2030, 1, 1)
+    second = datetime(2031, 6, 1)
+    async with db() as session:
+        await crud.upsert_user(session, CLIENT_ID, "client")
+        await crud.upsert_subscriptions(session, {CLIENT_ID: first})
+        # Второй пользователь еще не писал боту и создается вместе с подпиской
+        await crud.upsert_subscriptions(session, {CLIENT_ID: second, CLIENT_ID + 1: first})
+        end_dates = await crud.get_subscription_end_dates(session, [CLIENT_ID, CLIENT_ID + 1])
+        new_user = await crud.get_user_by_id(session, CLIENT_ID + 1)
+
+    assert end_dates == {CLIENT_ID: second, CLIENT_ID + 1: first}
+    assert new_user is not None
+
+
+async def test_sla_claim_returns_each_breach_once(db):
+    async with db() as session:
+        await crud.upsert_user(session, CLIENT_ID, "client")
+        late = await crud.create_ticket(session, CLIENT_ID)
+        fresh = await crud.create_ticket(session, CLIENT_ID)
+        await session.execute(
+            update(Ticket).where(Ticket.id == late.id).values(last_message_at=datetime.utcnow() - timedelta(hours=13))
+        )
+        await session.commit()
+
+    async with db() as session:
+        claimed = await crud.claim_tickets_for_sla_alert(session, sla_hours=12)
+        claimed_again = await crud.claim_tickets_for_sla_alert(session, sla_hours=12)
+        tickets = {ticket.id: ticket for ticket in (await session.scalars(select(Ticket))).all()}
+
+    assert [ticket.id for ticket in claimed] == [late.id]
+    assert claimed[0].owner.username == "client"
+    assert claimed_again == []
+    assert tickets[late.id].sla_alerted_at is not None
+    assert tickets[fresh.id].sla_alerted_at is None
+
+
+async def test_ticket_stats_follow_tickets(db):
+    async with db() as session:
+        await crud.upsert_user(session, CLIENT_ID, "client")
+        answered = await crud.create_ticket(session, CLIENT_ID)
+        closed = await crud.create_ticket(session, CLIENT_ID)
+        removed = await crud.create_ticket(session, CLIENT_ID)
+        await crud.create_ticket(session, CLIENT_ID)
+
+        await _add_message(session, answered.id, CLIENT_ID, "вопрос")
+        await _add_message(session, answered.id, ADMIN_ID, "ответ", datetime.utcnow() + timedelta(minutes=10))
+        await _add_message(session, answered.id, ADMIN_ID, "еще ответ", datetime.utcnow() + timedelta(minutes=20))
+        await crud.update_ticket_status(session, answered.id, TicketStatus.PENDING)
+        await crud.update_ticket_status(session, closed.id, TicketStatus.CLOSED)
+        # Повторная установка того же статуса счетчики не меняет
+        await crud.update_ticket_status(session, closed.id, TicketStatus.CLOSED)
+        await session.execute(delete(Ticket).where(Ticket.id == removed.id))
+        await session.commit()
+
+        stats = await crud.get_ticket_stats(session)
+        counts = dict((await session.execute(select(Ticket.status, func.count()).group_by(Ticket.status))).all())
+        first_response_at = await session.scalar(select(Ticket.first_response_at).where(Ticket.id == answered.id))
+
+    for status in TicketStatus:
+        assert stats[f"status:{status.name}"] == counts.get(status, 0)
+    assert stats["status:OPEN"] == 1
+    # Учитывается только первый ответ не от владельца тикета
+    assert first_response_at is not None
+    assert stats["first_response:count"] == 1
+    assert stats["first_response:le_900"] == 1
+    assert 500 <= stats["first_response:seconds"] <= 700
+
+
+async def test_search_tickets(db):
+    async with db() as session:
+        await crud.upsert_user(session, CLIENT_ID, "client")
+        router = await crud.create_ticket(session, CLIENT_ID)
+        other = await crud.create_ticket(session, CLIENT_ID)
+        await _add_message(session, router.id, CLIENT_ID, "не работает роутер после обновления")
+        await _add_message(session, other.id, CLIENT_ID, "вопрос про оплату")
+        await _add_message(session, other.id, CLIENT_ID, None)
+
+        hits, has_more, truncated = await crud.search_tickets(session, "роутер")
+        missing, _, _ = await crud.search_tickets(session, "роутер оплату")
+
+    assert [hit.ticket_id for hit in hits] == [router.id]
+    assert crud.SEARCH_MARK_START in hits[0].snippet
+    assert not has_more
+    assert not truncated
+    assert missing == []
+
+
+async def test_search_tickets_reports_truncated_window(db, monkeypatch):
+    monkeypatch.setattr(crud, "SEARCH_CANDIDATES", 3)
+    async with db() as session:
+        await crud.upsert_user(session, CLIENT_ID, "client")
+        tickets = [await crud.create_ticket(session, CLIENT_ID) for _ in range(4)]
+        for ticket in tickets:
+            await _add_message(session, ticket.id, CLIENT_ID, "не работает роутер")
+
+        hits, has_more, truncated = await crud.search_tickets(session, "роутер", limit=5)
+
+    # Самый старый тикет за окном из трех последних совпадений
+    assert sorted(hit.ticket_id for hit in hits) == [ticket.id for ticket in tickets[1:]]
+    assert not has_more
+    assert truncated
@@ -0,0 +1,122 @@
+# /Users/mac/projects/ticket_bot/tests/test_fsm_storage.py
+from datetime import datetime, timedelta
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+from sqlalchemy import select, update
+from app.config import Settings
+from app.database.models import FsmRecord
+from app.states.storage import DatabaseStorage, create_fsm_storage
+from fake_redis import FakeRedisServer
+
+KEY = StorageKey(bot_id=1, chat_id=100, user_id=100)
+OTHER_KEY = StorageKey(bot_id=1, chat_id=200, user_id=200)
+TTL = 60
+
+
+@pytest.fixture
+def redis_server(event_loop):
+    server = FakeRedisServer()
+    event_loop.run_until_complete(server.start())
+    yield server
+    event_loop.run_until_complete(server.stop())
+
+
+@pytest.fixture
+def redis_storage(redis_server, event_loop, monkeypatch):
+    # Хранилище создается тем же кодом, что и в боте, из настроек окружения
+    monkeypatch.setenv("FSM_STORAGE", "redis")
+    monkeypatch.setenv("REDIS_URL", redis_server.url)
+    monkeypatch.setenv("FSM_TTL", str(TTL))
+    storage = create_fsm_storage(Settings())
+    yield storage
+    event_loop.run_until_complete(storage.close())
+
+
+async def _records(session_factory):
+    async with session_factory() as session:
+        return (await session.scalars(select(FsmRecord))).all()
+
+
+async def test_database_storage_round_trip(sqlite_db):
+    storage = DatabaseStorage(sqlite_db, ttl=TTL)
+    await storage.set_state(KEY, "Form:name")
+    await storage.set_data(KEY, {"name": "Иван"})
+
+    assert await storage.get_state(KEY) == "Form:name"
+    assert await storage.get_data(KEY) == {"name": "Иван"}
+    assert await storage.get_state(OTHER_KEY) is None
+    assert await storage.get_data(OTHER_KEY) == {}
+
+    # state.clear(): пустая запись удаляется
+    await storage.set_state(KEY, None)
+    await storage.set_data(KEY, {})
+    assert await _records(sqlite_db) == []
+
+
+async def test_database_storage_expired_record_is_not_revived(sqlite_db):
+    storage = DatabaseStorage(sqlite_db, ttl=TTL)
+    await storage.set_state(KEY, "Form:name")
+    await storage.set_data(KEY, {"name": "Иван"})
+    async with sqlite_db() as session:
+        await session.execute(update(FsmRecord).values(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+        await session.commit()
+    assert await storage.get_state(KEY) is None
+
+    # Запись еще не удалена purge_expired, но старые данные не должны вернуться вместе с новым состоянием
+    await storage.set_state(KEY, "Form:email")
+    assert await storage.get_state(KEY) == "Form:email"
+    assert await storage.get_data(KEY) == {}
+
+    await storage.set_data(OTHER_KEY, {"step": 1})
+    async with sqlite_db() as session:
+        await session.execute(
+            update(FsmRecord).where(FsmRecord.key.like("1:200:%")).values(expires_at=datetime.utcnow())
+        )
+        await session.commit()
+    await storage.set_data(OTHER_KEY, {"step": 2})
+    assert await storage.get_data(OTHER_KEY) == {"step": 2}
+    assert await storage.get_state(OTHER_KEY) is None
+
+
+async def test_database_storage_purge_expired(sqlite_db):
+    storage = DatabaseStorage(sqlite_db, ttl=TTL)
+    await storage.set_state(KEY, "Form:name")
+    await storage.set_state(OTHER_KEY, "Form:name")
+    async with sqlite_db() as session:
+        await session.execute(
+            update(FsmRecord).where(FsmRecord.key.like("1:100:%")).values(expires_at=datetime.utcnow())
+        )
+        await session.commit()
+
+    await storage.purge_expired()
+
+    assert [record.key for record in await _records(sqlite_db)] == [storage._build_key(OTHER_KEY)]
+
+
+async def test_redis_storage_round_trip(redis_storage):
+    assert isinstance(redis_storage, RedisStorage)
+    await redis_storage.set_state(KEY, "Form:name")
+    await redis_storage.set_data(KEY, {"name": "Иван"})
+
+    assert await redis_storage.get_state(KEY) == "Form:name"
+    assert await redis_storage.get_data(KEY) == {"name": "Иван"}
+    assert await redis_storage.get_state(OTHER_KEY) is None
+
+    await redis_storage.set_state(KEY, None)
+    await redis_storage.set_data(KEY, {})
+    assert await redis_storage.get_state(KEY) is None
+    assert await redis_storage.get_data(KEY) == {}
+
+
+async def test_redis_storage_applies_fsm_ttl(redis_storage, redis_server):
+    await redis_storage.set_state(KEY, "Form:name")
+    await redis_storage.set_data(KEY, {"name": "Иван"})
+    assert all(expires_at is not None for _, expires_at in redis_server.data.values())
+
+    redis_server.advance(TTL - 1)
+    assert await redis_storage.get_state(KEY) == "Form:name"
+
+    redis_server.advance(2)
+    assert await redis_storage.get_state(KEY) is None
+    assert await redis_storage.get_data(KEY) == {}
@@ -0,0 +1,30 @@
+# /Users/mac/projects/ticket_bot/tests/test_logs.py
+import json
+import logging
+from app.logs import JsonFormatter, TextFormatter
+
+
+def _record(**extra) -> logging.LogRecord:
+    record = logging.LogRecord("app.handlers", logging.INFO, __file__, 1, "Admin replying to ticket", None, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_text_format_keeps_extra_fields():
+    line = TextFormatter().format(_record(admin_id=1, ticket_id=42, sample_rate=0.01))
+
+    assert line.endswith(" - INFO - Admin replying to ticket admin_id=1 ticket_id=42")
+
+
+def test_text_format_without_extra_fields():
+    line = TextFormatter().format(_record())
+
+    assert line.endswith(" - INFO - Admin replying to ticket")
+
+
+def test_json_format_keeps_extra_fields():
+    entry = json.loads(JsonFormatter().format(_record(user_id=7, sample_rate=0.01)))
+
+    assert entry["message"] == "Admin replying to ticket"
+    assert entry["user_id"] == 7
+    assert "sample_rate" not in entry
@@ -0,0 +1,131 @@
+# /Users/mac/projects/ticket_bot/tests/test_message_writer.py
+import asyncio
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import SQLAlchemyError
+from app.database import crud
+from app.database.models import TicketMessage, TicketStatus
+from app.services.message_writer import TicketMessageWriter
+
+ADMIN_ID = 1
+CLIENT_ID = 100
+
+
+@pytest.fixture
+def writer(db, event_loop):
+    writer = TicketMessageWriter(db, max_batch=10, flush_interval=0.01)
+    yield writer
+    event_loop.run_until_complete(writer.close())
+
+
+async def _open_ticket(session_factory) -> int:
+    async with session_factory() as session:
+        await crud.upsert_user(session, CLIENT_ID, "client")
+        return (await crud.create_ticket(session, CLIENT_ID)).id
+
+
+async def _message_count(session_factory) -> int:
+    async with session_factory() as session:
+        return await session.scalar(select(func.count()).select_from(TicketMessage))
+
+
+async def _closed_ticket(session_factory) -> int:
+    async with session_factory() as session:
+        await crud.upsert_user(session, CLIENT_ID, "client")
+        ticket = await crud.create_ticket(session, CLIENT_ID)
+        await crud.update_ticket_status(session, ticket.id, TicketStatus.CLOSED)
+        return ticket.id
+
+
+async def _status(session_factory, ticket_id: int) -> TicketStatus:
+    async with session_factory() as session:
+        return (await crud.get_ticket_by_id(session, ticket_id)).status
+
+
+async def test_client_message_does_not_reopen_closed_ticket(db, writer):
+    ticket_id = await _closed_ticket(db)
+    writer.start()
+
+    await writer.submit(ticket_id, CLIENT_ID, "text", "еще вопрос", status=TicketStatus.ANSWERED, keep_closed=True)
+
+    assert await _status(db, ticket_id) == TicketStatus.CLOSED
+    assert await _message_count(db) == 1
+
+
+async def test_admin_reply_reopens_closed_ticket(db, writer):
+    ticket_id = await _closed_ticket(db)
+    writer.start()
+
+    await writer.submit(ticket_id, ADMIN_ID, "text", "ответ", status=TicketStatus.PENDING)
+
+    assert await _status(db, ticket_id) == TicketStatus.PENDING
+
+
+async def test_guard_applies_per_ticket_in_one_batch(db, writer):
+    client_ticket = await _closed_ticket(db)
+    admin_ticket = await _closed_ticket(db)
+    writer.start()
+
+    await asyncio.gather(
+        writer.submit(client_ticket, CLIENT_ID, "text", "вопрос", status=TicketStatus.ANSWERED, keep_closed=True),
+        writer.submit(admin_ticket, ADMIN_ID, "text", "ответ", status=TicketStatus.PENDING),
+    )
+
+    assert await _status(db, client_ticket) == TicketStatus.CLOSED
+    assert await _status(db, admin_ticket) == TicketStatus.PENDING
+
+
+async def test_full_batch_is_written_with_one_insert(db, writer, queries):
+    ticket_id = await _open_ticket(db)
+    # Таймер не успеет сработать: пачку отправляет набравшийся max_batch
+    writer.flush_interval = 10
+    writer.start()
+    queries.clear()
+
+    await asyncio.wait_for(
+        asyncio.gather(*(writer.submit(ticket_id, CLIENT_ID, "text", f"m{i}") for i in range(writer.max_batch))), 5
+    )
+
+    inserts = [statement for statement, _ in queries if statement.lstrip().upper().startswith("INSERT INTO TICKET_MESSAGES")]
+    assert len(inserts) == 1
+    assert await _message_count(db) == writer.max_batch
+
+
+async def test_partial_batch_is_flushed_after_interval(db, writer, event_loop):
+    ticket_id = await _open_ticket(db)
+    writer.start()
+
+    started = event_loop.time()
+    await asyncio.wait_for(writer.submit(ticket_id, CLIENT_ID, "text", "вопрос"), 5)
+
+    assert event_loop.time() - started >= writer.flush_interval
+    assert await _message_count(db) == 1
+
+
+async def test_close_flushes_pending_messages(db, writer):
+    ticket_id = await _open_ticket(db)
+    writer.flush_interval = 10
+    writer.start()
+
+    submitted = asyncio.ensure_future(writer.submit(ticket_id, CLIENT_ID, "text", "вопрос"))
+    await asyncio.sleep(0)
+    await asyncio.wait_for(writer.close(), 5)
+
+    assert submitted.done() and submitted.exception() is None
+    assert await _message_count(db) == 1
+
+
+async def test_failed_flush_is_raised_to_every_submitter(db, writer):
+    ticket_id = await _open_ticket(db)
+    async with db() as session:
+        await session.execute(text("DROP TABLE ticket_messages"))
+        await session.commit()
+    writer.start()
+
+    results = await asyncio.gather(
+        *(writer.submit(ticket_id, CLIENT_ID, "text", f"m{i}") for i in range(3)), return_exceptions=True
+    )
+
+    assert all(isinstance(result, SQLAlchemyError) for result in results)
+    # Фоновая задача пережила ошибку и продолжает принимать сообщения
+    assert not writer._task.done()
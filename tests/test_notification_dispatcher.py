@@ -0,0 +1,35 @@
+# /Users/mac/projects/ticket_bot/tests/test_notification_dispatcher.py
+import asyncio
+from app.services.notification_dispatcher import NotificationDispatcher
+
+
+def _dispatcher() -> NotificationDispatcher:
+    return NotificationDispatcher(workers=2, global_rate=1000, chat_interval=0)
+
+
+async def test_close_drains_queue():
+    dispatcher = _dispatcher()
+    dispatcher.start()
+    sent = []
+
+    async def send(chat_id):
+        sent.append(chat_id)
+
+    futures = [await dispatcher.enqueue(chat_id, lambda chat_id=chat_id: send(chat_id)) for chat_id in range(10)]
+    await dispatcher.close(timeout=5)
+
+    assert sorted(sent) == list(range(10))
+    assert [future.result() for future in futures] == [None] * 10
+
+
+async def test_close_gives_up_after_timeout(caplog):
+    dispatcher = _dispatcher()
+    dispatcher.start()
+    never = asyncio.Event()
+
+    futures = [await dispatcher.enqueue(chat_id, never.wait) for chat_id in range(5)]
+    await asyncio.sleep(0)
+    await asyncio.wait_for(dispatcher.close(timeout=0.1), 2)
+
+    assert all(future.cancelled() for future in futures)
+    assert "dropping 5 pending deliveries" in caplog.text
@@ -0,0 +1,47 @@
+# /Users/mac/projects/ticket_bot/tests/test_query_counts.py
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from app.database import crud
+from app.database.models import Ticket
+
+ROWS = 25
+
+
+def _selects(queries) -> list:
+    return [statement for statement, _ in queries if statement.lstrip().upper().startswith("SELECT")]
+
+
+async def test_sla_claim_loads_owners_in_one_select(sqlite_db, queries):
+    async with sqlite_db() as session:
+        for user_id in range(100, 100 + ROWS):
+            await crud.upsert_user(session, user_id, f"user{user_id}")
+            await crud.create_ticket(session, user_id)
+        await session.execute(update(Ticket).values(last_message_at=datetime.utcnow() - timedelta(hours=13)))
+        await session.commit()
+
+    queries.clear()
+    async with sqlite_db() as session:
+        tickets = await crud.claim_tickets_for_sla_alert(session, sla_hours=12)
+        owners = {ticket.owner.username for ticket in tickets}
+
+    assert len(tickets) == ROWS
+    assert len(owners) == ROWS
+    assert len(_selects(queries)) == 1
+
+
+async def test_expiring_subscriptions_load_users_in_one_select(sqlite_db, queries):
+    async with sqlite_db() as session:
+        for user_id in range(100, 100 + ROWS):
+            await crud.upsert_user(session, user_id, f"user{user_id}")
+        await crud.upsert_subscriptions(
+            session, {user_id: datetime.utcnow() + timedelta(days=1) for user_id in range(100, 100 + ROWS)}
+        )
+
+    queries.clear()
+    async with sqlite_db() as session:
+        subscriptions = await crud.get_expiring_subscriptions(session, days=3)
+        usernames = {subscription.user.username for subscription in subscriptions}
+
+    assert len(subscriptions) == ROWS
+    assert len(usernames) == ROWS
+    assert len(_selects(queries)) == 1
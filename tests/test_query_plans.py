@@ -0,0 +1,94 @@
+# /Users/mac/projects/ticket_bot/tests/test_query_plans.py
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from app.database import crud
+from app.database.models import TicketMessage, TicketStatus
+
+
+async def _seed(session_factory) -> int:
+    async with session_factory() as session:
+        await crud.upsert_user(session, 10, "client")
+        ticket = await crud.create_ticket(session, 10)
+        await crud.create_ticket(session, 10)
+        now = datetime.utcnow()
+        await session.execute(
+            insert(TicketMessage),
+            [
+                {"ticket_id": ticket.id, "sender_id": 10, "message_type": "text", "text": f"m{i}", "created_at": now + timedelta(seconds=i)}
+                for i in range(30)
+            ],
+        )
+        await session.commit()
+        return ticket.id
+
+
+async def _explain(session_factory, statement: str, parameters) -> str:
+    async with session_factory() as session:
+        conn = await session.connection()
+        result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return "\n".join(row[3] for row in result)
+
+
+async def _plan(session_factory, queries, prefix: str) -> str:
+    """EXPLAIN QUERY PLAN последнего выполненного запроса, начинающегося с prefix."""
+    statement, parameters = next(item for item in reversed(queries) if item[0].lstrip().startswith(prefix))
+    return await _explain(session_factory, statement, parameters)
+
+
+async def test_status_queue_reads_index_in_order(sqlite_db, queries):
+    await _seed(sqlite_db)
+    for backward in (False, True):
+        queries.clear()
+        async with sqlite_db() as session:
+            await crud.get_tickets_page(
+                session, [TicketStatus.OPEN, TicketStatus.ANSWERED], cursor=(datetime.utcnow(), 1), backward=backward
+            )
+        # Список копируется: EXPLAIN ниже тоже попадает в queries
+        recorded = list(queries)
+        assert len(recorded) == 2
+        for statement, parameters in recorded:
+            plan = await _explain(sqlite_db, statement, parameters)
+            assert "SEARCH tickets USING INDEX ix_tickets_status_last_message_at" in plan
+            # Порядок страницы дает сам индекс, без сортировки во временном B-дереве
+            assert "TEMP B-TREE" not in plan
+
+
+async def test_status_queue_merges_statuses(sqlite_db):
+    async with sqlite_db() as session:
+        await crud.upsert_user(session, 10, "client")
+        tickets = [await crud.create_ticket(session, 10) for _ in range(6)]
+        for ticket in tickets[1::2]:
+            await crud.update_ticket_status(session, ticket.id, TicketStatus.ANSWERED)
+        await crud.update_ticket_status(session, tickets[0].id, TicketStatus.CLOSED)
+        statuses = [TicketStatus.OPEN, TicketStatus.ANSWERED]
+
+        first, has_more = await crud.get_tickets_page(session, statuses, limit=3)
+        cursor = (first[-1].last_message_at, first[-1].id)
+        second, has_more_second = await crud.get_tickets_page(session, statuses, cursor=cursor, limit=3)
+        back, has_more_back = await crud.get_tickets_page(
+            session, statuses, cursor=(second[0].last_message_at, second[0].id), backward=True, limit=3
+        )
+
+    keys = [(ticket.last_message_at, ticket.id) for ticket in first + second]
+    assert keys == sorted(keys)
+    assert len(keys) == 5 and tickets[0].id not in {ticket.id for ticket in first + second}
+    assert has_more and not has_more_second
+    assert [ticket.id for ticket in back] == [ticket.id for ticket in first]
+    assert not has_more_back
+
+
+async def test_sla_claim_uses_status_index(sqlite_db, queries):
+    await _seed(sqlite_db)
+    async with sqlite_db() as session:
+        await crud.claim_tickets_for_sla_alert(session, sla_hours=12)
+    plan = await _plan(sqlite_db, queries, "UPDATE tickets")
+    assert "SEARCH tickets USING INDEX ix_tickets_status_last_message_at" in plan
+
+
+async def test_history_page_uses_ticket_messages_index(sqlite_db, queries):
+    ticket_id = await _seed(sqlite_db)
+    async with sqlite_db() as session:
+        messages, _ = await crud.get_ticket_messages_page(session, ticket_id, limit=5)
+        await crud.get_ticket_messages_page(session, ticket_id, cursor_id=messages[0].id, limit=5)
+    plan = await _plan(sqlite_db, queries, "SELECT")
+    assert "SEARCH ticket_messages USING INDEX ix_ticket_messages_ticket_id_created_at" in plan
@@ -0,0 +1,93 @@
+# /Users/mac/projects/ticket_bot/tests/test_sla.py
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from app.database import crud
+from app.database.models import Ticket, TicketStatus
+from app.services import notifications, sla
+from app.services.sla import RETRY_DELAY, SlaTracker
+
+CLIENT_ID = 100
+
+
+async def _ticket(session, status: TicketStatus, age: timedelta, alerted: bool = False) -> int:
+    ticket = await crud.create_ticket(session, CLIENT_ID)
+    await session.execute(
+        update(Ticket)
+        .where(Ticket.id == ticket.id)
+        .values(
+            status=status,
+            last_message_at=datetime.utcnow() - age,
+            sla_alerted_at=datetime.utcnow() if alerted else None,
+        )
+    )
+    await session.commit()
+    return ticket.id
+
+
+def _next_due(tracker: SlaTracker) -> int:
+    tracker._pop_stale()
+    return tracker._heap[0][1] if tracker._heap else None
+
+
+async def test_start_schedules_waiting_tickets(db, monkeypatch):
+    monkeypatch.setattr(sla, "AsyncSessionFactory", db)
+    async with db() as session:
+        await crud.upsert_user(session, CLIENT_ID, "client")
+        older = await _ticket(session, TicketStatus.OPEN, timedelta(hours=3))
+        newer = await _ticket(session, TicketStatus.ANSWERED, timedelta(hours=1))
+        await _ticket(session, TicketStatus.PENDING, timedelta(hours=5))
+        await _ticket(session, TicketStatus.CLOSED, timedelta(hours=5))
+        await _ticket(session, TicketStatus.OPEN, timedelta(hours=5), alerted=True)
+
+    tracker = SlaTracker(sla_hours=12)
+    await tracker.start(bot=None)
+    try:
+        assert set(tracker._deadlines) == {older, newer}
+        assert _next_due(tracker) == older
+    finally:
+        await tracker.close()
+
+
+def test_touch_reschedules_deadline():
+    tracker = SlaTracker(sla_hours=12)
+    now = datetime.utcnow()
+    tracker.touch(1, TicketStatus.OPEN, now)
+    tracker.touch(2, TicketStatus.ANSWERED, now + timedelta(minutes=1))
+    assert _next_due(tracker) == 1
+
+    # Новое сообщение без смены статуса сдвигает дедлайн, устаревшая запись в куче пропускается
+    tracker.touch(1, None, now + timedelta(hours=1))
+    assert _next_due(tracker) == 2
+    assert tracker._deadlines[1] == now + timedelta(hours=13)
+
+    # Ответ админа снимает тикет с отслеживания, сообщение в неотслеживаемый тикет его не добавляет
+    tracker.touch(2, TicketStatus.PENDING, now + timedelta(hours=2))
+    tracker.touch(3, None, now)
+    assert _next_due(tracker) == 1
+    assert set(tracker._deadlines) == {1}
+
+
+async def test_due_deadline_runs_check_and_retries_failure(db, monkeypatch):
+    monkeypatch.setattr(sla, "AsyncSessionFactory", db)
+    async with db() as session:
+        await crud.upsert_user(session, CLIENT_ID, "client")
+        overdue = await _ticket(session, TicketStatus.OPEN, timedelta(hours=2))
+
+    checked = asyncio.Event()
+
+    async def failing_check(bot, sla_hours):
+        checked.set()
+        return None
+
+    monkeypatch.setattr(notifications, "check_sla", failing_check)
+    tracker = SlaTracker(sla_hours=1)
+    started = datetime.utcnow()
+    await tracker.start(bot=None)
+    try:
+        await asyncio.wait_for(checked.wait(), 5)
+        # Проверка не удалась: тикет снова в куче через RETRY_DELAY
+        assert tracker._deadlines[overdue] >= started + RETRY_DELAY
+        assert _next_due(tracker) == overdue
+    finally:
+        await tracker.close()
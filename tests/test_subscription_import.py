@@ -0,0 +1,50 @@
+# /Users/mac/projects/ticket_bot/tests/test_subscription_import.py
+import csv
+import pytest
+from datetime import datetime
+from app.database import crud
+from app.services import subscription_import
+from app.services.subscription_import import ImportReport, import_subscriptions
+
+USER_ID = 100
+
+
+def _write(tmp_path, text: str) -> str:
+    path = tmp_path / "import.csv"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+async def test_header_row_is_skipped(db, tmp_path):
+    path = _write(tmp_path, "telegram_id,end_date\n100,01-01-2030\n")
+
+    report = await import_subscriptions(path, db)
+
+    assert (report.set_dates, report.rejected) == (1, 0)
+
+
+async def test_unknown_first_row_is_rejected(db, tmp_path):
+    path = _write(tmp_path, "id,date\n100,01-01-2030\n")
+
+    report = await import_subscriptions(path, db)
+
+    assert report.set_dates == 1
+    assert report.rejected == 1
+    assert report.rejected_rows[0][0] == 1
+
+
+async def test_report_keeps_applied_rows_after_csv_error(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(subscription_import, "IMPORT_CHUNK_SIZE", 2)
+    # Поле длиннее csv.field_size_limit() - csv.Error на четвертой строке
+    oversized = "x" * (csv.field_size_limit() + 1)
+    path = _write(tmp_path, f"100,01-01-2030\n101,01-01-2030\n102,01-01-2030\n103,{oversized}\n")
+
+    report = ImportReport()
+    with pytest.raises(csv.Error):
+        await import_subscriptions(path, db, report)
+
+    # Первая пачка закоммичена, третья строка ждала своей пачки
+    assert report.applied == 2
+    async with db() as session:
+        end_dates = await crud.get_subscription_end_dates(session, [USER_ID, USER_ID + 1, USER_ID + 2])
+    assert end_dates == {USER_ID: datetime(2030, 1, 1), USER_ID + 1: datetime(2030, 1, 1)}